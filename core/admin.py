@@ -1,9 +1,9 @@
 from django.contrib import admin
-from .models import Clinic, Vet, Pet, Appointment, ClinicHours, VetHours, AvailabilityException, User as DomainUser
+from .models import Clinic, ClinicDayStats, Vet, Pet, Appointment, ClinicHours, VetHours, AvailabilityException, User as DomainUser
 
 @admin.register(Clinic)
 class ClinicAdmin(admin.ModelAdmin):
-    list_display = ("id","name","city","address")
+    list_display = ("id","name","city","address","species")
 
 @admin.register(Vet)
 class VetAdmin(admin.ModelAdmin):
@@ -18,6 +18,11 @@ class AppointmentAdmin(admin.ModelAdmin):
     list_display = ("id","clinic","vet","owner","pet","starts_at","status")
     list_filter = ("status","clinic","vet")
 
+@admin.register(ClinicDayStats)
+class ClinicDayStatsAdmin(admin.ModelAdmin):
+    list_display = ("clinic","day","booked","confirmed","cancelled","busy_minutes","open_minutes")
+    list_filter = ("clinic",)
+
 @admin.register(ClinicHours)
 class ClinicHoursAdmin(admin.ModelAdmin):
     list_display = ("clinic","weekday","start","end")
@@ -0,0 +1,97 @@
+# core/async_views.py
+"""
+Wersje async gorących widoków dla wdrożenia ASGI (petnav/asgi.py).
+
+Podpinane w core.urls zamiast wersji sync, gdy ASYNC_VIEWS=1. Logika,
+szablony i cache są wspólne z core.views — różni się tylko to, że ORM
+i cache idą przez async API albo sync_to_async, więc worker nie stoi na
+czas liczenia slotów, a sloty wielu klinik liczą się równolegle
+(slot_cache.aclinics_day_slots).
+
+Widoki async nie używają request.domain_user (rozwiązanie jest sync);
+request.user rozwiązuje revalidated przez request.auser().
+"""
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import aget_object_or_404, render
+from django.utils import timezone
+from django.views.decorators.http import require_GET
+
+from . import metrics, slot_cache
+from .models import Clinic
+from .routers import use_replica
+from .views import (
+    MAX_BATCH_CLINICS, METRICS_CONTENT_TYPE, _batch_ids, _clinic_modified, _clinics_modified,
+    _clinics_page_etag, _date_param, _duration_param, _home_etag, _range_params, _slots_html_etag,
+    db_status, metrics_allowed, ready_response, revalidated,
+)
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Healthcheck i metryki
+# ───────────────────────────────────────────────────────────────────────────────
+
+@require_GET
+async def health(_request):
+    return JsonResponse({"ok": True})
+
+@require_GET
+async def ready(_request):
+    return ready_response(*await sync_to_async(db_status)())
+
+@require_GET
+async def metrics_view(request):
+    if not metrics_allowed(request):
+        return HttpResponse(status=401)
+    return HttpResponse(await sync_to_async(metrics.render)(), content_type=METRICS_CONTENT_TYPE)
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Kliniki i sloty
+# ───────────────────────────────────────────────────────────────────────────────
+
+@revalidated(_home_etag, _clinics_modified, private=True)
+@use_replica
+async def home(request):
+    clinics = [c async for c in Clinic.objects.all().order_by("city", "name")]
+    return render(request, "home.html", {"clinics": clinics})
+
+@revalidated(_clinics_page_etag, _clinics_modified, private=True)
+@use_replica
+async def clinics(request):
+    all_clinics = [c async for c in Clinic.objects.all()]
+    return render(request, "clinics.html", {
+        "clinics": all_clinics,
+        "batch_ids": ",".join(str(c.id) for c in all_clinics[:MAX_BATCH_CLINICS]),
+        "now": timezone.localdate(),
+    })
+
+@revalidated(_slots_html_etag, _clinic_modified)
+@use_replica
+async def clinic_slots(request, clinic_id: int):
+    """Jak views.clinic_slots."""
+    clinic = await aget_object_or_404(Clinic, pk=clinic_id)
+    duration = _duration_param(request)
+
+    span, error = _range_params(request)
+    if error:
+        return HttpResponse(error, status=400)
+    if span:
+        days = await sync_to_async(slot_cache.range_slots)(clinic, *span, duration)
+        return render(request, "partials/slots_range.html", {"clinic": clinic, "days": days})
+
+    day = _date_param(request, "date") or timezone.localdate()
+    slots = await sync_to_async(slot_cache.day_slots)(clinic, day, duration)
+    return render(request, "partials/slots.html", {"clinic": clinic, "slots": slots})
+
+@require_GET
+@use_replica
+async def clinics_slots_batch(request):
+    """Jak views.clinics_slots_batch; kliniki spoza cache liczone równolegle porcjami."""
+    ids = _batch_ids(request)
+    if ids is None:
+        return HttpResponse(f"Podaj od 1 do {MAX_BATCH_CLINICS} klinik", status=400)
+    clinics_found = [c async for c in Clinic.objects.filter(pk__in=ids).only("id")]
+    day = _date_param(request, "date") or timezone.localdate()
+    slots = await slot_cache.aclinics_day_slots([c.id for c in clinics_found], day, _duration_param(request))
+    return render(request, "partials/slots_batch.html", {
+        "items": [(c, slots[c.id]) for c in sorted(clinics_found, key=lambda c: ids.index(c.id))],
+    })
@@ -0,0 +1,381 @@
+# core/availability.py
+"""
+Silnik dostępności.
+
+Ładuje wszystko, czego potrzeba do policzenia slotów kliniki w danym dniu
+lub zakresie dni (godziny kliniki, godziny wszystkich wetów, wyjątki, zajęte
+wizyty), stałą liczbą zapytań — niezależnie od liczby weterynarzy i dni —
+a same sloty liczy w czystym Pythonie — na całkowitych minutach od północy
+dnia; aware datetime'y powstają dopiero na brzegu (gotowe sloty).
+"""
+import heapq
+from dataclasses import dataclass, field
+from datetime import datetime, time as dtime, timedelta, date as ddate, timezone as dt_timezone
+from itertools import groupby, islice
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.timezone import make_aware
+
+from .models import Appointment, AvailabilityException, ClinicHours, Vet, VetHours
+
+SLOT_MINUTES = 30
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Helpers
+# ───────────────────────────────────────────────────────────────────────────────
+
+def minutes(t: dtime) -> int:
+    """Godzina (TimeField) → minuty od północy."""
+    return t.hour * 60 + t.minute
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Arytmetyka przedziałów [start, end)
+# ───────────────────────────────────────────────────────────────────────────────
+
+def merge_intervals(intervals):
+    """Sortuje i scala nakładające się/stykające przedziały. O(n log n)."""
+    merged = []
+    for s, e in sorted(intervals):
+        if s >= e:
+            continue
+        if merged and s <= merged[-1][1]:
+            if e > merged[-1][1]:
+                merged[-1] = (merged[-1][0], e)
+        else:
+            merged.append((s, e))
+    return merged
+
+def subtract_intervals(base, cuts):
+    """
+    base minus cuts — oba posortowane i scalone (merge_intervals).
+    Jedno przejście dwoma wskaźnikami: O(len(base) + len(cuts)).
+    """
+    free = []
+    i = 0
+    for s, e in base:
+        # cięcia kończące się przed oknem nie wpłyną też na kolejne okna
+        while i < len(cuts) and cuts[i][1] <= s:
+            i += 1
+        cur = s
+        j = i
+        while j < len(cuts) and cuts[j][0] < e:
+            cs, ce = cuts[j]
+            if cs > cur:
+                free.append((cur, cs))
+            cur = max(cur, ce)
+            j += 1
+        if cur < e:
+            free.append((cur, e))
+    return free
+
+def cut_slots(free, duration, step=None, anchor=None):
+    """
+    Tnie wolne przedziały na sloty długości `duration` co `step` (domyślnie
+    co `duration`). Jeśli podano `anchor`, starty leżą na siatce anchor + k*step.
+    """
+    step = step or duration
+    for s, e in free:
+        t = s
+        if anchor is not None and t > anchor:
+            t = anchor - ((anchor - t) // step) * step  # najbliższy węzeł siatki >= s
+        while t + duration <= e:
+            yield (t, t + duration)
+            t += step
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Ładowanie danych (stała liczba zapytań)
+# ───────────────────────────────────────────────────────────────────────────────
+
+@dataclass
+class DayData:
+    """
+    Komplet danych jednej kliniki na jeden dzień — bez dalszych zapytań.
+    Wszystkie przedziały w minutach od lokalnej północy `day`.
+    """
+    day: ddate
+    clinic_closed: bool = False
+    clinic_window: tuple = None                         # (start, end) z wyjątku kliniki
+    vet_ids: list = field(default_factory=list)
+    clinic_hours: list = field(default_factory=list)    # [(start, end)]
+    vet_hours: dict = field(default_factory=dict)       # vet_id -> [(start, end)]
+    vet_exceptions: dict = field(default_factory=dict)  # vet_id -> AvailabilityException
+    busy: dict = field(default_factory=dict)            # vet_id -> [(start, end)]
+    midnight: datetime = None                           # aware 00:00 dnia
+
+    def __post_init__(self):
+        if self.midnight is None:
+            self.midnight = make_aware(datetime.combine(self.day, dtime(0, 0)))
+
+    def at(self, minute: int) -> datetime:
+        """Minuta dnia → aware datetime (czas lokalny, także w dni zmiany czasu)."""
+        return self.midnight + timedelta(minutes=minute)
+
+    def minute_of(self, dt: datetime, ceil: bool = False) -> int:
+        """Aware datetime → minuta względem północy tego dnia (może wyjść poza 0..1440)."""
+        local = timezone.localtime(dt)
+        m = (local.date() - self.day).days * 1440 + local.hour * 60 + local.minute
+        return m + 1 if ceil and (local.second or local.microsecond) else m
+
+MAX_RANGE_DAYS = 31
+
+def days_between(first: ddate, last: ddate):
+    """Dni first..last włącznie."""
+    return [first + timedelta(days=i) for i in range((last - first).days + 1)]
+
+def _day_bounds(day: ddate):
+    """Oś dnia [00:00, 23:59) jako aware datetime'y."""
+    return (make_aware(datetime.combine(day, dtime(0, 0))),
+            make_aware(datetime.combine(day, dtime(23, 59))))
+
+def exception_days(ex, first: ddate, last: ddate):
+    """Dni z first..last objęte wyjątkiem (zakres date..date_to, ew. tylko jego weekday)."""
+    d, end = max(ex.date, first), min(ex.last_day, last)
+    step = 1
+    if ex.weekday is not None:
+        d += timedelta(days=(ex.weekday - d.weekday()) % 7)
+        step = 7
+    while d <= end:
+        yield d
+        d += timedelta(days=step)
+
+def _precedence(ex):
+    """
+    Kilka wyjątków w jednym dniu: węższy zakres > cykliczny > zamknięcie >
+    nowszy — np. otwarcie jednego dnia wewnątrz zamkniętego urlopu działa.
+    """
+    return (-(ex.last_day - ex.date).days, ex.weekday is not None, ex.closed, ex.id or 0)
+
+def busy_appointments(clinic_ids, start, end):
+    """
+    Nieanulowane wizyty klinik nachodzące na [start, end) — zapytanie
+    obsługiwane przez indeks częściowy appt_clinic_busy_idx.
+    """
+    return Appointment.objects.filter(
+        clinic_id__in=clinic_ids,
+        starts_at__lt=end,
+        ends_at__gt=start
+    ).exclude(status="CANCELLED").values_list("clinic_id", "vet_id", "starts_at", "ends_at")
+
+def load_clinics(clinic_ids, first: ddate, last: ddate) -> dict:
+    """
+    Pobiera dane klinik `clinic_ids` na dni first..last (włącznie) w maks.
+    5 zapytaniach zakresowych (IN po klinikach): weci, wyjątki (kliniki +
+    weci), godziny klinik, godziny wetów, wizyty. Liczba zapytań nie zależy
+    od liczby klinik, wetów ani dni. Gdy wszystko jest zamknięte wyjątkami —
+    kończy po 2. Zwraca {clinic_id: {dzień: DayData}}.
+    """
+    clinic_ids = list(clinic_ids)
+    days = days_between(first, last)
+    weekdays = {d.weekday() for d in days}  # 0=Mon
+
+    vets_by_clinic = {cid: [] for cid in clinic_ids}
+    vet_clinic = {}
+    for vid, cid in Vet.objects.filter(clinic_id__in=clinic_ids).values_list("id", "clinic_id"):
+        vets_by_clinic[cid].append(vid)
+        vet_clinic[vid] = cid
+    out = {
+        cid: {d: DayData(day=d, vet_ids=vets_by_clinic[cid]) for d in days}
+        for cid in clinic_ids
+    }
+
+    # Wyjątki nachodzące na zakres (także zakresowe i cykliczne) — jedno zapytanie,
+    # rozwinięcie na dni w Pythonie; na dzień wygrywa jeden (patrz _precedence).
+    exceptions = AvailabilityException.objects.filter(date__lte=last).filter(
+        Q(date_to__gte=first) | Q(date_to__isnull=True, date__gte=first)
+    ).filter(
+        Q(entity_type="CLINIC", entity_id__in=clinic_ids) |
+        Q(entity_type="VET", entity_id__in=list(vet_clinic))
+    )
+    chosen = {}
+    for ex in exceptions:
+        for d in exception_days(ex, first, last):
+            key = (ex.entity_type, ex.entity_id, d)
+            if key not in chosen or _precedence(ex) > _precedence(chosen[key]):
+                chosen[key] = ex
+    for (entity_type, entity_id, d), ex in chosen.items():
+        if entity_type == "CLINIC":
+            data = out[entity_id][d]
+            if ex.closed:
+                data.clinic_closed = True
+            elif ex.start and ex.end:
+                data.clinic_window = (minutes(ex.start), minutes(ex.end))
+        else:
+            out[vet_clinic[entity_id]][d].vet_exceptions[entity_id] = ex
+    if all(data.clinic_closed for per_day in out.values() for data in per_day.values()):
+        return out
+
+    clinic_hours = {}
+    for cid, wd, start, end in ClinicHours.objects.filter(
+        clinic_id__in=clinic_ids, weekday__in=weekdays
+    ).values_list("clinic_id", "weekday", "start", "end"):
+        clinic_hours.setdefault((cid, wd), []).append((minutes(start), minutes(end)))
+
+    vet_hours = {}
+    for vid, wd, start, end in VetHours.objects.filter(
+        vet_id__in=list(vet_clinic), weekday__in=weekdays
+    ).values_list("vet_id", "weekday", "start", "end"):
+        vet_hours.setdefault((vet_clinic[vid], wd), {}).setdefault(vid, []).append((minutes(start), minutes(end)))
+
+    for cid, per_day in out.items():
+        for d, data in per_day.items():
+            data.clinic_hours = clinic_hours.get((cid, d.weekday()), [])
+            data.vet_hours = vet_hours.get((cid, d.weekday()), {})
+
+    # Istniejące wizyty (na kolizje) — jedno zapytanie zakresowe na cały okres,
+    # potem przypisanie do każdego dnia, na którego oś zachodzi wizyta.
+    range_start, _ = _day_bounds(first)
+    _, range_end = _day_bounds(last)
+    for cid, vid, bs, be in busy_appointments(clinic_ids, range_start, range_end):
+        d = max(timezone.localdate(bs), first)
+        while d <= last and d <= timezone.localdate(be):
+            day_start, day_end = _day_bounds(d)
+            if bs < day_end and be > day_start:
+                data = out[cid][d]
+                data.busy.setdefault(vid, []).append((data.minute_of(bs), data.minute_of(be, ceil=True)))
+            d += timedelta(days=1)
+
+    return out
+
+def load_range(clinic, first: ddate, last: ddate) -> dict:
+    """Dane jednej kliniki na dni first..last: {dzień: DayData}."""
+    return load_clinics([clinic.id], first, last)[clinic.id]
+
+def load_day(clinic, day: ddate) -> DayData:
+    """Dane kliniki na jeden dzień (patrz load_range)."""
+    return load_range(clinic, day, day)[day]
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Liczenie slotów (czysty Python)
+# ───────────────────────────────────────────────────────────────────────────────
+
+def vet_windows(data: DayData, vid):
+    """Scalone okna pracy veta w minutach dnia (przed odjęciem wizyt)."""
+    ex_vet = data.vet_exceptions.get(vid)
+    if ex_vet and ex_vet.closed:
+        return []
+
+    # Godziny veta (jeśli są, mają pierwszeństwo), inaczej kliniki
+    base_hours = data.vet_hours.get(vid) or data.clinic_hours
+
+    # Wyjątek veta z oknem godzin: nadpisz bazę jednym oknem
+    if ex_vet and ex_vet.start and ex_vet.end:
+        base_hours = [(minutes(ex_vet.start), minutes(ex_vet.end))]
+
+    if data.clinic_window:
+        # przytnij okna do zakresu kliniki
+        lo, hi = data.clinic_window
+        base_hours = [(max(s, lo), min(e, hi)) for s, e in base_hours]
+    return merge_intervals(base_hours)
+
+def vet_free(data: DayData, vid):
+    """[(okno, [wolne przedziały w oknie])] — okna pracy minus zajęte wizyty."""
+    windows = vet_windows(data, vid)
+    free = subtract_intervals(windows, merge_intervals(data.busy.get(vid, [])))
+    out = [(w, []) for w in windows]
+    k = 0
+    for s, e in free:
+        while windows[k][1] < e:
+            k += 1
+        out[k][1].append((s, e))
+    return out
+
+def compute_slots(data: DayData, duration: int = SLOT_MINUTES):
+    """
+    Wolne sloty długości `duration` minut z załadowanych danych:
+    - precedence: VetHours > ClinicHours
+    - wyjątki: AvailabilityException (CLINIC/VET). Jeśli closed — brak slotów.
+    - okna pracy veta minus jego wizyty != CANCELLED, cięte na siatce od startu okna.
+    """
+    if data.clinic_closed:
+        return []
+
+    slots = []
+    for vid in data.vet_ids:
+        for (w_start, _w_end), free in vet_free(data, vid):
+            slots.extend(cut_slots(free, duration, anchor=w_start))
+
+    slots.sort()
+    return [(data.at(s), data.at(e)) for s, e in slots]
+
+def day_slots(clinic, day: ddate, duration: int = SLOT_MINUTES):
+    """Wolne sloty kliniki w dniu `day` (posortowane po starcie)."""
+    return compute_slots(load_day(clinic, day), duration)
+
+def range_slots(clinic, first: ddate, last: ddate, duration: int = SLOT_MINUTES):
+    """[(dzień, sloty)] dla dni first..last — dane ładowane raz dla całego okresu."""
+    data = load_range(clinic, first, last)
+    return [(d, compute_slots(data[d], duration)) for d in sorted(data)]
+
+def slot_offsets(day: ddate, slots):
+    """
+    Sloty dnia (posortowane, jak z compute_slots) → (starty w minutach od
+    północy `day`, liczba wetów na start) — ten sam termin u kilku wetów
+    to jeden start z pojemnością > 1. Minuty to upływ czasu (różnica w UTC),
+    nie zegar ścienny: w dzień zmiany czasu 9:00 to 600 (jesień) albo 480
+    (wiosna) — inaczej niż minuty silnika (DayData.at).
+    """
+    midnight = make_aware(datetime.combine(day, dtime(0, 0))).astimezone(dt_timezone.utc)
+    starts, capacity = [], []
+    for s, _e in slots:
+        # datetime'y z tą samą strefą odejmują się jak zegar ścienny — stąd UTC
+        m = int((s.astimezone(dt_timezone.utc) - midnight).total_seconds()) // 60
+        if starts and starts[-1] == m:
+            capacity[-1] += 1
+        else:
+            starts.append(m)
+            capacity.append(1)
+    return starts, capacity
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Najwcześniejsze terminy w wielu klinikach
+# ───────────────────────────────────────────────────────────────────────────────
+
+def iter_slots(data: DayData, duration: int = SLOT_MINUTES):
+    """
+    Leniwy odpowiednik compute_slots: sloty wszystkich wetów scalone po starcie
+    (heapq.merge), bez duplikatów tego samego terminu u kilku wetów.
+    """
+    if data.clinic_closed:
+        return iter(())
+    streams = [
+        cut_slots(free, duration, anchor=w_start)
+        for vid in data.vet_ids
+        for (w_start, _w_end), free in vet_free(data, vid)
+    ]
+    return ((data.at(s), data.at(e)) for (s, e), _ in groupby(heapq.merge(*streams)))
+
+def _tagged(slots, clinic_id, not_before):
+    for s, e in slots:
+        if s >= not_before:
+            yield (s, e, clinic_id)
+
+def earliest_slots(clinics, limit: int, days: int, duration: int = SLOT_MINUTES, now=None):
+    """
+    `limit` najwcześniejszych wolnych slotów w klinikach `clinics` — od `now`
+    przez `days` dni. Dane ładowane są porcjami dni (1, 2, 4, ...) wspólnie
+    dla wszystkich klinik, a szukanie kończy się po zebraniu `limit` wyników.
+    Sloty tnie się leniwie, więc kliniki bez wczesnych terminów nie są
+    rozpisywane na pełne listy dnia. Zwraca [(start, end, clinic)].
+    """
+    now = now or timezone.now()
+    by_id = {c.id: c for c in clinics}
+    if not by_id or limit <= 0:
+        return []
+
+    found = []
+    first = timezone.localdate(now)
+    horizon = first + timedelta(days=days - 1)
+    chunk = 1
+    while first <= horizon and len(found) < limit:
+        last = min(first + timedelta(days=chunk - 1), horizon)
+        data = load_clinics(by_id, first, last)
+        for d in days_between(first, last):
+            streams = [_tagged(iter_slots(per_day[d], duration), cid, now) for cid, per_day in data.items()]
+            found.extend(islice(heapq.merge(*streams), limit - len(found)))
+            if len(found) >= limit:
+                break
+        first = last + timedelta(days=1)
+        chunk *= 2
+
+    return [(s, e, by_id[cid]) for s, e, cid in found]
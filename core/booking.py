@@ -0,0 +1,77 @@
+# core/booking.py
+"""
+Rezerwacja terminu odporna na podwójne bookowanie.
+
+Całość dzieje się w jednej transakcji: blokujemy wiersze wetów kliniki
+(SELECT ... FOR UPDATE tam, gdzie backend to wspiera), ponownie liczymy wolne
+okna z bazy (nie z cache) i przydzielamy najmniej obciążonego weta, który
+ma cały przedział [start, end) wolny. Na SQLite rezerwacje z wątków procesu
+czekają w kolejce (core.db.write_lock) zamiast na blokadzie pliku bazy.
+"""
+import time
+
+from django.db import OperationalError, transaction
+from django.utils import timezone
+
+from . import availability, db
+from .models import Appointment, Vet
+
+ATTEMPTS = 3          # SQLite przy równoległych zapisach zgłasza "database is locked"
+RETRY_DELAY = 0.05    # s, rośnie liniowo z numerem próby
+# Postgres: serialization_failure, deadlock_detected, lock_not_available
+RETRY_SQLSTATES = {"40001", "40P01", "55P03"}
+
+class SlotTaken(Exception):
+    """Termin zajęty albo poza godzinami pracy wszystkich wetów."""
+
+def _fits(free, start, end) -> bool:
+    return any(s <= start and end <= e for _window, gaps in free for s, e in gaps)
+
+def _busy_minutes(intervals) -> int:
+    return sum(e - s for s, e in intervals)
+
+def pick_vet(data: availability.DayData, start, end):
+    """Najmniej obciążony (minuty wizyt w dniu) wet, który ma [start, end) wolne."""
+    start_m, end_m = data.minute_of(start), data.minute_of(end, ceil=True)
+    free_vets = [vid for vid in data.vet_ids if _fits(availability.vet_free(data, vid), start_m, end_m)]
+    if not free_vets:
+        return None
+    return min(free_vets, key=lambda vid: (_busy_minutes(data.busy.get(vid, [])), vid))
+
+def _book_once(clinic, owner, pet_id, start, end) -> Appointment:
+    with db.write_lock(), transaction.atomic():
+        # blokada wetów kliniki — kolejne rezerwacje tej kliniki czekają na commit
+        list(Vet.objects.select_for_update().filter(clinic=clinic).order_by("id").values_list("id", flat=True))
+        data = availability.load_day(clinic, timezone.localdate(start))
+        vet_id = pick_vet(data, start, end)
+        if vet_id is None:
+            raise SlotTaken()
+        return Appointment.objects.create(
+            clinic=clinic, vet_id=vet_id, owner=owner, pet_id=pet_id,
+            starts_at=start, ends_at=end, status="NEW"
+        )
+
+def _retryable(exc: OperationalError) -> bool:
+    """Konflikt blokad/serializacji (warto powtórzyć) — nie np. zerwane połączenie."""
+    cause = exc.__cause__
+    if getattr(cause, "sqlstate", None):       # psycopg
+        return cause.sqlstate in RETRY_SQLSTATES
+    if getattr(cause, "sqlite_errorname", None):
+        return cause.sqlite_errorname.startswith(("SQLITE_BUSY", "SQLITE_LOCKED"))
+    return "locked" in str(exc)                # "database is locked" / "database table is locked"
+
+def book(clinic, owner, pet_id, start, end) -> Appointment:
+    """
+    Rezerwuje [start, end) w klinice. Rzuca SlotTaken, gdy żaden wet nie ma
+    tego przedziału wolnego (także gdy ktoś zajął go w międzyczasie). Inne
+    błędy bazy (np. utracone połączenie) przechodzą dalej.
+    """
+    for attempt in range(1, ATTEMPTS + 1):
+        try:
+            return _book_once(clinic, owner, pet_id, start, end)
+        except OperationalError as exc:
+            if not _retryable(exc):
+                raise
+            if attempt == ATTEMPTS:
+                raise SlotTaken()
+            time.sleep(RETRY_DELAY * attempt)
@@ -0,0 +1,190 @@
+# core/day_stats.py
+"""
+Dzienne liczniki klinik (ClinicDayStats).
+
+Każda wizyta wnosi do wiersza (klinika, lokalny dzień początku) swój wkład:
++1 booked, +1 confirmed/cancelled wg statusu i minuty trwania, jeśli nie jest
+anulowana. Zapis wizyty odejmuje wkład poprzedniego stanu (zapamiętanego
+w Appointment.from_db) i dodaje nowy — dwa UPDATE z F(), bez liczenia historii.
+
+open_minutes (suma okien pracy wetów) liczy silnik dostępności przy
+zakładaniu wiersza; zmiana godzin/wyjątków przelicza ją dla dni od dziś —
+przeszłe dni zachowują pojemność, jaką wtedy miały.
+
+Zmiany z pominięciem sygnałów (QuerySet.update, bulk_create) trzeba domknąć
+przez refresh_days() albo manage.py rebuild_day_stats.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from . import availability
+from .models import Appointment, ClinicDayStats
+
+COUNTERS = ("booked", "confirmed", "cancelled", "busy_minutes")
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Wkład wizyty
+# ───────────────────────────────────────────────────────────────────────────────
+
+def _contribution(state) -> tuple:
+    """(clinic_id, starts_at, ends_at, status) → ((clinic_id, dzień), {licznik: wartość})."""
+    clinic_id, starts_at, ends_at, status = state
+    delta = {"booked": 1, "confirmed": int(status == "CONFIRMED"), "cancelled": int(status == "CANCELLED")}
+    delta["busy_minutes"] = 0 if status == "CANCELLED" else int((ends_at - starts_at).total_seconds() // 60)
+    return (clinic_id, timezone.localdate(starts_at)), delta
+
+def _state(instance):
+    return tuple(getattr(instance, f) for f in Appointment.STATS_FIELDS)
+
+def open_minutes(data: availability.DayData) -> int:
+    """Minuty pracy wszystkich wetów kliniki w dniu (przed odjęciem wizyt)."""
+    if data.clinic_closed:
+        return 0
+    return sum(e - s for vid in data.vet_ids for s, e in availability.vet_windows(data, vid))
+
+def _open_minutes(clinic_ids, first, last) -> dict:
+    """{(clinic_id, dzień): open_minutes} — po MAX_RANGE_DAYS dni na porcję."""
+    out = {}
+    while first <= last:
+        chunk_last = min(last, first + timedelta(days=availability.MAX_RANGE_DAYS - 1))
+        for cid, per_day in availability.load_clinics(clinic_ids, first, chunk_last).items():
+            for d, data in per_day.items():
+                out[(cid, d)] = open_minutes(data)
+        first = chunk_last + timedelta(days=1)
+    return out
+
+def _apply(key, delta: dict, sign: int):
+    clinic_id, day = key
+    updates = {name: F(name) + sign * value for name, value in delta.items() if value}
+    if not ClinicDayStats.objects.filter(clinic_id=clinic_id, day=day).exists():
+        capacity = _open_minutes([clinic_id], day, day)[key]
+        ClinicDayStats.objects.get_or_create(clinic_id=clinic_id, day=day, defaults={"open_minutes": capacity})
+    ClinicDayStats.objects.filter(clinic_id=clinic_id, day=day).update(**updates)
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Przyrostowo (sygnały wizyt, core.signals)
+# ───────────────────────────────────────────────────────────────────────────────
+
+def appointment_saved(instance, created: bool):
+    new = _state(instance)
+    old = None if created else getattr(instance, "_stats_state", None)
+    with transaction.atomic():
+        if not created and old is None:
+            # nie znamy stanu sprzed zapisu (np. instancja z .only()) — dzień
+            # liczymy od nowa; przeniesienie na inny dzień domknie rebuild_day_stats
+            key, _ = _contribution(new)
+            refresh_days(key[0], [key[1]])
+        elif old != new:
+            if old is not None:
+                key, delta = _contribution(old)
+                _apply(key, delta, -1)
+            key, delta = _contribution(new)
+            _apply(key, delta, +1)
+    instance._stats_state = new
+
+def appointment_deleted(instance):
+    state = getattr(instance, "_stats_state", None) or _state(instance)
+    (clinic_id, day), delta = _contribution(state)
+    # bez zakładania wiersza — przy kasowaniu kliniki jej liczniki już zniknęły
+    ClinicDayStats.objects.filter(clinic_id=clinic_id, day=day).update(
+        **{name: F(name) - value for name, value in delta.items() if value}
+    )
+
+def refresh_days(clinic_id, days):
+    """Liczniki wskazanych dni kliniki policzone od nowa z wizyt."""
+    days = sorted(set(days))
+    if days:
+        rebuild([clinic_id], days[0], days[-1], only_days=days)
+
+def refresh_capacity(clinic_id):
+    """Przelicza open_minutes istniejących wierszy kliniki od dziś (zmiana godzin)."""
+    today = timezone.localdate()
+    rows = list(ClinicDayStats.objects.filter(clinic_id=clinic_id, day__gte=today).only("id", "day"))
+    if not rows:
+        return
+    capacity = _open_minutes([clinic_id], today, max(r.day for r in rows))
+    for r in rows:
+        r.open_minutes = capacity[(clinic_id, r.day)]
+    ClinicDayStats.objects.bulk_update(rows, ["open_minutes"], batch_size=500)
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Od zera
+# ───────────────────────────────────────────────────────────────────────────────
+
+def rebuild(clinic_ids, first, last, only_days=None) -> int:
+    """
+    Liczniki klinik na dni first..last (lub tylko only_days) policzone od nowa:
+    jeden przebieg po wizytach (iterator) + silnik dostępności na pojemność.
+    Zwraca liczbę zapisanych wierszy (dni bez wizyt też dostają wiersz).
+    """
+    clinic_ids = list(clinic_ids)
+    days = sorted(set(only_days) if only_days is not None else availability.days_between(first, last))
+    start, _ = availability._day_bounds(first)
+    end, _ = availability._day_bounds(last + timedelta(days=1))
+    totals = {}
+    for state in (Appointment.objects
+                  .filter(clinic_id__in=clinic_ids, starts_at__gte=start, starts_at__lt=end)
+                  .values_list(*Appointment.STATS_FIELDS)
+                  .iterator(chunk_size=2000)):
+        key, delta = _contribution(state)
+        acc = totals.setdefault(key, dict.fromkeys(COUNTERS, 0))
+        for name, value in delta.items():
+            acc[name] += value
+    capacity = _open_minutes(clinic_ids, first, last)
+
+    rows = []
+    for cid in clinic_ids:
+        for d in days:
+            rows.append(ClinicDayStats(clinic_id=cid, day=d, open_minutes=capacity[(cid, d)],
+                                       **totals.get((cid, d), {})))
+    with transaction.atomic():
+        ClinicDayStats.objects.filter(clinic_id__in=clinic_ids, day__in=days).delete()
+        ClinicDayStats.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Odczyt (panel kliniki)
+# ───────────────────────────────────────────────────────────────────────────────
+
+def occupancy(clinic, periods=(30, 90), today=None) -> dict:
+    """
+    {okres: {booked, confirmed, cancelled, busy_minutes, open_minutes, occupancy}}
+    dla ostatnich N dni (z dzisiejszym) — jedno zapytanie agregujące po rollupie.
+    Wiersze powstają przy wizytach, więc dni bez wizyt nie mają wiersza:
+    ich pojemność liczy raz silnik dostępności i zapisujemy ją jako puste
+    wiersze — kolejne odczyty okna to znów jedno zapytanie (w praktyce
+    dochodzi tylko nowy dzień).
+    """
+    today = today or timezone.localdate()
+    since = {n: today - timedelta(days=n - 1) for n in periods}
+    first = min(since.values())
+    aggregates = {
+        f"{name}_{n}": Sum(name, filter=Q(day__gte=since[n]), default=0)
+        for n in periods for name in COUNTERS + ("open_minutes",)
+    }
+    aggregates["days"] = Count("id")
+    rows = ClinicDayStats.objects.filter(clinic=clinic, day__gte=first, day__lte=today)
+    totals = rows.aggregate(**aggregates)
+
+    missing = {}
+    if totals["days"] < (today - first).days + 1:
+        present = set(rows.values_list("day", flat=True))
+        absent = [d for d in availability.days_between(first, today) if d not in present]
+        capacity = _open_minutes([clinic.id], absent[0], absent[-1])
+        missing = {d: capacity[(clinic.id, d)] for d in absent}
+        # zapis idzie na primary (core.routers); wiersz z wizytą mógł powstać w międzyczasie
+        ClinicDayStats.objects.bulk_create(
+            [ClinicDayStats(clinic_id=clinic.id, day=d, open_minutes=m) for d, m in missing.items()],
+            batch_size=500, ignore_conflicts=True,
+        )
+
+    out = {}
+    for n in periods:
+        row = {name: totals[f"{name}_{n}"] for name in COUNTERS + ("open_minutes",)}
+        row["open_minutes"] += sum(m for d, m in missing.items() if d >= since[n])
+        row["occupancy"] = row["busy_minutes"] / row["open_minutes"] if row["open_minutes"] else None
+        out[n] = row
+    return out
@@ -0,0 +1,62 @@
+# core/db.py
+"""
+Ustawienia połączeń z bazą.
+
+SQLite (małe kliniki na db.sqlite3): każde nowe połączenie dostaje przez
+sygnał connection_created pragmy z SQLITE_PRAGMAS — WAL (czytelnicy nie
+czekają na zapis), busy_timeout (zapis czeka na blokadę zamiast od razu
+zgłaszać "database is locked") i synchronous=NORMAL (w WAL bezpieczne,
+fsync tylko przy checkpointach). Do tego transakcje BEGIN IMMEDIATE
+(tune_databases): rezerwacja czyta, a potem zapisuje — w trybie DEFERRED
+dwie takie transakcje mogą utknąć na podniesieniu blokady, czego
+busy_timeout nie rozwiąże. Zapisy z wątków jednego procesu ustawiamy
+w kolejce na locku (write_lock) — busy_timeout czeka, odpytując blokadę
+z rosnącymi przerwami, więc przy wielu piszących większość czasu to sen.
+
+Postgres: pula połączeń psycopg 3 (psycopg_pool, OPTIONS["pool"] Django) ze
+sprawdzaniem połączenia przed wydaniem (CONN_HEALTH_CHECKS). Pula wymaga CONN_MAX_AGE=0 — połączenie wraca do puli na
+końcu żądania, co pasuje też do ASGI, gdzie każde żądanie ma własny wątek.
+Bez psycopg_pool zostają trwałe połączenia z CONN_HEALTH_CHECKS.
+"""
+import importlib.util
+import threading
+from contextlib import nullcontext
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "busy_timeout": 5000,      # ms
+    "synchronous": "NORMAL",
+}
+
+def _configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+    # surowe połączenie — pragmy nie są zapytaniami żądania (core.perf)
+    for name, value in SQLITE_PRAGMAS.items():
+        connection.connection.execute(f"PRAGMA {name} = {value}")
+
+_sqlite_write_lock = threading.Lock()
+
+def write_lock(using: str = DEFAULT_DB_ALIAS):
+    """Kolejka zapisów w procesie dla SQLite (jeden piszący naraz); gdzie indziej nic."""
+    return _sqlite_write_lock if connections[using].vendor == "sqlite" else nullcontext()
+
+def install():
+    """Pragmy SQLite dla każdego nowego połączenia (CoreConfig.ready)."""
+    connection_created.connect(_configure_sqlite, dispatch_uid="core.db")
+
+def tune_databases(databases: dict, *, pool: bool, pool_min: int, pool_max: int, pool_timeout: float):
+    """Opcje silnika dla wpisów DATABASES (wywoływane z settings)."""
+    for config in databases.values():
+        options = config.setdefault("OPTIONS", {})
+        if config["ENGINE"] == "django.db.backends.sqlite3":
+            options.setdefault("transaction_mode", "IMMEDIATE")
+        elif config["ENGINE"] == "django.db.backends.postgresql":
+            # przy puli włącza ConnectionPool.check_connection, bez niej — sprawdzanie trwałego połączenia
+            config["CONN_HEALTH_CHECKS"] = True
+            if pool and importlib.util.find_spec("psycopg_pool"):
+                config["CONN_MAX_AGE"] = 0
+                options.setdefault("pool", {"min_size": pool_min, "max_size": pool_max, "timeout": pool_timeout})
@@ -0,0 +1,150 @@
+# core/exports.py
+"""
+Eksport wizyt: CSV (do księgowości) i iCalendar (subskrypcja kalendarza).
+
+Oba formaty są strumieniowane (StreamingHttpResponse w core.views): wiersze
+idą z bazy przez values_list(...).iterator(chunk_size=EXPORT_CHUNK) — bez
+instancji modeli, a na Postgresie kursorem po stronie serwera — i są
+sklejane w kawałki odpowiedzi po EXPORT_CHUNK wierszy. Pamięć nie zależy
+od liczby wizyt.
+
+Feedy ICS pobierają programy kalendarzowe bez sesji, więc adres zawiera
+podpisany token (feed_token) z kliniką, opcjonalnie wetem i kluczem feedów
+kliniki (Clinic.feed_key) — nowy klucz unieważnia wszystkie wydane adresy.
+
+Komórki CSV zaczynające się od znaku formuły (=, +, -, @, tab, CR)
+dostają prefiks ' — imiona zwierząt i e-maile wpisują użytkownicy, a plik
+otwiera się w arkuszu.
+"""
+import csv
+from datetime import timezone as dt_timezone
+from itertools import islice
+
+from django.core import signing
+from django.utils import timezone
+
+EXPORT_CHUNK = 2000   # wierszy na porcję z bazy i na kawałek odpowiedzi
+
+def _rows(qs, fields):
+    # alias bazy ustalamy teraz: generator ruszy po wyjściu z widoku (i z replica_reads)
+    return (qs.using(qs.db).order_by("starts_at", "id")
+            .values_list(*fields).iterator(chunk_size=EXPORT_CHUNK))
+
+def _chunks(lines):
+    """Linie tekstu → kawałki bajtów po EXPORT_CHUNK linii."""
+    while True:
+        chunk = "".join(islice(lines, EXPORT_CHUNK))
+        if not chunk:
+            return
+        yield chunk.encode("utf-8")
+
+# ───────────────────────────────────────────────────────────────────────────────
+# CSV
+# ───────────────────────────────────────────────────────────────────────────────
+
+CSV_FIELDS = ("id", "starts_at", "ends_at", "status", "vet_id", "vet__title",
+              "pet__name", "pet__species", "owner__email", "needs_followup")
+CSV_HEADER = ("id", "poczatek", "koniec", "status", "wet_id", "wet",
+              "zwierze", "gatunek", "wlasciciel", "do_przelozenia")
+
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+def _cell(value):
+    """Tekst, którego arkusz nie potraktuje jak formuły."""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+class _Echo:
+    """„Plik” dla csv.writer — writerow zwraca gotową linię zamiast ją zapisywać."""
+    def write(self, value):
+        return value
+
+def _csv_lines(rows):
+    writer = csv.writer(_Echo())
+    tz = timezone.get_current_timezone()
+    yield "\ufeff" + writer.writerow(CSV_HEADER)  # BOM: arkusze rozpoznają UTF-8
+    for pk, start, end, status, vet_id, vet, pet, species, owner, followup in rows:
+        yield writer.writerow((
+            pk, start.astimezone(tz).isoformat(timespec="minutes"), end.astimezone(tz).isoformat(timespec="minutes"),
+            status, vet_id, _cell(vet), _cell(pet), _cell(species), _cell(owner), int(followup),
+        ))
+
+def csv_stream(appointments):
+    """QuerySet wizyt → kawałki CSV (czas lokalny, od najstarszej)."""
+    return _chunks(_csv_lines(_rows(appointments, CSV_FIELDS)))
+
+# ───────────────────────────────────────────────────────────────────────────────
+# iCalendar (RFC 5545)
+# ───────────────────────────────────────────────────────────────────────────────
+
+ICS_FIELDS = ("id", "starts_at", "ends_at", "status", "updated_at", "vet_id", "vet__title",
+              "pet__name", "pet__species")
+UID_DOMAIN = "petnav"   # UID musi być stały między pobraniami — nie z nagłówka Host
+ICS_STATUS = {"NEW": "TENTATIVE", "CONFIRMED": "CONFIRMED", "CANCELLED": "CANCELLED"}
+
+def _ics_text(value) -> str:
+    return (str(value).replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+def _ics_time(value) -> str:
+    return value.astimezone(dt_timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+def _fold(line: str) -> str:
+    """Linia z CRLF, zawinięta co 75 oktetów (kontynuacja od spacji)."""
+    raw = line.encode("utf-8")
+    if len(raw) <= 75:
+        return line + "\r\n"
+    parts, start, limit = [], 0, 75
+    while len(raw) - start > limit:
+        cut = start + limit
+        while raw[cut] & 0xC0 == 0x80:  # nie w środku znaku UTF-8
+            cut -= 1
+        parts.append(raw[start:cut])
+        start, limit = cut, 74          # 74 + spacja kontynuacji
+    parts.append(raw[start:])
+    return b"\r\n ".join(parts).decode("utf-8") + "\r\n"
+
+def _ics_lines(rows, name):
+    yield "".join(map(_fold, (
+        "BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//petnav//wizyty//PL",
+        "CALSCALE:GREGORIAN", "METHOD:PUBLISH", f"X-WR-CALNAME:{_ics_text(name)}",
+    )))
+    for pk, start, end, status, updated, vet_id, vet, pet, species in rows:
+        yield "".join((
+            "BEGIN:VEVENT\r\n",
+            f"UID:appt-{pk}@{UID_DOMAIN}\r\n",
+            f"DTSTAMP:{_ics_time(updated)}\r\n",
+            f"DTSTART:{_ics_time(start)}\r\n",
+            f"DTEND:{_ics_time(end)}\r\n",
+            f"STATUS:{ICS_STATUS.get(status, 'TENTATIVE')}\r\n",
+            _fold(f"SUMMARY:{_ics_text(f'{pet} ({species})')}"),
+            _fold(f"DESCRIPTION:{_ics_text(vet or f'Wet #{vet_id}')}"),
+            "END:VEVENT\r\n",
+        ))
+    yield "END:VCALENDAR\r\n"
+
+def ics_stream(appointments, name: str):
+    """QuerySet wizyt → kawałki kalendarza `name` (czasy w UTC)."""
+    return _chunks(_ics_lines(_rows(appointments, ICS_FIELDS), name))
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Tokeny feedów
+# ───────────────────────────────────────────────────────────────────────────────
+
+FEED_SALT = "core.exports.feed"
+
+def feed_token(clinic, vet_id=None) -> str:
+    """Token do adresu feedu kliniki (vet_id=None) albo jednego weta."""
+    return signing.dumps([clinic.id, vet_id, clinic.feed_key], salt=FEED_SALT)
+
+def feed_target(token: str):
+    """
+    (clinic_id, vet_id | None, feed_key) z tokenu albo None, gdy podpis się
+    nie zgadza. Klucz porównuje z kliniką wywołujący (core.views).
+    """
+    try:
+        clinic_id, vet_id, key = signing.loads(token, salt=FEED_SALT)
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+    return clinic_id, vet_id, key
@@ -0,0 +1,230 @@
+import json
+import platform
+import statistics
+import time
+from datetime import timedelta
+from unittest import mock
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User as DjangoUser
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.backends.utils import CursorDebugWrapper
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.test.runner import DiscoverRunner
+from django.utils import timezone
+
+from core import availability
+from core.models import Clinic, Pet, User
+
+# rozmiary zbiorów: argumenty dla generate_data
+SIZES = {
+    "small": {"clinics": 5, "vets": 3, "owners": 500, "appointments": 5_000},
+    "medium": {"clinics": 20, "vets": 5, "owners": 5_000, "appointments": 100_000},
+    "large": {"clinics": 50, "vets": 8, "owners": 20_000, "appointments": 1_000_000},
+}
+SEED = 16
+
+
+class _Rows:
+    """Licznik wierszy pobranych z kursora w czasie żądania."""
+    count = 0
+
+
+class _CountingCursor(CursorDebugWrapper):
+    def fetchone(self):
+        row = self.cursor.fetchone()
+        _Rows.count += row is not None
+        return row
+
+    def fetchmany(self, *args):
+        rows = self.cursor.fetchmany(*args)
+        _Rows.count += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self.cursor.fetchall()
+        _Rows.count += len(rows)
+        return rows
+
+    def __iter__(self):
+        for row in self.cursor:
+            _Rows.count += 1
+            yield row
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark gorących ścieżek (sloty, rezerwacja, historia właściciela, kalendarz) "
+        "na tymczasowej bazie testowej z danymi z generate_data. Wynik w JSON: p50/p95, "
+        "zapytania i wiersze na żądanie. Z --budget: błąd przy przekroczeniu budżetu."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="small,medium",
+                            help=f"rozmiary zbiorów, po przecinku: {', '.join(SIZES)}")
+        parser.add_argument("--requests", type=int, default=50, help="żądań na scenariusz")
+        parser.add_argument("--output", help="plik na wynik JSON (domyślnie stdout)")
+        parser.add_argument("--budget", help="plik JSON z budżetem {rozmiar|*: {scenariusz: {limit: wartość}}}")
+
+    def handle(self, *args, sizes, requests, output, budget, **options):
+        sizes = [s.strip() for s in sizes.split(",") if s.strip()]
+        unknown = [s for s in sizes if s not in SIZES]
+        if unknown:
+            raise CommandError(f"Nieznane rozmiary: {', '.join(unknown)}")
+        limits = self._load_budget(budget) if budget else None
+
+        setup_test_environment()
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        old_config = runner.setup_databases()
+        try:
+            report = {"meta": self._meta(requests), "results": {}}
+            for size in sizes:
+                self.stderr.write(f"[{size}] generowanie danych…")
+                call_command("flush", interactive=False, verbosity=0)
+                cache.clear()
+                call_command("generate_data", seed=SEED, stdout=self.stderr, **SIZES[size])
+                report["results"][size] = self._run_size(size, requests)
+        finally:
+            runner.teardown_databases(old_config)
+            teardown_test_environment()
+
+        text = json.dumps(report, indent=2, ensure_ascii=False)
+        if output:
+            with open(output, "w", encoding="utf-8") as fh:
+                fh.write(text + "\n")
+            self.stderr.write(f"Zapisano {output}")
+        else:
+            self.stdout.write(text)
+
+        if limits is not None:
+            failures = self._check_budget(report["results"], limits)
+            if failures:
+                raise CommandError("Przekroczony budżet:\n  " + "\n  ".join(failures))
+            self.stderr.write(self.style.SUCCESS("Budżet OK"))
+
+    # ───────────────────────────────────────────────────────────────────────────
+    # Scenariusze
+    # ───────────────────────────────────────────────────────────────────────────
+
+    def _run_size(self, size, n):
+        # klinika z największą liczbą wizyt i właściciel z najdłuższą historią
+        clinic = Clinic.objects.annotate(n=Count("appointment")).order_by("-n", "id").first()
+        owner = User.objects.annotate(n=Count("appointment")).order_by("-n", "id").first()
+        admin = User.objects.create(email="bench-admin@gen.invalid", role="CLINIC_ADMIN")
+        owner_client, admin_client = Client(), Client()
+        owner_client.force_login(self._auth_user(owner, "bench-owner"))
+        admin_client.force_login(self._auth_user(admin, "bench-admin"))
+        # panel kliniki obsługuje pierwszą klinikę (core.views._clinic_for_admin)
+        admin_clinic = Clinic.objects.order_by("id").first()
+        pet = Pet.objects.filter(owner=owner).first()
+
+        today = timezone.localdate()
+        days = [today + timedelta(days=i) for i in range(1, 15)]
+        free = [(s, e) for d in days for s, e in availability.day_slots(clinic, d)]
+        slots_url = f"/clinics/{clinic.id}/slots"
+
+        scenarios = {
+            "clinic_slots_cold": (lambda i: owner_client.get(
+                slots_url, {"date": days[i % len(days)].isoformat()}), cache.clear),
+            "clinic_slots_warm": (lambda i: owner_client.get(
+                slots_url, {"date": days[i % len(days)].isoformat()}), None),
+            "book_confirm": (lambda i: owner_client.post(
+                f"/clinics/{clinic.id}/book/confirm",
+                {"pet_id": pet.id, "start": free[i][0].isoformat(), "end": free[i][1].isoformat()}), None),
+            "my_appointments": (lambda i: owner_client.get("/appointments/"), None),
+            "clinic_calendar": (lambda i: admin_client.get(
+                "/clinic-admin/calendar/", {"date": days[i % len(days)].isoformat()}), None),
+        }
+        self.stderr.write(f"[{size}] klinika #{clinic.id}, właściciel #{owner.id}, "
+                          f"klinika panelu #{admin_clinic.id}, {len(free)} wolnych slotów")
+        # cache ciepły dla wszystkich dni z rotacji, nie tylko dla rozgrzewki z indeksem -1
+        warm = {"clinic_slots_warm": range(len(days))}
+        results = {}
+        for name, (call, before) in scenarios.items():
+            count = min(n, len(free) - 1) if name == "book_confirm" else n
+            results[name] = self._measure(call, count, before, warm.get(name, (-1,)))
+            self.stderr.write(f"[{size}] {name}: p50 {results[name]['p50_ms']} ms, "
+                              f"p95 {results[name]['p95_ms']} ms, zapytań {results[name]['queries']['max']}")
+        return results
+
+    def _auth_user(self, domain_user, username):
+        auth = DjangoUser.objects.create_user(username)
+        domain_user.auth_user = auth
+        domain_user.save(update_fields=["auth_user"])
+        return auth
+
+    def _measure(self, call, n, before=None, warmup=(-1,)) -> dict:
+        # rozgrzewka (sesja, profil, szablony); domyślnie osobny indeks — nie zajmuje slotu z pomiaru
+        for i in warmup:
+            call(i)
+        latencies, queries, rows, statuses = [], [], [], {}
+        with mock.patch.object(connection, "make_debug_cursor", lambda cursor: _CountingCursor(cursor, connection)):
+            for i in range(n):
+                if before:
+                    before()
+                _Rows.count = 0
+                with CaptureQueriesContext(connection) as ctx:
+                    t0 = time.perf_counter()
+                    response = call(i)
+                    latencies.append((time.perf_counter() - t0) * 1000)
+                queries.append(len(ctx))
+                rows.append(_Rows.count)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        return {
+            "requests": n,
+            "p50_ms": round(_percentile(latencies, 0.50), 2),
+            "p95_ms": round(_percentile(latencies, 0.95), 2),
+            "mean_ms": round(statistics.fmean(latencies), 2),
+            "queries": {"median": statistics.median(queries), "max": max(queries)},
+            "rows": {"median": statistics.median(rows), "max": max(rows)},
+            "status": {str(k): v for k, v in sorted(statuses.items())},
+        }
+
+    # ───────────────────────────────────────────────────────────────────────────
+    # Meta i budżet
+    # ───────────────────────────────────────────────────────────────────────────
+
+    def _meta(self, requests):
+        return {
+            "when": timezone.now().isoformat(timespec="seconds"),
+            "django": django.get_version(),
+            "python": platform.python_version(),
+            "db": connection.vendor,
+            "cache": settings.CACHES["default"]["BACKEND"],
+            "seed": SEED,
+            "requests": requests,
+        }
+
+    def _load_budget(self, path):
+        try:
+            with open(path, encoding="utf-8") as fh:
+                return json.load(fh)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Nie można wczytać budżetu {path}: {exc}")
+
+    def _check_budget(self, results, limits):
+        """
+        Limity: max_queries, max_rows (maksimum z żądań), p50_ms, p95_ms.
+        Rozmiar "*" obowiązuje wszystkie rozmiary, konkretny go nadpisuje.
+        """
+        failures = []
+        for size, scenarios in results.items():
+            for name, res in scenarios.items():
+                limit = {**limits.get("*", {}).get(name, {}), **limits.get(size, {}).get(name, {})}
+                actual = {"max_queries": res["queries"]["max"], "max_rows": res["rows"]["max"],
+                          "p50_ms": res["p50_ms"], "p95_ms": res["p95_ms"]}
+                for key, bound in sorted(limit.items()):
+                    if key in actual and actual[key] > bound:
+                        failures.append(f"{size}/{name}: {key} = {actual[key]} > {bound}")
+        return failures
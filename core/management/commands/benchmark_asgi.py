@@ -0,0 +1,205 @@
+import asyncio
+import json
+import statistics
+import threading
+import time
+import types
+from datetime import timedelta
+
+from django.contrib.auth.models import User as DjangoUser
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Count
+from django.test import AsyncClient, Client, override_settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import include, path
+from django.utils import timezone
+
+from core import urls
+from core.models import Clinic, User
+
+from .benchmark import SEED, SIZES, _percentile
+
+# ścieżka: (serwer, widoki async)
+MODES = {
+    "wsgi-sync": ("wsgi", False),    # gunicorn sync/gthread — wątek na żądanie
+    "asgi-sync": ("asgi", False),    # ASGI, widoki sync w wątkach
+    "asgi-async": ("asgi", True),    # ASGI z ASYNC_VIEWS=1 (core.async_views)
+}
+BATCH_CLINICS = 20
+_lock = threading.Lock()
+
+
+def _urlconf(use_async):
+    # te same ścieżki co core.urls, z wybraną wersją gorących widoków na początku
+    module = types.ModuleType(f"benchmark_asgi_urls_{int(use_async)}")
+    module.urlpatterns = [path("", include(urls.hot_paths(use_async) + urls.urlpatterns))]
+    return module
+
+
+class Command(BaseCommand):
+    help = (
+        "Przepustowość gorących widoków (sloty, lista klinik, sloty wielu klinik) przy "
+        "równoległych żądaniach: WSGI z wątkami, ASGI z widokami sync i ASGI z widokami "
+        "async (core.async_views). Dane z generate_data na tymczasowej bazie testowej; "
+        "wynik w JSON: żądania/s, p50/p95."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size", default="small", choices=list(SIZES))
+        parser.add_argument("--requests", type=int, default=200, help="żądań na scenariusz i ścieżkę")
+        parser.add_argument("--concurrency", type=int, default=16, help="równoległych klientów")
+        parser.add_argument("--modes", default=",".join(MODES), help="ścieżki, po przecinku")
+        parser.add_argument("--output", help="plik na wynik JSON (domyślnie stdout)")
+
+    def handle(self, *args, size, requests, concurrency, modes, output, **options):
+        modes = [m.strip() for m in modes.split(",") if m.strip()]
+        unknown = [m for m in modes if m not in MODES]
+        if unknown:
+            raise CommandError(f"Nieznane ścieżki: {', '.join(unknown)}")
+        if requests < 1 or concurrency < 1:
+            raise CommandError("--requests i --concurrency muszą być ≥ 1")
+
+        setup_test_environment()
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        old_config = runner.setup_databases()
+        try:
+            self.stderr.write(f"[{size}] generowanie danych…")
+            cache.clear()
+            call_command("generate_data", seed=SEED, stdout=self.stderr, **SIZES[size])
+            report = {
+                "meta": {"when": timezone.now().isoformat(timespec="seconds"), "size": size,
+                         "db": connections["default"].vendor, "seed": SEED,
+                         "requests": requests, "concurrency": concurrency},
+                "results": self._run(modes, requests, concurrency),
+            }
+        finally:
+            connections.close_all()
+            runner.teardown_databases(old_config)
+            teardown_test_environment()
+
+        text = json.dumps(report, indent=2, ensure_ascii=False)
+        if output:
+            with open(output, "w", encoding="utf-8") as fh:
+                fh.write(text + "\n")
+            self.stderr.write(f"Zapisano {output}")
+        else:
+            self.stdout.write(text)
+
+    # ───────────────────────────────────────────────────────────────────────────
+    # Scenariusze
+    # ───────────────────────────────────────────────────────────────────────────
+
+    def _run(self, modes, n, concurrency):
+        clinic_ids = list(Clinic.objects.annotate(n=Count("appointment")).order_by("-n", "id")
+                          .values_list("id", flat=True))
+        owner = User.objects.annotate(n=Count("appointment")).order_by("-n", "id").first()
+        auth = DjangoUser.objects.create_user("bench-asgi-owner")
+        owner.auth_user = auth
+        owner.save(update_fields=["auth_user"])
+        # jedna sesja dla wszystkich klientów — równoległe logowania blokowałyby SQLite
+        login = Client()
+        login.force_login(auth)
+        cookies = login.cookies
+
+        today = timezone.localdate()
+        days = [(today + timedelta(days=i)).isoformat() for i in range(1, 366)]
+        # zimne: każde żądanie to inna para (klinika, dzień) — zawsze chybienie cache
+        pairs = [(cid, d) for d in days for cid in clinic_ids]
+        batch_ids = ",".join(str(cid) for cid in clinic_ids[:BATCH_CLINICS])
+        scenarios = {
+            "clinic_slots_warm": (lambda i: (f"/clinics/{clinic_ids[0]}/slots", {"date": days[i % 7]}), False),
+            "clinic_slots_cold": (lambda i: (f"/clinics/{pairs[i % len(pairs)][0]}/slots",
+                                             {"date": pairs[i % len(pairs)][1]}), True),
+            "clinics_page": (lambda i: ("/clinics/", {}), False),
+            "clinics_batch_cold": (lambda i: ("/clinics/slots", {"ids": batch_ids, "date": days[i % len(days)]}), True),
+        }
+
+        results = {}
+        for name, (request_for, cold) in scenarios.items():
+            results[name] = {}
+            for mode in modes:
+                server, use_async = MODES[mode]
+                # PERF_SLOW_REQUEST_MS: pod obciążeniem prawie każde żądanie trafiłoby do logu
+                with override_settings(ROOT_URLCONF=_urlconf(use_async), ASYNC_VIEWS=use_async,
+                                       PERF_SLOW_REQUEST_MS=10 ** 9):
+                    cache.clear()
+                    if not cold:
+                        self._sync_worker(cookies, request_for, range(1), [], {})  # rozgrzanie cache
+                    run = self._run_wsgi if server == "wsgi" else self._run_asgi
+                    results[name][mode] = run(cookies, request_for, n, concurrency)
+                r = results[name][mode]
+                self.stderr.write(f"{name} [{mode}]: {r['rps']} żądań/s, p50 {r['p50_ms']} ms, "
+                                  f"p95 {r['p95_ms']} ms")
+        return results
+
+    # ───────────────────────────────────────────────────────────────────────────
+    # Ścieżki
+    # ───────────────────────────────────────────────────────────────────────────
+
+    def _sync_worker(self, cookies, request_for, indexes, latencies, statuses):
+        client = Client()
+        client.cookies = cookies.copy()
+        try:
+            for i in indexes:
+                url, params = request_for(i)
+                t0 = time.perf_counter()
+                try:
+                    status = client.get(url, params).status_code
+                except Exception as exc:  # liczymy jako błąd, wątek idzie dalej
+                    status = type(exc).__name__
+                latencies.append((time.perf_counter() - t0) * 1000)
+                with _lock:
+                    statuses[status] = statuses.get(status, 0) + 1
+        finally:
+            connections.close_all()  # połączenia tego wątku
+
+    def _run_wsgi(self, cookies, request_for, n, concurrency):
+        latencies, statuses = [], {}
+        threads = [
+            threading.Thread(target=self._sync_worker,
+                             args=(cookies, request_for, range(k, n, concurrency), latencies, statuses))
+            for k in range(min(concurrency, n))
+        ]
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return self._summary(latencies, statuses, time.perf_counter() - t0)
+
+    def _run_asgi(self, cookies, request_for, n, concurrency):
+        latencies, statuses = [], {}
+
+        async def worker(client, indexes):
+            for i in indexes:
+                url, params = request_for(i)
+                t0 = time.perf_counter()
+                try:
+                    status = (await client.get(url, params)).status_code
+                except Exception as exc:
+                    status = type(exc).__name__
+                latencies.append((time.perf_counter() - t0) * 1000)
+                statuses[status] = statuses.get(status, 0) + 1
+
+        async def main():
+            client = AsyncClient()
+            client.cookies = cookies.copy()
+            t0 = time.perf_counter()
+            await asyncio.gather(*(worker(client, range(k, n, concurrency)) for k in range(min(concurrency, n))))
+            return time.perf_counter() - t0
+
+        return self._summary(latencies, statuses, asyncio.run(main()))
+
+    def _summary(self, latencies, statuses, wall_s) -> dict:
+        return {
+            "requests": len(latencies),
+            "rps": round(len(latencies) / wall_s, 1),
+            "p50_ms": round(_percentile(latencies, 0.50), 2),
+            "p95_ms": round(_percentile(latencies, 0.95), 2),
+            "mean_ms": round(statistics.fmean(latencies), 2),
+            "status": {str(k): v for k, v in sorted(statuses.items())},
+        }
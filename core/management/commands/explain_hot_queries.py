@@ -0,0 +1,97 @@
+import random
+import re
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core import availability
+from core.models import Appointment, Clinic, Pet, User, Vet
+
+# Plan z pełnym skanem tabeli wizyt: SQLite "SCAN core_appointment", Postgres "Seq Scan on"
+FULL_SCAN = {
+    "sqlite": re.compile(r"\bSCAN (TABLE )?core_appointment\b"),
+    "postgresql": re.compile(r"Seq Scan on core_appointment\b"),
+}
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN gorących zapytań o wizyty (sloty, kalendarz, historia właściciela) "
+        "na dużym, tymczasowym zbiorze danych; błąd, gdy któreś robi pełny skan."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--appointments", type=int, default=50_000,
+                            help="ile syntetycznych wizyt dodać (wycofywane na końcu)")
+        parser.add_argument("--no-seed", action="store_true", help="użyj istniejących danych")
+
+    def handle(self, *args, appointments, no_seed, **options):
+        pattern = FULL_SCAN.get(connection.vendor)
+        if pattern is None:
+            raise CommandError(f"Nieobsługiwany backend: {connection.vendor}")
+        try:
+            with transaction.atomic():
+                if not no_seed:
+                    self._seed(appointments)
+                failures = self._explain(pattern)
+                raise _Rollback()
+        except _Rollback:
+            pass
+        if failures:
+            raise CommandError("Pełny skan w: " + ", ".join(failures))
+        self.stdout.write(self.style.SUCCESS("Wszystkie gorące zapytania używają indeksów"))
+
+    def _seed(self, n):
+        rng = random.Random(7)
+        clinics = Clinic.objects.bulk_create([Clinic(name=f"explain-{i}", city="Explain") for i in range(50)])
+        owners = User.objects.bulk_create([User(email=f"explain-{i}@example.invalid") for i in range(500)])
+        pets = Pet.objects.bulk_create([Pet(owner=o, name="Pet", species="dog") for o in owners])
+        vets = Vet.objects.bulk_create([Vet(user=owners[0], clinic=c) for c in clinics for _ in range(4)])
+        base = timezone.now() - timedelta(days=365)
+        batch = []
+        for _ in range(n):
+            vet, i = rng.choice(vets), rng.randrange(len(owners))
+            start = base + timedelta(minutes=30 * rng.randrange(2 * 24 * 730))
+            batch.append(Appointment(
+                clinic_id=vet.clinic_id, vet=vet, owner=owners[i], pet=pets[i],
+                starts_at=start, ends_at=start + timedelta(minutes=30),
+                status=rng.choice(("NEW", "CONFIRMED", "CANCELLED")),
+            ))
+            if len(batch) == 5000:
+                Appointment.objects.bulk_create(batch)
+                batch = []
+        Appointment.objects.bulk_create(batch)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        self.stdout.write(f"Dodano {n} wizyt (zostaną wycofane)")
+
+    def _explain(self, pattern):
+        clinic = Clinic.objects.order_by("-id").first()
+        owner = Appointment.objects.values_list("owner_id", flat=True).order_by("-id").first()
+        if clinic is None or owner is None:
+            raise CommandError("Brak danych — uruchom bez --no-seed")
+        day_start = timezone.now()
+        day_end = day_start + timedelta(days=1)
+
+        queries = {
+            "clinic_slots": availability.busy_appointments([clinic.id], day_start, day_end),
+            "clinic_calendar": Appointment.objects.filter(
+                clinic=clinic, starts_at__gte=day_start, starts_at__lt=day_end + timedelta(days=6)
+            ).order_by("starts_at"),
+            "my_appointments": Appointment.objects.filter(owner_id=owner).order_by("starts_at", "id"),
+        }
+        failures = []
+        for name, qs in queries.items():
+            plan = qs.explain()
+            bad = bool(pattern.search(plan))
+            self.stdout.write(f"── {name}: {'PEŁNY SKAN' if bad else 'ok'}")
+            self.stdout.write(plan)
+            if bad:
+                failures.append(name)
+        return failures
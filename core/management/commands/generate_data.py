@@ -0,0 +1,233 @@
+import random
+import time
+from datetime import date, datetime, time as dtime, timedelta
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.timezone import make_aware
+
+from core import availability, slot_cache
+from core.models import (
+    Appointment, AvailabilityException, Clinic, ClinicHours, Pet, User, Vet, VetHours
+)
+
+CITIES = ["Warszawa", "Kraków", "Wrocław", "Poznań", "Gdańsk", "Łódź", "Szczecin", "Lublin",
+          "Katowice", "Białystok", "Rzeszów", "Toruń", "Olsztyn", "Opole", "Kielce"]
+SPECIES = ["dog", "cat", "rabbit", "bird", "reptile"]
+PET_NAMES = ["Rex", "Luna", "Milo", "Bella", "Kicia", "Azor", "Fafik", "Mruczek", "Tofik", "Nela"]
+
+# wzorce godzin kliniki: {dzień tygodnia: (start, koniec)}
+HOURS_PATTERNS = [
+    {wd: (dtime(9), dtime(17)) for wd in range(5)},
+    {**{wd: (dtime(8), dtime(20)) for wd in range(5)}, 5: (dtime(9), dtime(14))},
+    {wd: (dtime(8), dtime(18)) for wd in range(7)},
+]
+SLOT = timedelta(minutes=availability.SLOT_MINUTES)
+EMAIL_DOMAIN = "gen.invalid"
+CLEAR_BATCH = 500   # klinik na DELETE wizyt przy --clear
+
+
+class Command(BaseCommand):
+    help = (
+        "Syntetyczne dane do testów obciążeniowych: kliniki w wielu miastach, weci, godziny "
+        "i wyjątki, właściciele ze zwierzętami i wizyty w zakresie dat. bulk_create w porcjach, "
+        "stałe ziarno RNG — ten sam zestaw parametrów daje ten sam zbiór."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clinics", type=int, default=50)
+        parser.add_argument("--vets", type=int, default=5, help="wetów na klinikę")
+        parser.add_argument("--owners", type=int, default=5_000)
+        parser.add_argument("--pets", type=int, default=2, help="maks. zwierząt na właściciela")
+        parser.add_argument("--appointments", type=int, default=100_000)
+        parser.add_argument("--from", dest="first", type=date.fromisoformat,
+                            help="pierwszy dzień wizyt (domyślnie dziś − 180 dni)")
+        parser.add_argument("--to", dest="last", type=date.fromisoformat,
+                            help="ostatni dzień wizyt (domyślnie dziś + 30 dni)")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--batch", type=int, default=5_000, help="wierszy na bulk_create")
+        parser.add_argument("--no-stats", action="store_true", help="bez przeliczania ClinicDayStats")
+        parser.add_argument("--clear", action="store_true",
+                            help=f"usuń wcześniej wygenerowane dane (konta @{EMAIL_DOMAIN}) i zakończ")
+
+    def handle(self, *args, **opts):
+        if opts["clear"]:
+            return self._clear()
+        today = timezone.localdate()
+        first = opts["first"] or today - timedelta(days=180)
+        last = opts["last"] or today + timedelta(days=30)
+        if first > last:
+            raise CommandError("--from jest po --to")
+        if min(opts["clinics"], opts["vets"], opts["owners"], opts["pets"]) < 1:
+            raise CommandError("--clinics, --vets, --owners i --pets muszą być ≥ 1")
+        if User.objects.filter(email__endswith=f"-{opts['seed']}@{EMAIL_DOMAIN}").exists():
+            raise CommandError(f"Dane dla --seed {opts['seed']} już są; użyj innego ziarna albo --clear")
+
+        self.rng = random.Random(opts["seed"])
+        self.batch = opts["batch"]
+        self.today = today
+        t0 = time.perf_counter()
+        clinics, patterns = self._clinics(opts["clinics"], opts["seed"])
+        vets = self._vets(clinics, patterns, opts["vets"], opts["seed"])
+        self._exceptions(clinics, vets, first, last)
+        pets = self._owners(opts["owners"], opts["pets"], opts["seed"])
+        n = self._appointments(clinics, patterns, vets, pets, opts["appointments"], first, last)
+        self.stdout.write(f"Wizyty: {n} w {time.perf_counter() - t0:.1f} s")
+
+        for c in clinics:
+            slot_cache.bump_clinic(c.id)  # bulk_create omija sygnały
+        slot_cache.bump_clinics()
+        if not opts["no_stats"]:
+            call_command("rebuild_day_stats", *[f"--clinic={c.id}" for c in clinics],
+                         f"--from={first}", f"--to={last}", stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f"Gotowe: {len(clinics)} klinik, {sum(len(v) for v in vets.values())} wetów, "
+            f"{opts['owners']} właścicieli, {len(pets)} zwierząt, {n} wizyt "
+            f"({time.perf_counter() - t0:.1f} s)"
+        ))
+
+    # ───────────────────────────────────────────────────────────────────────────
+    # Etapy
+    # ───────────────────────────────────────────────────────────────────────────
+
+    def _bulk(self, model, objs):
+        created = []
+        for i in range(0, len(objs), self.batch):
+            with transaction.atomic():
+                created += model.objects.bulk_create(objs[i:i + self.batch])
+        return created
+
+    def _clinics(self, n, seed):
+        rng = self.rng
+        clinics = self._bulk(Clinic, [
+            Clinic(name=f"Klinika {i + 1} ({seed})", city=rng.choice(CITIES), address=f"ul. Testowa {i + 1}",
+                   species=",".join(sorted(rng.sample(SPECIES, rng.randint(1, 3)))) if rng.random() < 0.5 else "")
+            for i in range(n)
+        ])
+        patterns = {c.id: rng.choice(HOURS_PATTERNS) for c in clinics}
+        self._bulk(ClinicHours, [
+            ClinicHours(clinic=c, weekday=wd, start=s, end=e)
+            for c in clinics for wd, (s, e) in sorted(patterns[c.id].items())
+        ])
+        return clinics, patterns
+
+    def _vets(self, clinics, patterns, per_clinic, seed):
+        rng = self.rng
+        users = self._bulk(User, [
+            User(email=f"vet{i}-{seed}@{EMAIL_DOMAIN}", role="VET") for i in range(len(clinics) * per_clinic)
+        ])
+        vets = self._bulk(Vet, [
+            Vet(user=users[i * per_clinic + j], clinic=c, title="lek. wet.")
+            for i, c in enumerate(clinics) for j in range(per_clinic)
+        ])
+        by_clinic, hours = {}, []
+        for v in vets:
+            by_clinic.setdefault(v.clinic_id, []).append(v)
+            if rng.random() < 0.3:
+                # część wetów pracuje krócej niż klinika, w wybrane dni
+                for wd, (s, e) in patterns[v.clinic_id].items():
+                    if rng.random() < 0.7:
+                        hours.append(VetHours(vet=v, weekday=wd, start=s, end=dtime(min(e.hour, s.hour + 6))))
+        self._bulk(VetHours, hours)
+        return by_clinic
+
+    def _exceptions(self, clinics, vets, first, last):
+        rng = self.rng
+        span = (last - first).days
+        rows = []
+        for c in clinics:
+            # święta kliniki: 1–3 zamknięte dni
+            for _ in range(rng.randint(1, 3)):
+                rows.append(AvailabilityException(entity_type="CLINIC", entity_id=c.id,
+                                                  date=first + timedelta(days=rng.randint(0, span)), closed=True))
+            if rng.random() < 0.3:
+                # "w tym miesiącu piątki do 14:00"
+                d = first + timedelta(days=rng.randint(0, span))
+                rows.append(AvailabilityException(entity_type="CLINIC", entity_id=c.id, date=d,
+                                                  date_to=d + timedelta(days=30), weekday=4,
+                                                  start=dtime(9), end=dtime(14)))
+            for v in vets[c.id]:
+                if rng.random() < 0.4:
+                    # urlop weta: 5–14 dni
+                    d = first + timedelta(days=rng.randint(0, span))
+                    rows.append(AvailabilityException(entity_type="VET", entity_id=v.id, date=d,
+                                                      date_to=d + timedelta(days=rng.randint(4, 13)), closed=True))
+        self._bulk(AvailabilityException, rows)
+
+    def _owners(self, n, max_pets, seed):
+        rng = self.rng
+        owners = self._bulk(User, [User(email=f"owner{i}-{seed}@{EMAIL_DOMAIN}") for i in range(n)])
+        pets = self._bulk(Pet, [
+            Pet(owner=o, name=rng.choice(PET_NAMES), species=rng.choice(SPECIES))
+            for o in owners for _ in range(rng.randint(1, max_pets))
+        ])
+        return [(p.id, p.owner_id) for p in pets]
+
+    def _appointments(self, clinics, patterns, vets, pets, total, first, last) -> int:
+        """
+        Wizyty bez kolizji: każdy wet losuje bez zwracania ze slotów godzin swojej
+        kliniki w zakresie, więc pamięć rośnie z liczbą wetów, nie wizyt.
+        """
+        rng = self.rng
+        all_vets = [v for c in clinics for v in vets[c.id]]
+        per_vet = [total // len(all_vets) + (1 if i < total % len(all_vets) else 0) for i in range(len(all_vets))]
+        days = availability.days_between(first, last)
+        grid_cache = {}
+        midnight = {d: make_aware(datetime.combine(d, dtime(0, 0))) for d in days}
+        now = timezone.now()
+        created, batch = 0, []
+        for vet, k in zip(all_vets, per_vet):
+            grid = grid_cache.get(vet.clinic_id)
+            if grid is None:
+                pattern = patterns[vet.clinic_id]
+                grid = grid_cache[vet.clinic_id] = [
+                    (d, m)
+                    for d in days if d.weekday() in pattern
+                    for m in range(availability.minutes(pattern[d.weekday()][0]),
+                                   availability.minutes(pattern[d.weekday()][1]), availability.SLOT_MINUTES)
+                ]
+            for idx in sorted(rng.sample(range(len(grid)), min(k, len(grid)))):
+                d, m = grid[idx]
+                start = midnight[d] + timedelta(minutes=m)
+                pet_id, owner_id = rng.choice(pets)
+                r = rng.random()
+                if start < now:
+                    status = "CONFIRMED" if r < 0.7 else "CANCELLED" if r < 0.85 else "NEW"
+                else:
+                    status = "NEW" if r < 0.8 else "CONFIRMED" if r < 0.95 else "CANCELLED"
+                batch.append(Appointment(clinic_id=vet.clinic_id, vet=vet, owner_id=owner_id, pet_id=pet_id,
+                                         starts_at=start, ends_at=start + SLOT, status=status))
+                if len(batch) >= self.batch:
+                    created += len(self._bulk(Appointment, batch))
+                    batch = []
+        created += len(self._bulk(Appointment, batch))
+        if created < total:
+            self.stderr.write(f"Uwaga: w zakresie dat zmieściło się tylko {created} z {total} wizyt")
+        return created
+
+    def _delete_appointments(self, clinic_ids):
+        """
+        Wizyty klinik jednym DELETE na porcję — bez sygnałów i bez kolekcji
+        kaskad w pamięci (miliony wierszy; liczniki i tak znikają z kliniką).
+        """
+        qn = connection.ops.quote_name
+        table = qn(Appointment._meta.db_table)
+        column = qn(Appointment._meta.get_field("clinic").column)
+        with connection.cursor() as cursor:
+            for i in range(0, len(clinic_ids), CLEAR_BATCH):
+                chunk = clinic_ids[i:i + CLEAR_BATCH]
+                cursor.execute(f"DELETE FROM {table} WHERE {column} IN ({', '.join(['%s'] * len(chunk))})", chunk)
+
+    def _clear(self):
+        users = User.objects.filter(email__endswith=f"@{EMAIL_DOMAIN}")
+        clinic_ids = list(Vet.objects.filter(user__in=users).values_list("clinic_id", flat=True).distinct())
+        with transaction.atomic():
+            self._delete_appointments(clinic_ids)
+            AvailabilityException.objects.filter(entity_type="CLINIC", entity_id__in=clinic_ids).delete()
+            AvailabilityException.objects.filter(entity_type="VET", entity_id__in=Vet.objects.filter(
+                clinic_id__in=clinic_ids).values("id")).delete()
+            Clinic.objects.filter(id__in=clinic_ids).delete()
+            users.delete()
+        self.stdout.write(self.style.SUCCESS(f"Usunięto {len(clinic_ids)} wygenerowanych klinik"))
@@ -0,0 +1,50 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from core import day_stats
+from core.models import Appointment, Clinic
+
+CLINICS_PER_BATCH = 20
+DAYS_PER_BATCH = 92
+
+
+class Command(BaseCommand):
+    help = (
+        "Przelicza od zera dzienne liczniki klinik (ClinicDayStats) z wizyt i godzin pracy. "
+        "Uruchamiane cyklicznie uzupełnia też dni bez wizyt. Po wdrożeniu na bazie z historią "
+        "wizyt uruchom raz bez parametrów."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clinic", type=int, action="append", dest="clinics",
+                            help="id kliniki (można powtórzyć); domyślnie wszystkie")
+        parser.add_argument("--from", dest="first", type=date.fromisoformat,
+                            help="pierwszy dzień (RRRR-MM-DD); domyślnie najstarsza wizyta")
+        parser.add_argument("--to", dest="last", type=date.fromisoformat,
+                            help="ostatni dzień; domyślnie dziś albo najpóźniejsza wizyta")
+
+    def handle(self, *args, clinics, first, last, **options):
+        clinic_ids = clinics or list(Clinic.objects.order_by("id").values_list("id", flat=True))
+        if not clinic_ids:
+            return
+        bounds = Appointment.objects.filter(clinic_id__in=clinic_ids).aggregate(lo=Min("starts_at"), hi=Max("starts_at"))
+        today = timezone.localdate()
+        first = first or (timezone.localdate(bounds["lo"]) if bounds["lo"] else today)
+        last = last or max(today, timezone.localdate(bounds["hi"]) if bounds["hi"] else today)
+        if first > last:
+            raise CommandError("--from jest po --to")
+
+        rows = 0
+        for i in range(0, len(clinic_ids), CLINICS_PER_BATCH):
+            batch = clinic_ids[i:i + CLINICS_PER_BATCH]
+            chunk_first = first
+            while chunk_first <= last:
+                chunk_last = min(last, chunk_first + timedelta(days=DAYS_PER_BATCH - 1))
+                rows += day_stats.rebuild(batch, chunk_first, chunk_last)
+                chunk_first = chunk_last + timedelta(days=1)
+        self.stdout.write(self.style.SUCCESS(
+            f"Przeliczono {rows} wierszy ({len(clinic_ids)} klinik, {first}..{last})"
+        ))
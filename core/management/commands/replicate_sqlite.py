@@ -0,0 +1,39 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.routers import REPLICA
+
+
+class Command(BaseCommand):
+    help = (
+        "Kopiuje bazę SQLite primary do pliku repliki (API backup SQLite) — lokalna "
+        "namiastka replikacji do sprawdzania core.routers. Domyślnie do pliku z "
+        "DATABASE_REPLICA_URL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("target", nargs="?", help="plik repliki (domyślnie NAME aliasu replica)")
+
+    def handle(self, *args, target, **options):
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != "sqlite":
+            raise CommandError("Tylko dla SQLite — inne bazy replikuje serwer bazy.")
+        if not target:
+            if REPLICA not in settings.DATABASES:
+                raise CommandError("Podaj plik repliki albo ustaw DATABASE_REPLICA_URL.")
+            target = settings.DATABASES[REPLICA]["NAME"]
+        if str(target) == str(primary.settings_dict["NAME"]):
+            raise CommandError("Replika i primary to ten sam plik.")
+        if REPLICA in settings.DATABASES:
+            connections[REPLICA].close()  # backup nadpisuje plik pod otwartym połączeniem
+
+        primary.ensure_connection()
+        dest = sqlite3.connect(str(target))
+        try:
+            primary.connection.backup(dest)
+        finally:
+            dest.close()
+        self.stdout.write(f"Skopiowano {primary.settings_dict['NAME']} → {target}")
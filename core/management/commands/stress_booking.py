@@ -0,0 +1,97 @@
+import threading
+import time
+from datetime import datetime, time as dtime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.utils import timezone
+from django.utils.timezone import make_aware
+
+from core import booking
+from core.models import Appointment, Clinic, ClinicHours, Pet, User, Vet
+
+from .benchmark import _percentile
+
+
+class Command(BaseCommand):
+    help = (
+        "Równoległe rezerwacje (domyślnie jednego slotu) — sprawdza brak podwójnych wizyt "
+        "i rezerwacji odrzuconych na blokadach bazy mimo wolnych wetów."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=20)
+        parser.add_argument("--vets", type=int, default=3)
+        parser.add_argument("--slots", type=int, default=1, help="różnych terminów (co 30 min od 9:00)")
+        parser.add_argument("--keep", action="store_true", help="nie usuwaj danych testowych")
+
+    def handle(self, *args, threads, vets, slots, keep, **options):
+        if not 1 <= slots <= 16:
+            raise CommandError("--slots: 1–16 (godziny 9–17)")
+        tag = f"stress-{int(time.time())}"
+        day = timezone.localdate() + timedelta(days=1)
+        clinic = Clinic.objects.create(name=tag, city="Stress")
+        ClinicHours.objects.create(clinic=clinic, weekday=day.weekday(), start="09:00", end="17:00")
+        owner = User.objects.create(email=f"{tag}@example.invalid")
+        pet = Pet.objects.create(owner=owner, name="Stress", species="dog")
+        for _ in range(vets):
+            Vet.objects.create(user=owner, clinic=clinic)
+
+        first = make_aware(datetime.combine(day, dtime(9, 0)))
+        starts = [first + timedelta(minutes=30 * i) for i in range(slots)]
+        barrier = threading.Barrier(threads)
+        results, lock = [], threading.Lock()
+
+        def worker(start):
+            t0 = time.perf_counter()  # gdyby barrier.wait() rzucił (BrokenBarrierError)
+            try:
+                barrier.wait()
+                t0 = time.perf_counter()
+                booking.book(clinic, owner, pet.id, start, start + timedelta(minutes=30))
+                outcome = "ok"
+            except booking.SlotTaken:
+                outcome = "taken"
+            except Exception as exc:  # noqa: BLE001 — raportujemy każdy inny błąd
+                outcome = f"error: {exc}"
+            finally:
+                connection.close()
+            with lock:
+                results.append((outcome, time.perf_counter() - t0))
+
+        try:
+            t0 = time.perf_counter()
+            pool = [threading.Thread(target=worker, args=(starts[i % slots],)) for i in range(threads)]
+            for t in pool:
+                t.start()
+            for t in pool:
+                t.join()
+            wall = time.perf_counter() - t0
+
+            ok = sum(1 for o, _ in results if o == "ok")
+            taken = sum(1 for o, _ in results if o == "taken")
+            errors = [o for o, _ in results if o.startswith("error")]
+            doubled = Appointment.objects.filter(clinic=clinic).exclude(status="CANCELLED") \
+                .values("vet_id", "starts_at").annotate(n=Count("id")).filter(n__gt=1).count()
+            latencies = [d * 1000 for _, d in results]
+
+            self.stdout.write(
+                f"{connection.vendor}: {threads} wątków, {vets} wetów, {slots} termin(y) → "
+                f"zarezerwowano {ok}, zajęte {taken}, błędy {len(errors)}, podwójne {doubled}, "
+                f"czas {wall:.2f}s ({ok / wall:.0f} rez./s), p50 {_percentile(latencies, 0.5):.0f}ms, "
+                f"p95 {_percentile(latencies, 0.95):.0f}ms, max {max(latencies):.0f}ms"
+            )
+            for e in sorted(set(errors)):
+                self.stdout.write(f"  {e}")
+        finally:
+            if not keep:
+                clinic.delete()
+                owner.delete()
+
+        if doubled or errors:
+            raise CommandError("Rezerwacje równoległe nie przeszły")
+        expected = sum(min(vets, len(range(i, threads, slots))) for i in range(slots))
+        if ok < expected:
+            # wolni weci zostali, a część rezerwacji odpadła na blokadach bazy
+            self.stdout.write(self.style.WARNING(f"Odrzucone mimo wolnych wetów: {expected - ok}"))
+        self.stdout.write(self.style.SUCCESS("Stress OK"))
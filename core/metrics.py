@@ -0,0 +1,194 @@
+# core/metrics.py
+"""
+Metryki w formacie tekstowym Prometheusa (/api/metrics, z nagłówkiem
+Authorization: Bearer <METRICS_TOKEN>; bez ustawionego tokenu — 401).
+
+Liczniki i histogramy są trzymane w pamięci procesu (słownik pod lockiem,
+bez zapytań i I/O na ścieżce żądania). Przy kilku workerach gunicorna
+każdy proces co METRICS_FLUSH_SECONDS zrzuca swój stan do pliku
+<METRICS_DIR>/<pid>.json (zapis atomowy przez os.replace), a scrape
+sumuje pliki wszystkich procesów — także tych już zakończonych, więc
+liczniki nie cofają się po restarcie workera. Katalog trzeba czyścić przy
+starcie całej aplikacji (jak PROMETHEUS_MULTIPROC_DIR w prometheus_client).
+Bez METRICS_DIR endpoint pokazuje tylko proces, który obsłużył scrape.
+
+Źródła: PerformanceMiddleware (żądania, zapytania SQL, czas liczenia
+slotów — span "slots" z core.perf) oraz liczniki cache slotów
+(core.slot_cache.stats).
+"""
+import atexit
+import json
+import os
+import threading
+import time
+
+from django.conf import settings
+
+from . import slot_cache
+
+PREFIX = "petnav"
+# s; kubełki histogramów (le)
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# nazwa -> (typ, opis)
+METRICS = {
+    "http_requests_total": ("counter", "Żądania HTTP per trasa, metoda i klasa statusu."),
+    "http_request_duration_seconds": ("histogram", "Czas obsługi żądania per trasa."),
+    "db_queries_total": ("counter", "Zapytania SQL wykonane w żądaniach, per trasa."),
+    "db_query_duration_seconds_total": ("counter", "Łączny czas zapytań SQL w żądaniach, per trasa."),
+    "slots_compute_duration_seconds": ("histogram", "Czas liczenia slotów (chybienia cache) w żądaniu."),
+    "slot_cache_hits_total": ("counter", "Trafienia cache slotów."),
+    "slot_cache_misses_total": ("counter", "Chybienia cache slotów."),
+}
+
+class _Registry:
+    """Stan metryk jednego procesu."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.pid = os.getpid()
+        self.counters = {}     # (nazwa, etykiety) -> wartość
+        self.histograms = {}   # (nazwa, etykiety) -> [kubełki..., suma, liczba]
+        self.flushed = 0.0
+
+    def _check_fork(self):
+        # worker po fork() dziedziczy stan mastera — zaczyna od zera pod swoim pid
+        if self.pid != os.getpid():
+            self._reset()
+
+    def inc(self, name, labels=(), value=1.0):
+        with self.lock:
+            self._check_fork()
+            key = (name, labels)
+            self.counters[key] = self.counters.get(key, 0.0) + value
+
+    def observe(self, name, seconds, labels=()):
+        with self.lock:
+            self._check_fork()
+            key = (name, labels)
+            h = self.histograms.get(key)
+            if h is None:
+                h = self.histograms[key] = [0] * len(DURATION_BUCKETS) + [0.0, 0]
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    h[i] += 1
+            h[-2] += seconds
+            h[-1] += 1
+
+    def snapshot(self) -> dict:
+        cache_stats = slot_cache.stats()
+        with self.lock:
+            self._check_fork()
+            counters = [[n, list(l), v] for (n, l), v in self.counters.items()]
+            histograms = [[n, list(l), list(h)] for (n, l), h in self.histograms.items()]
+        counters += [["slot_cache_hits_total", [], cache_stats["hits"]],
+                     ["slot_cache_misses_total", [], cache_stats["misses"]]]
+        return {"counters": counters, "histograms": histograms}
+
+_registry = _Registry()
+
+def _dir():
+    return getattr(settings, "METRICS_DIR", None)
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Zapis (ścieżka żądania)
+# ───────────────────────────────────────────────────────────────────────────────
+
+def observe_request(route: str, method: str, status: int, total_ms: float, stats):
+    """Wywoływane przez PerformanceMiddleware po każdym żądaniu."""
+    labels = (("route", route),)
+    _registry.inc("http_requests_total", labels + (("method", method), ("status", f"{status // 100}xx")))
+    _registry.observe("http_request_duration_seconds", total_ms / 1000, labels)
+    if stats.queries:
+        _registry.inc("db_queries_total", labels, stats.queries)
+        _registry.inc("db_query_duration_seconds_total", labels, stats.db_ms / 1000)
+    if "slots" in stats.spans:
+        _registry.observe("slots_compute_duration_seconds", stats.spans["slots"] / 1000)
+    maybe_flush()
+
+def maybe_flush():
+    """Zrzut do pliku procesu najwyżej co METRICS_FLUSH_SECONDS."""
+    if _dir() and time.monotonic() - _registry.flushed >= getattr(settings, "METRICS_FLUSH_SECONDS", 5):
+        flush()
+
+def flush():
+    directory = _dir()
+    if not directory:
+        return
+    _registry.flushed = time.monotonic()
+    path = os.path.join(directory, f"{os.getpid()}.json")
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(_registry.snapshot(), fh)
+    os.replace(tmp, path)
+
+atexit.register(flush)  # ostatnie żądania workera kończącego pracę
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Odczyt (scrape)
+# ───────────────────────────────────────────────────────────────────────────────
+
+def _snapshots():
+    directory = _dir()
+    if not directory:
+        return [_registry.snapshot()]
+    flush()  # własny stan aktualny na moment scrape'a
+    out = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(directory, name), encoding="utf-8") as fh:
+                out.append(json.load(fh))
+        except (OSError, ValueError):
+            continue  # plik w trakcie podmiany albo uszkodzony — pominięty w tym scrape'ie
+    return out
+
+def collect() -> tuple:
+    """Suma stanów wszystkich procesów → (liczniki, histogramy) po kluczu (nazwa, etykiety)."""
+    counters, histograms = {}, {}
+    for snap in _snapshots():
+        for name, labels, value in snap["counters"]:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0.0) + value
+        for name, labels, h in snap["histograms"]:
+            key = (name, tuple(map(tuple, labels)))
+            acc = histograms.setdefault(key, [0] * len(h))
+            for i, v in enumerate(h):
+                acc[i] += v
+    return counters, histograms
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(labels) -> str:
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}" if labels else ""
+
+def _num(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def render() -> str:
+    """Tekst w formacie ekspozycji Prometheusa (text/plain; version=0.0.4)."""
+    counters, histograms = collect()
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        full = f"{PREFIX}_{name}"
+        lines += [f"# HELP {full} {help_text}", f"# TYPE {full} {kind}"]
+        if kind == "counter":
+            for (n, labels), value in sorted(counters.items()):
+                if n == name:
+                    lines.append(f"{full}{_labels(labels)} {_num(value)}")
+            continue
+        for (n, labels), h in sorted(histograms.items()):
+            if n != name:
+                continue
+            # kubełki w zapisie są już skumulowane (observe liczy każdy le ≥ wartość)
+            for bound, count in zip(DURATION_BUCKETS, h):
+                lines.append(f"{full}_bucket{_labels(labels + (('le', repr(bound)),))} {count}")
+            lines.append(f"{full}_bucket{_labels(labels + (('le', '+Inf'),))} {h[-1]}")
+            lines.append(f"{full}_sum{_labels(labels)} {_num(h[-2])}")
+            lines.append(f"{full}_count{_labels(labels)} {h[-1]}")
+    return "\n".join(lines) + "\n"
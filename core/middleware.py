@@ -0,0 +1,238 @@
+# core/middleware.py
+"""Middleware aplikacji."""
+import json
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.functional import SimpleLazyObject
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from . import metrics, perf, routers, slot_cache
+from .models import User as DomainUser
+
+perf_log = logging.getLogger("core.perf")
+
+SESSION_KEY = "domain_user"
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Profil domenowy zalogowanego użytkownika
+# ───────────────────────────────────────────────────────────────────────────────
+
+def _version_key(auth_user_id) -> str:
+    return f"domain_user:v:{auth_user_id}"
+
+def _profile_version(auth_user_id) -> int:
+    key = _version_key(auth_user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+def invalidate_domain_user(auth_user_id):
+    """Unieważnia profil zapamiętany w sesjach danego konta (sygnały w core.signals)."""
+    if auth_user_id:
+        cache.set(_version_key(auth_user_id), int(time.time() * 1000), None)
+
+def _resolve(request):
+    user = request.user
+    if not user.is_authenticated:
+        return None
+    # wersja profilu w cache per proces (locmem) różni się między workerami —
+    # kopia w sesji prawie nigdy by nie pasowała, a każde żądanie ją nadpisywało
+    shared = not slot_cache.process_local()
+    if shared:
+        version = _profile_version(user.pk)
+        cached = request.session.get(SESSION_KEY)
+        if cached and cached[0] == user.pk and cached[3] == version:
+            # instancja z samymi id/rolą; pozostałe pola doczytają się przy dostępie,
+            # a save() zapisze tylko załadowane pola
+            return DomainUser.from_db(None, ["id", "role", "auth_user_id"], [cached[1], cached[2], user.pk])
+
+    du, created = DomainUser.objects.get_or_create(auth_user=user, defaults={
+        "email": user.username, "role": "OWNER"
+    })
+    if shared:
+        if created:
+            version = _profile_version(user.pk)  # get_or_create podbił wersję sygnałem
+        request.session[SESSION_KEY] = [user.pk, du.pk, du.role, version]
+    return du
+
+def get_domain_user(request):
+    """Profil domenowy (core.models.User) dla żądania — najwyżej raz na żądanie."""
+    if not hasattr(request, "_domain_user"):
+        request._domain_user = _resolve(request)
+    return request._domain_user
+
+class DomainUserMiddleware:
+    """
+    Udostępnia request.domain_user — leniwie rozwiązywany profil domenowy.
+    Przy wspólnym cache (REDIS_URL) id i rola trafiają do sesji, więc zwykłe
+    żądania właściciela nie pytają bazy o profil; wpis w sesji traci ważność,
+    gdy profil się zmieni. Przy cache w pamięci procesu — jedno zapytanie.
+    Musi stać po AuthenticationMiddleware. Widoki async nie powinny go
+    dotykać (rozwiązanie pyta bazę synchronicznie).
+    """
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        # w trybie async get_response zwraca korutynę — await robi wywołujący
+        request.domain_user = SimpleLazyObject(lambda: get_domain_user(request))
+        return self.get_response(request)
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Pomiary wydajności
+# ───────────────────────────────────────────────────────────────────────────────
+
+class PerformanceMiddleware:
+    """
+    Pomiar każdego żądania (core.perf): liczba zapytań, czas bazy, widoku
+    i renderowania → nagłówek Server-Timing (PERF_SERVER_TIMING, tylko przy
+    DEBUG albo dla personelu — to wyrocznia czasowa i opis wnętrza), liczniki
+    per trasa, a dla żądań
+    wolniejszych niż PERF_SLOW_REQUEST_MS — linia JSON w logu "core.perf"
+    z najwolniejszymi zapytaniami; zasila też /api/metrics (core.metrics).
+    Włączane PERF_ENABLED; najwyżej w MIDDLEWARE.
+    """
+
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "PERF_ENABLED", False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.slow_ms = getattr(settings, "PERF_SLOW_REQUEST_MS", 500)
+        self.header = getattr(settings, "PERF_SERVER_TIMING", False)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        perf.install()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        perf.instrument_open()
+        token = perf.start()
+        try:
+            response = self.get_response(request)
+            stats = perf.current()
+            total_ms = stats.total_ms()
+        finally:
+            perf.stop(token)
+        show = self.header and self._timing_allowed(getattr(request, "user", None))
+        return self._finish(request, response, stats, total_ms, show)
+
+    async def __acall__(self, request):
+        token = perf.start()
+        try:
+            response = await self.get_response(request)
+            stats = perf.current()
+            total_ms = stats.total_ms()
+        finally:
+            perf.stop(token)
+        # leniwy request.user w async zapytałby bazę synchronicznie
+        show = self.header and self._timing_allowed(await request.auser() if hasattr(request, "auser") else None)
+        return self._finish(request, response, stats, total_ms, show)
+
+    @staticmethod
+    def _timing_allowed(user) -> bool:
+        return settings.DEBUG or bool(getattr(user, "is_staff", False))
+
+    def _finish(self, request, response, stats, total_ms, show_timing):
+        match = request.resolver_match
+        route = match.route if match else "<unresolved>"
+        perf.record(route, response.status_code, total_ms, stats)
+        metrics.observe_request(route, request.method, response.status_code, total_ms, stats)
+        if show_timing:
+            response["Server-Timing"] = perf.server_timing(stats, total_ms)
+        if total_ms >= self.slow_ms:
+            perf_log.warning(json.dumps({
+                "event": "slow_request", "method": request.method, "path": request.path,
+                "route": route, "status": response.status_code, "total_ms": round(total_ms, 1),
+                "db_ms": round(stats.db_ms, 1), "queries": stats.queries,
+                "spans": {k: round(v, 1) for k, v in stats.spans.items()},
+                "slow_sql": stats.slowest(),
+            }, ensure_ascii=False))
+        return response
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Replika: czytaj własne zapisy
+# ───────────────────────────────────────────────────────────────────────────────
+
+PIN_COOKIE = "db_pin"
+
+class ReplicaPinMiddleware:
+    """
+    Po żądaniu modyfikującym (POST, PUT, PATCH, DELETE) przypina klienta do
+    primary na REPLICA_PIN_SECONDS (ciasteczko), żeby widoki @use_replica
+    (core.routers) pokazały jego zmiany mimo opóźnienia repliki. Bez repliki
+    wyłączony.
+    """
+
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        if not routers.enabled():
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.pin_seconds = getattr(settings, "REPLICA_PIN_SECONDS", 10)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with routers.primary_reads(PIN_COOKIE in request.COOKIES):
+            response = self.get_response(request)
+        return self._pin(request, response)
+
+    async def __acall__(self, request):
+        with routers.primary_reads(PIN_COOKIE in request.COOKIES):
+            response = await self.get_response(request)
+        return self._pin(request, response)
+
+    def _pin(self, request, response):
+        if request.method not in ("GET", "HEAD", "OPTIONS", "TRACE"):
+            response.set_cookie(PIN_COOKIE, "1", max_age=self.pin_seconds, httponly=True,
+                                samesite="Lax", secure=settings.SESSION_COOKIE_SECURE)
+        return response
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Pliki statyczne
+# ───────────────────────────────────────────────────────────────────────────────
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise z obsługą trybu async. Oryginał jest tylko sync, więc pod ASGI
+    Django przełączałby cały łańcuch poniżej na wątek, a widoki async wołał
+    przez async_to_sync. Wyszukanie pliku to odczyt słownika (poza
+    autorefresh); otwarcie pliku robimy w wątku.
+    """
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_user_auth_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clinic',
+            name='species',
+            field=models.CharField(blank=True, max_length=80),
+        ),
+    ]
@@ -0,0 +1,93 @@
+from datetime import time
+
+from django.db import migrations, models
+
+
+def _parse(value, field, row):
+    """ "HH:MM" → time; "24:00" traktujemy jak koniec dnia (23:59)."""
+    if value in (None, ""):
+        return None
+    try:
+        h, m = map(int, value.strip().split(":"))
+        if (h, m) == (24, 0):
+            return time(23, 59)
+        return time(h, m)
+    except ValueError:
+        raise ValueError(f"{row._meta.object_name} id={row.pk}: niepoprawne {field}={value!r}")
+
+
+def forwards(apps, schema_editor):
+    for name in ("ClinicHours", "VetHours", "AvailabilityException"):
+        model = apps.get_model("core", name)
+        rows = list(model.objects.all())
+        for row in rows:
+            row.start_t = _parse(row.start, "start", row)
+            row.end_t = _parse(row.end, "end", row)
+            if row.start_t and row.end_t and row.start_t >= row.end_t:
+                raise ValueError(f"{name} id={row.pk}: start {row.start} >= end {row.end}")
+        model.objects.bulk_update(rows, ["start_t", "end_t"], batch_size=500)
+
+
+def backwards(apps, schema_editor):
+    for name in ("ClinicHours", "VetHours", "AvailabilityException"):
+        model = apps.get_model("core", name)
+        rows = list(model.objects.all())
+        for row in rows:
+            row.start = row.start_t.strftime("%H:%M") if row.start_t else None
+            row.end = row.end_t.strftime("%H:%M") if row.end_t else None
+        model.objects.bulk_update(rows, ["start", "end"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+    """Godziny jako TimeField zamiast napisów "HH:MM" (z konwersją istniejących wierszy)."""
+
+    dependencies = [
+        ('core', '0005_appointment_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(name='clinichours', unique_together=set()),
+        migrations.AlterUniqueTogether(name='vethours', unique_together=set()),
+        # stare kolumny dopuszczają NULL na czas konwersji w obie strony
+        migrations.AlterField(model_name='clinichours', name='start', field=models.CharField(max_length=5, null=True)),
+        migrations.AlterField(model_name='clinichours', name='end', field=models.CharField(max_length=5, null=True)),
+        migrations.AlterField(model_name='vethours', name='start', field=models.CharField(max_length=5, null=True)),
+        migrations.AlterField(model_name='vethours', name='end', field=models.CharField(max_length=5, null=True)),
+        migrations.AddField(model_name='clinichours', name='start_t', field=models.TimeField(null=True)),
+        migrations.AddField(model_name='clinichours', name='end_t', field=models.TimeField(null=True)),
+        migrations.AddField(model_name='vethours', name='start_t', field=models.TimeField(null=True)),
+        migrations.AddField(model_name='vethours', name='end_t', field=models.TimeField(null=True)),
+        migrations.AddField(model_name='availabilityexception', name='start_t', field=models.TimeField(blank=True, null=True)),
+        migrations.AddField(model_name='availabilityexception', name='end_t', field=models.TimeField(blank=True, null=True)),
+        migrations.RunPython(forwards, backwards),
+        migrations.RemoveField(model_name='clinichours', name='start'),
+        migrations.RemoveField(model_name='clinichours', name='end'),
+        migrations.RemoveField(model_name='vethours', name='start'),
+        migrations.RemoveField(model_name='vethours', name='end'),
+        migrations.RemoveField(model_name='availabilityexception', name='start'),
+        migrations.RemoveField(model_name='availabilityexception', name='end'),
+        migrations.RenameField(model_name='clinichours', old_name='start_t', new_name='start'),
+        migrations.RenameField(model_name='clinichours', old_name='end_t', new_name='end'),
+        migrations.RenameField(model_name='vethours', old_name='start_t', new_name='start'),
+        migrations.RenameField(model_name='vethours', old_name='end_t', new_name='end'),
+        migrations.RenameField(model_name='availabilityexception', old_name='start_t', new_name='start'),
+        migrations.RenameField(model_name='availabilityexception', old_name='end_t', new_name='end'),
+        migrations.AlterField(model_name='clinichours', name='start', field=models.TimeField()),
+        migrations.AlterField(model_name='clinichours', name='end', field=models.TimeField()),
+        migrations.AlterField(model_name='vethours', name='start', field=models.TimeField()),
+        migrations.AlterField(model_name='vethours', name='end', field=models.TimeField()),
+        migrations.AlterUniqueTogether(name='clinichours', unique_together={('clinic', 'weekday', 'start', 'end')}),
+        migrations.AlterUniqueTogether(name='vethours', unique_together={('vet', 'weekday', 'start', 'end')}),
+        migrations.AddConstraint(
+            model_name='clinichours',
+            constraint=models.CheckConstraint(condition=models.Q(('start__lt', models.F('end'))), name='clinichours_start_lt_end'),
+        ),
+        migrations.AddConstraint(
+            model_name='vethours',
+            constraint=models.CheckConstraint(condition=models.Q(('start__lt', models.F('end'))), name='vethours_start_lt_end'),
+        ),
+        migrations.AddConstraint(
+            model_name='availabilityexception',
+            constraint=models.CheckConstraint(condition=models.Q(('start__isnull', True), ('end__isnull', True), ('start__lt', models.F('end')), _connector='OR'), name='availabilityexception_start_lt_end'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_clinic_day_stats'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='availabilityexception',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='needs_followup',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='availabilityexception',
+            name='date_to',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='availabilityexception',
+            name='weekday',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='availabilityexception',
+            constraint=models.CheckConstraint(condition=models.Q(('date_to__isnull', True), ('date_to__gte', models.F('date')), _connector='OR'), name='availabilityexception_date_le_date_to'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Bez operacji na danych: pojemność dni bez wizyt uzupełnia
+    day_stats.occupancy() przy pierwszym odczycie okna. Pełne przeliczenie
+    (np. po wdrożeniu na bazie z historią) to krok po migracji:
+
+        manage.py rebuild_day_stats
+
+    — nie RunPython, bo ten korzystałby z bieżących modeli i silnika
+    dostępności, a nie ze stanu schematu tej migracji.
+    """
+
+    dependencies = [
+        ('core', '0009_exception_ranges'),
+    ]
+
+    operations = []
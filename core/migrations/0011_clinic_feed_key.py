@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:00
+
+import secrets
+
+import core.models
+from django.db import migrations, models
+
+
+def distinct_keys(apps, schema_editor):
+    # AddField wylicza domyślną wartość raz — istniejące kliniki dostałyby ten sam klucz
+    Clinic = apps.get_model("core", "Clinic")
+    clinics = list(Clinic.objects.only("id"))
+    for clinic in clinics:
+        clinic.feed_key = secrets.token_hex(16)
+    Clinic.objects.bulk_update(clinics, ["feed_key"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_backfill_day_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clinic',
+            name='feed_key',
+            field=models.CharField(default=core.models.new_feed_key, max_length=32),
+        ),
+        migrations.RunPython(distinct_keys, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,18 @@
+import secrets
+
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.contrib.auth.models import User as DjangoUser
 
+def new_feed_key() -> str:
+    return secrets.token_hex(16)
+
 class Clinic(models.Model):
     name=models.CharField(max_length=120); city=models.CharField(max_length=80, blank=True)
     address=models.CharField(max_length=200, blank=True)
+    species=models.CharField(max_length=80, blank=True)  # np. "cat,dog"; puste = wszystkie gatunki
+    # klucz w tokenach feedów ICS (core.exports) — nowy unieważnia wszystkie wydane adresy
+    feed_key=models.CharField(max_length=32, default=new_feed_key)
     def __str__(self): return self.name
 
 class User(models.Model):
@@ -26,41 +35,124 @@ class Appointment(models.Model):
     pet=models.ForeignKey(Pet,on_delete=models.CASCADE)
     starts_at=models.DateTimeField(); ends_at=models.DateTimeField()
     status=models.CharField(max_length=12,choices=STATUS,default='NEW')
+    updated_at=models.DateTimeField(auto_now=True)  # do odświeżania kalendarza "zmienione od"
+    needs_followup=models.BooleanField(default=False)  # wypada w zamknięciu/skróceniu godzin — do przełożenia
+
+    # pola, z których liczone są dzienne liczniki (core.day_stats)
+    STATS_FIELDS = ("clinic_id", "starts_at", "ends_at", "status")
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # stan z bazy, żeby przy zapisie policzyć różnicę w ClinicDayStats;
+        # None, gdy któreś pole jest odroczone (wtedy dzień liczony od nowa)
+        loaded = instance.__dict__
+        instance._stats_state = (tuple(loaded[f] for f in cls.STATS_FIELDS)
+                                 if all(f in loaded for f in cls.STATS_FIELDS) else None)
+        # komórka kalendarza sprzed zapisu — przeniesienie zwalnia starą (core.signals)
+        instance._cell = ((loaded["vet_id"], loaded["starts_at"])
+                          if "vet_id" in loaded and "starts_at" in loaded else None)
+        return instance
+
+    class Meta:
+        indexes = [
+            # clinic_slots / booking: wizyty kliniki nachodzące na zakres (bez anulowanych)
+            models.Index(fields=["clinic", "starts_at", "ends_at"], condition=~models.Q(status="CANCELLED"),
+                         name="appt_clinic_busy_idx"),
+            # clinic_calendar: wizyty kliniki w zakresie dat, po starts_at
+            models.Index(fields=["clinic", "starts_at"], name="appt_clinic_start_idx"),
+            # my_appointments: historia właściciela po starts_at
+            models.Index(fields=["owner", "starts_at"], name="appt_owner_start_idx"),
+            # clinic_calendar_changes: wizyty kliniki zmienione od ostatniego odpytania
+            models.Index(fields=["clinic", "updated_at"], name="appt_clinic_updated_idx"),
+        ]
+
+class ClinicDayStats(models.Model):
+    """
+    Dzienne liczniki kliniki (dzień = lokalna data początku wizyty).
+    Utrzymywane przyrostowo przez core.day_stats; od zera: manage.py rebuild_day_stats.
+    """
+    clinic = models.ForeignKey(Clinic, on_delete=models.CASCADE, related_name="day_stats")
+    day = models.DateField()
+    booked = models.IntegerField(default=0)        # wszystkie wizyty dnia
+    confirmed = models.IntegerField(default=0)
+    cancelled = models.IntegerField(default=0)
+    busy_minutes = models.IntegerField(default=0)  # minuty wizyt bez anulowanych
+    open_minutes = models.IntegerField(default=0)  # suma okien pracy wetów
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["clinic", "day"], name="clinicdaystats_clinic_day")]
 
 # Godziny pracy i wyjątki
 
+def _check_window(start, end):
+    if start and end and start >= end:
+        raise ValidationError({"end": "Koniec musi być później niż początek."})
+
 class ClinicHours(models.Model):
     clinic = models.ForeignKey(Clinic, on_delete=models.CASCADE, related_name="hours")
     weekday = models.IntegerField()  # 0=pon ... 6=niedz
-    start = models.CharField(max_length=5)  # "09:00"
-    end   = models.CharField(max_length=5)  # "17:00"
+    start = models.TimeField()  # 09:00
+    end   = models.TimeField()  # 17:00
 
     class Meta:
         unique_together = ("clinic", "weekday", "start", "end")
         ordering = ("clinic_id","weekday","start")
+        constraints = [models.CheckConstraint(condition=models.Q(start__lt=models.F("end")), name="clinichours_start_lt_end")]
+
+    def clean(self):
+        _check_window(self.start, self.end)
 
 class VetHours(models.Model):
     vet = models.ForeignKey(Vet, on_delete=models.CASCADE, related_name="hours")
     weekday = models.IntegerField()
-    start = models.CharField(max_length=5)
-    end   = models.CharField(max_length=5)
+    start = models.TimeField()
+    end   = models.TimeField()
 
     class Meta:
         unique_together = ("vet", "weekday", "start", "end")
         ordering = ("vet_id","weekday","start")
+        constraints = [models.CheckConstraint(condition=models.Q(start__lt=models.F("end")), name="vethours_start_lt_end")]
+
+    def clean(self):
+        _check_window(self.start, self.end)
 
 class AvailabilityException(models.Model):
     """
     Wyjątki: zamknięte całkiem albo okno godzin inne niż standard.
     Jeśli closed=1 – ignorujemy start/end. Entity: "CLINIC" lub "VET".
+    Zakres: date..date_to (puste date_to = jeden dzień); weekday zawęża
+    zakres do jednego dnia tygodnia (np. piątki w sierpniu).
     """
     entity_type = models.CharField(max_length=10)  # CLINIC | VET
     entity_id   = models.IntegerField()
-    date        = models.DateField()
+    date        = models.DateField()  # pierwszy dzień
+    date_to     = models.DateField(blank=True, null=True)  # ostatni dzień (włącznie)
+    weekday     = models.IntegerField(blank=True, null=True)  # 0=pon ... 6=niedz
     closed      = models.BooleanField(default=False)
-    start = models.CharField(max_length=5, blank=True, null=True)  # "10:00"
-    end   = models.CharField(max_length=5, blank=True, null=True)
+    start = models.TimeField(blank=True, null=True)  # 10:00
+    end   = models.TimeField(blank=True, null=True)
 
     class Meta:
-        unique_together = ("entity_type","entity_id","date")
         indexes = [models.Index(fields=["entity_type","entity_id","date"])]
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(start__isnull=True) | models.Q(end__isnull=True) | models.Q(start__lt=models.F("end")),
+                name="availabilityexception_start_lt_end",
+            ),
+            models.CheckConstraint(
+                condition=models.Q(date_to__isnull=True) | models.Q(date_to__gte=models.F("date")),
+                name="availabilityexception_date_le_date_to",
+            ),
+        ]
+
+    @property
+    def last_day(self):
+        return self.date_to or self.date
+
+    def clean(self):
+        _check_window(self.start, self.end)
+        if self.date_to and self.date and self.date_to < self.date:
+            raise ValidationError({"date_to": "Koniec zakresu przed początkiem."})
+        if self.weekday is not None and not 0 <= self.weekday <= 6:
+            raise ValidationError({"weekday": "Dzień tygodnia 0–6."})
@@ -0,0 +1,195 @@
+# core/perf.py
+"""
+Pomiary wydajności żądań.
+
+PerformanceMiddleware (core.middleware) zakłada na czas żądania RequestStats
+w contextvar (widoczny też w wątkach sync_to_async widoków async); zbierają
+do niego:
+  - wrapper zapytań SQL (liczba, łączny czas, najwolniejsze zapytania),
+  - backend szablonów TimedTemplates (czas renderowania),
+  - span("nazwa") w kodzie aplikacji (np. liczenie slotów).
+Poza żądaniem (komendy, testy) wszystko to jest no-op.
+
+Per trasa (route z URLconf) trzymamy w pamięci procesu kroczące liczniki:
+liczba żądań, czasy, zapytania i ostatnie N czasów do percentyli.
+"""
+import heapq
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends.django import DjangoTemplates
+
+SLOW_SQL_KEPT = 5        # ile najwolniejszych zapytań pamiętamy na żądanie
+ROUTE_WINDOW = 500       # ile ostatnich czasów na trasę (percentyle)
+SQL_MAX_CHARS = 500
+
+_current: ContextVar = ContextVar("perf_request", default=None)
+
+class RequestStats:
+    """Pomiary jednego żądania."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_ms = 0.0
+        self.slow_sql = []   # kopiec (ms, nr, sql) — SLOW_SQL_KEPT najwolniejszych
+        self.spans = {}      # nazwa -> ms
+        self._open = {}      # nazwa -> głębokość (zagnieżdżone liczymy raz)
+        self._lock = threading.Lock()  # zapytania z kilku wątków naraz (gather w widokach async)
+
+    def add_query(self, sql, ms):
+        with self._lock:
+            self.queries += 1
+            self.db_ms += ms
+            item = (ms, self.queries, sql[:SQL_MAX_CHARS])
+            if len(self.slow_sql) < SLOW_SQL_KEPT:
+                heapq.heappush(self.slow_sql, item)
+            elif ms > self.slow_sql[0][0]:
+                heapq.heapreplace(self.slow_sql, item)
+
+    def slowest(self):
+        return [{"ms": round(ms, 2), "sql": sql} for ms, _n, sql in sorted(self.slow_sql, reverse=True)]
+
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+def current():
+    """RequestStats bieżącego żądania albo None."""
+    return _current.get()
+
+def start():
+    """Początek pomiaru; zwraca token do stop()."""
+    return _current.set(RequestStats())
+
+def stop(token):
+    _current.reset(token)
+
+@contextmanager
+def span(name: str):
+    """Mierzy blok kodu jako składnik Server-Timing `name` (sumuje powtórzenia)."""
+    stats = _current.get()
+    if stats is None or stats._open.get(name):
+        yield
+        return
+    stats._open[name] = 1
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats._open[name] = 0
+        stats.spans[name] = stats.spans.get(name, 0.0) + (time.perf_counter() - t0) * 1000
+
+def query_wrapper(execute, sql, params, many, context):
+    """Wrapper wykonania zapytań: czas i treść każdego zapytania do RequestStats."""
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    t0 = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.add_query(sql, (time.perf_counter() - t0) * 1000)
+
+def instrument(connection):
+    """
+    Zakłada query_wrapper na stałe na połączenie (idempotentnie). Na stałe, bo
+    pod ASGI zapytania idą w wątkach sync_to_async z własnymi połączeniami,
+    a nie w wątku middleware; poza żądaniem wrapper nic nie robi.
+    """
+    if query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_wrapper)
+
+def _connection_created(sender, connection, **kwargs):
+    instrument(connection)
+
+def install():
+    """Instrumentuje każde nowe połączenie (sygnał connection_created)."""
+    connection_created.connect(_connection_created, dispatch_uid="core.perf")
+
+def instrument_open():
+    """Połączenia tego wątku otwarte wcześniej niż install() (np. baza testowa)."""
+    for conn in connections.all(initialized_only=True):
+        instrument(conn)
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Renderowanie szablonów
+# ───────────────────────────────────────────────────────────────────────────────
+
+class _TimedTemplate:
+    def __init__(self, template):
+        self._template = template
+
+    def __getattr__(self, name):
+        return getattr(self._template, name)
+
+    def render(self, context=None, request=None):
+        with span("render"):
+            return self._template.render(context, request)
+
+class TimedTemplates(DjangoTemplates):
+    """Backend DjangoTemplates z pomiarem czasu renderowania (span "render")."""
+
+    def from_string(self, template_code):
+        return _TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return _TimedTemplate(super().get_template(template_name))
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Server-Timing i liczniki tras
+# ───────────────────────────────────────────────────────────────────────────────
+
+def server_timing(stats: RequestStats, total_ms: float) -> str:
+    """Wartość nagłówka Server-Timing: total, db, render, view (= total − render) i spany."""
+    render_ms = stats.spans.get("render", 0.0)
+    parts = [
+        f"total;dur={total_ms:.1f}",
+        f'db;dur={stats.db_ms:.1f};desc="{stats.queries} queries"',
+        f"view;dur={total_ms - render_ms:.1f}",
+    ]
+    parts += [f"{name};dur={ms:.1f}" for name, ms in sorted(stats.spans.items())]
+    return ", ".join(parts)
+
+_routes_lock = threading.Lock()
+_routes = {}
+
+def record(route: str, status: int, total_ms: float, stats: RequestStats):
+    with _routes_lock:
+        r = _routes.get(route)
+        if r is None:
+            r = _routes[route] = {"count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0,
+                                  "db_ms": 0.0, "queries": 0, "recent": deque(maxlen=ROUTE_WINDOW)}
+        r["count"] += 1
+        r["errors"] += status >= 500
+        r["total_ms"] += total_ms
+        r["max_ms"] = max(r["max_ms"], total_ms)
+        r["db_ms"] += stats.db_ms
+        r["queries"] += stats.queries
+        r["recent"].append(total_ms)
+
+def _pct(ordered, q):
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))] if ordered else 0.0
+
+def route_stats() -> dict:
+    """Migawka liczników tras: {route: {count, errors, avg_ms, max_ms, p50_ms, p95_ms, avg_db_ms, avg_queries}}."""
+    with _routes_lock:
+        snapshot = {route: dict(r, recent=sorted(r["recent"])) for route, r in _routes.items()}
+    out = {}
+    for route, r in sorted(snapshot.items()):
+        n = r["count"]
+        out[route] = {
+            "count": n, "errors": r["errors"],
+            "avg_ms": round(r["total_ms"] / n, 2), "max_ms": round(r["max_ms"], 2),
+            "p50_ms": round(_pct(r["recent"], 0.5), 2), "p95_ms": round(_pct(r["recent"], 0.95), 2),
+            "avg_db_ms": round(r["db_ms"] / n, 2), "avg_queries": round(r["queries"] / n, 2),
+        }
+    return out
+
+def reset_routes():
+    with _routes_lock:
+        _routes.clear()
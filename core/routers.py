@@ -0,0 +1,107 @@
+# core/routers.py
+"""
+Odczyty z repliki (DATABASE_REPLICA_URL, alias "replica").
+
+Replika jest opcjonalna — bez niej router nie jest nawet rejestrowany. Na
+replikę idą tylko odczyty z widoków oznaczonych @use_replica (gorące
+ścieżki: sloty, listy klinik, kalendarz, panel kliniki); wszystko inne,
+każdy zapis i każdy odczyt wewnątrz transakcji na primary (np. ponowne
+sprawdzenie terminu w core.booking) zostaje na "default".
+
+Czytaj własne zapisy: po żądaniu modyfikującym (POST itd.) ReplicaPinMiddleware
+ustawia ciasteczko, które przez REPLICA_PIN_SECONDS kieruje odczyty tego
+klienta na primary, także w widokach @use_replica.
+
+Opóźnienie repliki zakładamy do REPLICA_MAX_LAG_SECONDS: zmiana starsza niż
+to jest już na replice (replica_safe). Od tego zależy m.in. czas życia
+slotów policzonych z repliki w core.slot_cache.
+
+Lokalnie wystarczą dwa pliki SQLite:
+
+    DATABASE_URL=sqlite:////tmp/primary.sqlite3 python manage.py migrate
+    DATABASE_URL=sqlite:////tmp/primary.sqlite3 python manage.py replicate_sqlite /tmp/replica.sqlite3
+    DATABASE_URL=sqlite:////tmp/primary.sqlite3 \\
+        DATABASE_REPLICA_URL=sqlite:////tmp/replica.sqlite3 python manage.py runserver
+
+replicate_sqlite kopiuje primary na replikę — między kopiami replika
+„nie nadąża”, co dobrze widać na slotach.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA = "replica"
+
+_scope = ContextVar("replica_scope", default=False)     # widok @use_replica
+_pinned = ContextVar("replica_pinned", default=False)   # odczyty tylko z primary
+
+def enabled() -> bool:
+    return REPLICA in settings.DATABASES
+
+def reading_replica() -> bool:
+    """Czy odczyty w bieżącym kontekście idą na replikę."""
+    return (_scope.get() and not _pinned.get() and enabled()
+            and not connections[DEFAULT_DB_ALIAS].in_atomic_block)
+
+def replica_safe(version: int) -> bool:
+    """
+    Czy dane w wersji `version` (ms, core.slot_cache) odczytane teraz są
+    aktualne — poza repliką zawsze, na replice dopiero po maksymalnym opóźnieniu.
+    """
+    if not reading_replica():
+        return True
+    return time.time() * 1000 - version > settings.REPLICA_MAX_LAG_SECONDS * 1000
+
+@contextmanager
+def replica_reads():
+    """Odczyty w bloku na replikę (o ile nie ma przypięcia do primary)."""
+    token = _scope.set(True)
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+@contextmanager
+def primary_reads(pinned: bool = True):
+    """Odczyty w bloku na primary, także wewnątrz replica_reads()."""
+    token = _pinned.set(pinned)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+def use_replica(view):
+    """Dekorator widoku (sync lub async) — odczyty na replikę."""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            # kontekst przechodzi do wątków sync_to_async
+            with replica_reads():
+                return await view(request, *args, **kwargs)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with replica_reads():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+class ReplicaRouter:
+    """DATABASE_ROUTERS: zapisy i migracje na primary, odczyty wg reading_replica()."""
+
+    def db_for_read(self, model, **hints):
+        return REPLICA if reading_replica() else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # te same dane — obiekt z repliki może wskazywać obiekt z primary
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS  # replikę zasila replikacja, nie migrate
@@ -0,0 +1,205 @@
+# core/schedule.py
+"""
+Tygodniowy grafik kliniki i wetów — zapis hurtowy.
+
+Format (JSON):
+
+    {
+      "clinic": {"0": [["09:00", "17:00"]], "5": [["10:00", "14:00"]]},
+      "vets":   {"12": {"0": [["08:00", "12:00"], ["13:00", "16:00"]]}}
+    }
+
+Podany podmiot (klinika albo wet) dostaje cały tydzień na nowo — dni
+pominięte nie mają godzin; pominięte podmioty zostają bez zmian. Okna
+w jednym dniu nie mogą na siebie nachodzić (stykać się mogą).
+
+Zapis to różnica względem bazy: bulk delete zbędnych wierszy i bulk_create
+brakujących w jednej transakcji, z jednym powiadomieniem o zmianie dostępności.
+
+Wyjątki (AvailabilityException) mogą obejmować zakres dni i jeden dzień
+tygodnia; dodanie zamknięcia oznacza wizyty, które w nie wpadają, do
+przełożenia (Appointment.needs_followup) jednym UPDATE.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_time
+
+from . import availability
+from .models import Appointment, AvailabilityException, ClinicHours, Vet, VetHours
+from .signals import schedule_batch
+
+WEEKDAYS = range(7)
+
+class ScheduleError(Exception):
+    """Niepoprawny grafik; args[0] to lista komunikatów."""
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Walidacja
+# ───────────────────────────────────────────────────────────────────────────────
+
+def _time(value):
+    try:
+        return parse_time(value) if isinstance(value, str) else None
+    except ValueError:
+        return None
+
+def _week(label, week, errors) -> set:
+    """{"0": [[start, end], ...]} → {(weekday, start, end)}; błędy do `errors`."""
+    if not isinstance(week, dict):
+        errors.append(f"{label}: oczekiwano obiektu dzień → okna")
+        return set()
+    rows = set()
+    for key, windows in week.items():
+        try:
+            wd = int(key)
+        except (TypeError, ValueError):
+            wd = -1
+        if wd not in WEEKDAYS:
+            errors.append(f"{label}: nieznany dzień {key!r} (0=pon … 6=niedz)")
+            continue
+        parsed = []
+        for window in windows if isinstance(windows, list) else [None]:
+            start, end = (_time(window[0]), _time(window[1])) if isinstance(window, list) and len(window) == 2 else (None, None)
+            if not (start and end and start < end):
+                errors.append(f"{label}, dzień {wd}: błędne okno {window!r}")
+                continue
+            parsed.append((start, end))
+        parsed.sort()
+        for (s1, e1), (s2, e2) in zip(parsed, parsed[1:]):
+            if s2 < e1:
+                errors.append(f"{label}, dzień {wd}: okna {s1:%H:%M}–{e1:%H:%M} i {s2:%H:%M}–{e2:%H:%M} nachodzą na siebie")
+        rows.update((wd, s, e) for s, e in parsed)
+    return rows
+
+def parse(clinic, data) -> tuple:
+    """
+    Sprawdza grafik → (wiersze kliniki albo None, {vet_id: wiersze}).
+    Rzuca ScheduleError ze wszystkimi błędami naraz.
+    """
+    if not isinstance(data, dict):
+        raise ScheduleError(["oczekiwano obiektu z kluczami clinic/vets"])
+    errors = []
+    clinic_rows = _week("klinika", data["clinic"], errors) if "clinic" in data else None
+    vets = data.get("vets") or {}
+    if not isinstance(vets, dict):
+        errors.append("vets: oczekiwano obiektu id weta → tydzień")
+        vets = {}
+    own = set(Vet.objects.filter(clinic=clinic).values_list("id", flat=True))
+    vet_rows = {}
+    for key, week in vets.items():
+        try:
+            vid = int(key)
+        except (TypeError, ValueError):
+            vid = None
+        if vid not in own:
+            errors.append(f"wet {key!r} nie należy do kliniki")
+            continue
+        vet_rows[vid] = _week(f"wet {vid}", week, errors)
+    if errors:
+        raise ScheduleError(errors)
+    return clinic_rows, vet_rows
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Zapis
+# ───────────────────────────────────────────────────────────────────────────────
+
+def apply(clinic, clinic_rows, vet_rows) -> dict:
+    """Zapisuje różnicę (wynik parse) → {"created": n, "deleted": m}."""
+    created = deleted = 0
+    with transaction.atomic(), schedule_batch() as touched:
+        if clinic_rows is not None:
+            existing = {(h.weekday, h.start, h.end): h.id for h in
+                        ClinicHours.objects.filter(clinic=clinic).only("id", "weekday", "start", "end")}
+            stale = [pk for key, pk in existing.items() if key not in clinic_rows]
+            if stale:
+                deleted += ClinicHours.objects.filter(pk__in=stale).delete()[0]
+            new = [ClinicHours(clinic=clinic, weekday=wd, start=s, end=e)
+                   for wd, s, e in sorted(clinic_rows - existing.keys())]
+            created += len(ClinicHours.objects.bulk_create(new))
+
+        if vet_rows:
+            existing = {(h.vet_id, h.weekday, h.start, h.end): h.id for h in
+                        VetHours.objects.filter(vet_id__in=list(vet_rows)).only("id", "vet_id", "weekday", "start", "end")}
+            wanted = {(vid, wd, s, e) for vid, rows in vet_rows.items() for wd, s, e in rows}
+            stale = [pk for key, pk in existing.items() if key not in wanted]
+            if stale:
+                deleted += VetHours.objects.filter(pk__in=stale).delete()[0]
+            new = [VetHours(vet_id=vid, weekday=wd, start=s, end=e)
+                   for vid, wd, s, e in sorted(wanted - existing.keys())]
+            created += len(VetHours.objects.bulk_create(new))
+
+        if created or deleted:
+            touched.add(clinic.id)  # bulk_create nie wysyła sygnałów
+    return {"created": created, "deleted": deleted}
+
+def export(clinic) -> dict:
+    """Aktualny grafik kliniki i wszystkich jej wetów w formacie jak wyżej."""
+    def week(rows):
+        out = {}
+        for wd, s, e in rows:
+            out.setdefault(str(wd), []).append([f"{s:%H:%M}", f"{e:%H:%M}"])
+        return out
+
+    vets = {str(vid): {} for vid in Vet.objects.filter(clinic=clinic).order_by("id").values_list("id", flat=True)}
+    by_vet = {}
+    for vid, wd, s, e in VetHours.objects.filter(vet__clinic=clinic).order_by("vet_id", "weekday", "start").values_list(
+            "vet_id", "weekday", "start", "end"):
+        by_vet.setdefault(vid, []).append((wd, s, e))
+    for vid, rows in by_vet.items():
+        vets[str(vid)] = week(rows)
+    clinic_rows = ClinicHours.objects.filter(clinic=clinic).order_by("weekday", "start").values_list("weekday", "start", "end")
+    return {"clinic": week(clinic_rows), "vets": vets}
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Wyjątki zakresowe i cykliczne
+# ───────────────────────────────────────────────────────────────────────────────
+
+def affected_appointments(ex: AvailabilityException):
+    """Aktywne wizyty, które wypadają w zamknięciu albo poza oknem wyjątku."""
+    qs = Appointment.objects.exclude(status="CANCELLED")
+    qs = qs.filter(clinic_id=ex.entity_id) if ex.entity_type == "CLINIC" else qs.filter(vet_id=ex.entity_id)
+    start, _ = availability._day_bounds(ex.date)
+    end, _ = availability._day_bounds(ex.last_day + timedelta(days=1))
+    qs = qs.filter(starts_at__gte=start, starts_at__lt=end)
+    if ex.weekday is not None:
+        qs = qs.filter(starts_at__iso_week_day=ex.weekday + 1)
+    if not ex.closed:
+        if not (ex.start and ex.end):
+            return qs.none()
+        qs = qs.filter(Q(starts_at__time__lt=ex.start) | Q(ends_at__time__gt=ex.end))
+    return qs
+
+def _effective_days(ex: AvailabilityException) -> set:
+    """Dni wyjątku, w których obowiązuje on, a nie inny (węższy) — availability._precedence."""
+    days = set(availability.exception_days(ex, ex.date, ex.last_day))
+    others = AvailabilityException.objects.filter(
+        entity_type=ex.entity_type, entity_id=ex.entity_id, date__lte=ex.last_day,
+    ).filter(Q(date_to__gte=ex.date) | Q(date_to__isnull=True, date__gte=ex.date)).exclude(pk=ex.pk)
+    for other in others:
+        if availability._precedence(other) > availability._precedence(ex):
+            days.difference_update(availability.exception_days(other, ex.date, ex.last_day))
+    return days
+
+def mark_followup(ex: AvailabilityException) -> int:
+    """
+    Oznacza wizyty objęte wyjątkiem do przełożenia — jeden UPDATE; zwraca ich
+    liczbę. Dni, w których wygrywa inny wyjątek, pomija.
+    """
+    qs = affected_appointments(ex).filter(needs_followup=False)
+    days = _effective_days(ex)
+    if days != set(availability.exception_days(ex, ex.date, ex.last_day)):
+        qs = Appointment.objects.filter(pk__in=[
+            pk for pk, start in qs.values_list("id", "starts_at") if timezone.localdate(start) in days
+        ])
+    # update() omija auto_now — updated_at ustawiamy sami, żeby kalendarz odświeżył komórki
+    return qs.update(needs_followup=True, updated_at=timezone.now())
+
+def add_exception(ex: AvailabilityException) -> int:
+    """Zapisuje (zwalidowany) wyjątek i oznacza wizyty do przełożenia; zwraca ich liczbę."""
+    # powiadomienie (wersja kliniki) po commicie — polling kalendarza zobaczy już oznaczone wizyty
+    with transaction.atomic(), schedule_batch():
+        ex.save()
+        return mark_followup(ex)
@@ -0,0 +1,133 @@
+# core/signals.py
+"""
+Unieważnianie cache dostępności: każda zmiana wizyty, godzin, weta lub
+wyjątku podbija wersję kliniki, której dotyczy (core.slot_cache), a zmiana
+samej kliniki — także wersję listy klinik.
+Wizyty aktualizują też dzienne liczniki, a godziny/weci/wyjątki ich
+pojemność (core.day_stats).
+Usunięcie lub przeniesienie wizyty podbija dodatkowo wersję kalendarza
+(slot_cache.calendar_version) — odświeżanie kalendarza nie znajdzie go
+po updated_at.
+Zmiana profilu domenowego unieważnia jego kopię w sesjach (core.middleware).
+
+Wersje podbijamy dopiero po commicie transakcji (on_commit): żądanie slotów
+między zapisem a commitem czyta jeszcze stare wiersze i zapisałoby je
+w cache pod nową wersją — na cały SLOTS_TTL.
+
+Zmiany hurtowe (np. cały grafik tygodniowy) owijamy w schedule_batch():
+wtedy zamiast powiadomienia na wiersz jest jedno na klinikę, po commicie.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import day_stats, slot_cache
+from .middleware import invalidate_domain_user
+from .models import (
+    Appointment, AvailabilityException, Clinic, ClinicHours, User as DomainUser, Vet, VetHours
+)
+
+def _bump_on_commit(clinic_id, clinics=False, calendar=False):
+    def bump():
+        if calendar:  # przed wersją kliniki — kalendarz czyta je w odwrotnej kolejności
+            slot_cache.bump_calendar(clinic_id)
+        slot_cache.bump_clinic(clinic_id)
+        if clinics:
+            slot_cache.bump_clinics()
+    transaction.on_commit(bump)
+
+def _clinic_of_vet(vet_id):
+    return Vet.objects.filter(pk=vet_id).values_list("clinic_id", flat=True).first()
+
+@receiver([post_save, post_delete], sender=Clinic)
+def _clinic_saved(sender, instance, **kwargs):
+    # nowa klinika może dostać id usuniętej — nie dziedziczy jej wpisów
+    _bump_on_commit(instance.id, clinics=True)
+
+def _cell_vacated(instance, signal, created) -> bool:
+    """Czy zmiana opróżnia komórkę (wet, dzień) kalendarza, w której wizyta była."""
+    if signal is post_delete:
+        return True
+    if created:
+        return False
+    old = getattr(instance, "_cell", None)
+    if old is None:  # nie znamy stanu sprzed zapisu — jak przeniesienie
+        return True
+    return (old[0], timezone.localdate(old[1])) != (instance.vet_id, timezone.localdate(instance.starts_at))
+
+@receiver([post_save, post_delete], sender=Appointment)
+def _appointment_changed(sender, instance, signal, created=False, **kwargs):
+    _bump_on_commit(instance.clinic_id, calendar=_cell_vacated(instance, signal, created))
+    if signal is post_save:
+        day_stats.appointment_saved(instance, created)
+    else:
+        day_stats.appointment_deleted(instance)
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Grafik (godziny, weci, wyjątki)
+# ───────────────────────────────────────────────────────────────────────────────
+
+_batch = threading.local()
+
+def _notify(clinic_id):
+    slot_cache.bump_clinic(clinic_id)
+    day_stats.refresh_capacity(clinic_id)
+
+def _schedule_changed(clinic_id=None, vet_id=None):
+    pending = getattr(_batch, "pending", None)
+    if pending is not None:
+        # w partii: tylko zbieramy, klinikę wetów ustalimy jednym zapytaniem
+        pending["clinics" if clinic_id else "vets"].add(clinic_id or vet_id)
+        return
+    clinic_id = clinic_id or _clinic_of_vet(vet_id)
+    if clinic_id:
+        transaction.on_commit(lambda: _notify(clinic_id))
+
+@contextmanager
+def schedule_batch():
+    """
+    Zmiany grafiku w bloku → jedno powiadomienie (cache slotów, pojemność
+    w liczniki dzienne) na klinikę, po commicie transakcji. Zwraca zbiór, do
+    którego można dopisać id klinik zmienianych z pominięciem sygnałów
+    (bulk_create, QuerySet.update).
+    """
+    if getattr(_batch, "pending", None) is not None:  # zagnieżdżone — zbiera zewnętrzna
+        yield _batch.pending["clinics"]
+        return
+    pending = _batch.pending = {"clinics": set(), "vets": set()}
+    try:
+        yield pending["clinics"]
+    finally:
+        _batch.pending = None
+    clinics = set(pending["clinics"])
+    if pending["vets"]:
+        clinics.update(Vet.objects.filter(pk__in=pending["vets"]).values_list("clinic_id", flat=True))
+
+    def flush():
+        for clinic_id in sorted(clinics):
+            _notify(clinic_id)
+    transaction.on_commit(flush)
+
+@receiver([post_save, post_delete], sender=ClinicHours)
+@receiver([post_save, post_delete], sender=Vet)
+def _clinic_changed(sender, instance, **kwargs):
+    _schedule_changed(clinic_id=instance.clinic_id)
+
+@receiver([post_save, post_delete], sender=VetHours)
+def _vet_hours_changed(sender, instance, **kwargs):
+    _schedule_changed(vet_id=instance.vet_id)
+
+@receiver([post_save, post_delete], sender=AvailabilityException)
+def _exception_changed(sender, instance, **kwargs):
+    if instance.entity_type == "CLINIC":
+        _schedule_changed(clinic_id=instance.entity_id)
+    else:
+        _schedule_changed(vet_id=instance.entity_id)
+
+@receiver([post_save, post_delete], sender=DomainUser)
+def _domain_user_changed(sender, instance, **kwargs):
+    invalidate_domain_user(instance.auth_user_id)
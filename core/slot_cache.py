@@ -0,0 +1,232 @@
+# core/slot_cache.py
+"""
+Cache dostępności.
+
+Wyliczone sloty trzymamy w cache Django per (klinika, dzień, długość slotu).
+Klucz zawiera wersję kliniki — licznik podbijany przez sygnały (core.signals)
+przy każdej zmianie wizyt, godzin, wetów lub wyjątków tej kliniki — więc
+unieważnienie to jeden zapis, a stare wpisy po prostu wygasają.
+
+Wersja to znacznik czasu w ms (rosnący), dzięki czemu po wyczyszczeniu cache
+nie wracamy do starych wartości, a przy okazji mówi, kiedy dane się zmieniły.
+Osobna wersja całej tabeli klinik służy listom klinik. Obie są też
+walidatorami HTTP (ETag/Last-Modified) w core.views.
+
+Cache w pamięci procesu (locmem, domyślny bez REDIS_URL) nie jest wspólny
+dla workerów: podbicie wersji widzi tylko proces, który obsłużył zapis.
+Wtedy wersje i wpisy żyją najwyżej SLOT_CACHE_LOCAL_TTL sekund — wersja
+po wygaśnięciu powstaje od nowa (większa), więc pozostałe workery
+nadrabiają zmianę najpóźniej po tym czasie.
+
+Sloty liczone z repliki (core.routers) krótko po zmianie mogą jej jeszcze
+nie zawierać — takie wpisy dostają TTL równy maksymalnemu opóźnieniu
+repliki zamiast SLOTS_TTL.
+"""
+import asyncio
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from . import availability, perf, routers
+
+SLOTS_TTL = 60 * 60 * 24  # s; wersja i tak unieważnia wpisy wcześniej
+PROCESS_LOCAL_CACHES = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+def _count(name: str, n: int = 1):
+    with _lock:
+        _stats[name] += n
+
+def stats() -> dict:
+    """Liczniki trafień/chybień cache slotów w tym procesie."""
+    with _lock:
+        hits, misses = _stats["hits"], _stats["misses"]
+    total = hits + misses
+    return {"hits": hits, "misses": misses, "hit_rate": hits / total if total else 0.0}
+
+def reset_stats():
+    with _lock:
+        _stats.update(hits=0, misses=0)
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Wersje klinik
+# ───────────────────────────────────────────────────────────────────────────────
+
+def _version_key(clinic_id) -> str:
+    return f"avail:v:{clinic_id}"
+
+CLINICS_VERSION_KEY = "avail:clinics:v"
+
+def process_local() -> bool:
+    """Czy cache jest w pamięci procesu — wtedy zmian z innych workerów nie widać."""
+    return settings.CACHES["default"]["BACKEND"] in PROCESS_LOCAL_CACHES
+
+def _version_timeout():
+    return settings.SLOT_CACHE_LOCAL_TTL if process_local() else None
+
+def _read_version(key) -> int:
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time.time() * 1000), _version_timeout())
+        version = cache.get(key)
+    return version
+
+def _bump(key):
+    cache.set(key, max(int(time.time() * 1000), (cache.get(key) or 0) + 1), _version_timeout())
+
+def clinic_version(clinic_id) -> int:
+    """Aktualna wersja dostępności kliniki (tworzona przy pierwszym odczycie)."""
+    return _read_version(_version_key(clinic_id))
+
+def bump_clinic(clinic_id):
+    """Unieważnia wszystkie wpisy kliniki (nowa wersja > poprzedniej)."""
+    _bump(_version_key(clinic_id))
+
+def clinic_versions(clinic_ids) -> dict:
+    """{clinic_id: wersja} — jeden get_many zamiast odczytu na klinikę."""
+    keys = {cid: _version_key(cid) for cid in clinic_ids}
+    found = cache.get_many(list(keys.values()))
+    return {cid: found[key] if key in found else clinic_version(cid) for cid, key in keys.items()}
+
+def clinics_version() -> int:
+    """Wersja tabeli klinik (lista na stronie głównej i /clinics/)."""
+    return _read_version(CLINICS_VERSION_KEY)
+
+def bump_clinics():
+    _bump(CLINICS_VERSION_KEY)
+
+def _calendar_key(clinic_id) -> str:
+    return f"avail:cal:v:{clinic_id}"
+
+def calendar_version(clinic_id) -> int:
+    """
+    Wersja ostatniego usunięcia/przeniesienia wizyty w klinice — zmiany,
+    której kalendarz nie znajdzie po updated_at (pusta zostaje stara komórka).
+    """
+    return _read_version(_calendar_key(clinic_id))
+
+def bump_calendar(clinic_id):
+    _bump(_calendar_key(clinic_id))
+
+def version_time(version: int):
+    """Wersja (ms) → datetime UTC, np. na nagłówek Last-Modified."""
+    return datetime.fromtimestamp(version / 1000, tz=dt_timezone.utc)
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Sloty z cache
+# ───────────────────────────────────────────────────────────────────────────────
+
+def _slots_key(clinic_id, version, day, duration) -> str:
+    return f"avail:s:{clinic_id}:{version}:{day.isoformat()}:{duration}"
+
+def _ttl(versions) -> int:
+    if process_local():
+        return settings.SLOT_CACHE_LOCAL_TTL
+    if all(routers.replica_safe(v) for v in versions):
+        return SLOTS_TTL
+    # replika mogła jeszcze nie dostać zmiany z tej wersji — wpis do ponownego policzenia
+    return max(1, int(settings.REPLICA_MAX_LAG_SECONDS))
+
+def day_slots(clinic, day, duration: int = availability.SLOT_MINUTES):
+    """availability.day_slots przez cache."""
+    version = clinic_version(clinic.id)
+    key = _slots_key(clinic.id, version, day, duration)
+    slots = cache.get(key)
+    if slots is not None:
+        _count("hits")
+        return slots
+    _count("misses")
+    with perf.span("slots"):
+        slots = availability.day_slots(clinic, day, duration)
+    cache.set(key, slots, _ttl([version]))
+    return slots
+
+def range_slots(clinic, first, last, duration: int = availability.SLOT_MINUTES):
+    """
+    availability.range_slots przez cache: brakujące dni liczone są jednym
+    load_range (od pierwszego do ostatniego brakującego dnia).
+    """
+    version = clinic_version(clinic.id)
+    days = availability.days_between(first, last)
+    keys = {d: _slots_key(clinic.id, version, d, duration) for d in days}
+    cached = cache.get_many(list(keys.values()))
+    result = {d: cached[k] for d, k in keys.items() if k in cached}
+    missing = [d for d in days if d not in result]
+    _count("hits", len(result))
+    _count("misses", len(missing))
+
+    if missing:
+        with perf.span("slots"):
+            data = availability.load_range(clinic, missing[0], missing[-1])
+            fresh = {d: availability.compute_slots(data[d], duration) for d in missing}
+        cache.set_many({keys[d]: slots for d, slots in fresh.items()}, _ttl([version]))
+        result.update(fresh)
+    return [(d, result[d]) for d in days]
+
+def _cached_day(clinic_ids, day, duration):
+    """(klucze, sloty z cache, kliniki do policzenia, TTL ich wpisów) dla dnia `day`."""
+    versions = clinic_versions(clinic_ids)
+    keys = {cid: _slots_key(cid, versions[cid], day, duration) for cid in clinic_ids}
+    cached = cache.get_many(list(keys.values()))
+    result = {cid: cached[k] for cid, k in keys.items() if k in cached}
+    missing = [cid for cid in clinic_ids if cid not in result]
+    _count("hits", len(result))
+    _count("misses", len(missing))
+    return keys, result, missing, _ttl(versions[cid] for cid in missing)
+
+def _compute_day(clinic_ids, keys, day, duration, ttl) -> dict:
+    with perf.span("slots"):
+        data = availability.load_clinics(clinic_ids, day, day)
+        fresh = {cid: availability.compute_slots(data[cid][day], duration) for cid in clinic_ids}
+    cache.set_many({keys[cid]: slots for cid, slots in fresh.items()}, ttl)
+    return fresh
+
+def clinics_day_slots(clinic_ids, day, duration: int = availability.SLOT_MINUTES) -> dict:
+    """
+    Sloty wielu klinik w jednym dniu: {clinic_id: sloty}. Brakujące w cache
+    liczone są razem — jeden load_clinics (zapytania IN) dla wszystkich.
+    """
+    keys, result, missing, ttl = _cached_day(clinic_ids, day, duration)
+    if missing:
+        result.update(_compute_day(missing, keys, day, duration, ttl))
+    return result
+
+ASYNC_CHUNK = 10  # klinik na jedno równoległe zadanie w aclinics_day_slots
+
+def _compute_chunk(clinic_ids, keys, day, duration, ttl) -> dict:
+    # osobny wątek = osobne połączenie z bazą; zamykamy je, bo wątek puli nie
+    # przechodzi przez request_finished, które sprząta połączenia żądania
+    try:
+        return _compute_day(clinic_ids, keys, day, duration, ttl)
+    finally:
+        connections.close_all()
+
+async def aclinics_day_slots(clinic_ids, day, duration: int = availability.SLOT_MINUTES) -> dict:
+    """
+    Async clinics_day_slots dla widoków ASGI. Kliniki spoza cache dzielone są
+    na porcje po ASYNC_CHUNK liczone równolegle (asyncio.gather), każda jednym
+    load_clinics we własnym wątku i połączeniu — przy jednej porcji zostajemy
+    na połączeniu żądania, z tą samą liczbą zapytań co wersja sync.
+    """
+    keys, result, missing, ttl = await sync_to_async(_cached_day)(clinic_ids, day, duration)
+    if len(missing) <= ASYNC_CHUNK:
+        if missing:
+            result.update(await sync_to_async(_compute_day)(missing, keys, day, duration, ttl))
+        return result
+    chunks = [missing[i:i + ASYNC_CHUNK] for i in range(0, len(missing), ASYNC_CHUNK)]
+    with perf.span("slots"):  # czas ścienny całości; spany w wątkach są zagnieżdżone
+        for fresh in await asyncio.gather(*(
+            sync_to_async(_compute_chunk, thread_sensitive=False)(chunk, keys, day, duration, ttl) for chunk in chunks
+        )):
+            result.update(fresh)
+    return result
@@ -0,0 +1,1111 @@
+import asyncio
+import csv
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import types
+from datetime import date as ddate, datetime, time as dtime, timedelta, timezone as dt_timezone
+from unittest import mock
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User as DjangoUser
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections, transaction
+from django.db.models import Count
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from django.utils import timezone
+from django.utils.timezone import make_aware
+
+from core.middleware import PIN_COOKIE, SESSION_KEY, get_domain_user
+from core import availability, booking, day_stats, exports, metrics, routers, schedule, slot_cache, views
+from core.models import (
+    Appointment, AvailabilityException, Clinic, ClinicDayStats, ClinicHours, Pet, User, Vet, VetHours,
+)
+
+
+def _clinic(vets=1, name="Klinika"):
+    """Klinika otwarta 9–17 codziennie, z `vets` wetami."""
+    owner = User.objects.create(email=f"{name.lower()}-{Clinic.objects.count()}@example.invalid")
+    clinic = Clinic.objects.create(name=name)
+    ClinicHours.objects.bulk_create(ClinicHours(clinic=clinic, weekday=wd, start=dtime(9), end=dtime(17))
+                                    for wd in range(7))
+    for _ in range(vets):
+        Vet.objects.create(user=owner, clinic=clinic)
+    return clinic, owner
+
+def _login(client, user, role=None):
+    """Konto Django dla profilu domenowego `user` (opcjonalnie ze zmianą roli) i logowanie."""
+    user.auth_user = DjangoUser.objects.create_user(user.email)
+    if role:
+        user.role = role
+    user.save()
+    client.force_login(user.auth_user)
+
+def _at(day, hour, minute=0):
+    return make_aware(datetime.combine(day, dtime(hour, minute)))
+
+def _tomorrow():
+    return timezone.localdate() + timedelta(days=1)
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Silnik dostępności
+# ───────────────────────────────────────────────────────────────────────────────
+
+class AvailabilityQueriesTests(TestCase):
+    """Liczba zapytań o sloty nie zależy od liczby wetów ani wizyt."""
+
+    def setUp(self):
+        cache.clear()
+
+    def _with_appointments(self, clinic, owner):
+        pet = Pet.objects.create(owner=owner, name="Rex", species="dog")
+        day = _tomorrow()
+        for i, vet in enumerate(Vet.objects.filter(clinic=clinic)):
+            Appointment.objects.create(clinic=clinic, vet=vet, owner=owner, pet=pet,
+                                       starts_at=_at(day, 9 + i % 8), ends_at=_at(day, 9 + i % 8, 30))
+
+    def test_day_slots_constant_in_vets(self):
+        for vets in (1, 8):
+            clinic, owner = _clinic(vets)
+            self._with_appointments(clinic, owner)
+            with self.assertNumQueries(5):
+                availability.day_slots(clinic, _tomorrow())
+
+    def test_slots_view_constant_in_vets(self):
+        for vets in (1, 8):
+            clinic, owner = _clinic(vets)
+            self._with_appointments(clinic, owner)
+            with self.assertNumQueries(6):  # klinika + silnik
+                response = self.client.get(f"/clinics/{clinic.id}/slots", {"date": _tomorrow().isoformat()})
+            self.assertEqual(response.status_code, 200)
+
+def _baseline_slots(data, step=availability.SLOT_MINUTES):
+    """Dawny algorytm: każdy slot co `step` w oknie, sprawdzany any() po wizytach veta."""
+    slots = []
+    for vid in data.vet_ids:
+        busy = [(data.at(bs), data.at(be)) for bs, be in data.busy.get(vid, [])]
+        for w_start, w_end in availability.vet_windows(data, vid):
+            for t in range(w_start, w_end, step):
+                s, e = data.at(t), data.at(t + step)
+                if not any(s < be and bs < e for bs, be in busy):
+                    slots.append((s, e))
+    return sorted(slots)
+
+class IntervalArithmeticTests(SimpleTestCase):
+    """merge/subtract/cut na minutach dnia, w tym wizyty poza siatką i styki."""
+
+    def test_merge_intervals(self):
+        cases = [
+            ([], []),
+            ([(30, 30), (50, 40)], []),                          # puste i odwrócone odpadają
+            ([(10, 20), (0, 5), (15, 30)], [(0, 5), (10, 30)]),
+            ([(0, 10), (10, 20)], [(0, 20)]),                    # styk scala
+            ([(0, 100), (10, 20)], [(0, 100)]),
+        ]
+        for intervals, expected in cases:
+            with self.subTest(intervals=intervals):
+                self.assertEqual(availability.merge_intervals(intervals), expected)
+
+    def test_subtract_intervals(self):
+        cases = [
+            ([(540, 1020)], [], [(540, 1020)]),
+            ([(540, 1020)], [(500, 1100)], []),
+            ([(540, 1020)], [(610, 640)], [(540, 610), (640, 1020)]),         # poza siatką
+            ([(540, 1020)], [(480, 540), (1020, 1080)], [(540, 1020)]),       # styki z oknem
+            ([(540, 600), (600, 660)], [(570, 630)], [(540, 570), (630, 660)]),
+            ([(0, 50), (60, 100)], [(40, 70)], [(0, 40), (70, 100)]),         # cięcie przez dwa okna
+            ([(100, 200)], [(0, 50), (150, 160), (300, 400)], [(100, 150), (160, 200)]),
+        ]
+        for base, cuts, expected in cases:
+            with self.subTest(base=base, cuts=cuts):
+                self.assertEqual(availability.subtract_intervals(base, cuts), expected)
+
+    def test_cut_slots(self):
+        cases = [
+            (([(0, 90)], 30), {}, [(0, 30), (30, 60), (60, 90)]),
+            (([(0, 80)], 30), {}, [(0, 30), (30, 60)]),                    # bez wyjścia poza okno
+            (([(540, 720)], 45), {}, [(540, 585), (585, 630), (630, 675), (675, 720)]),
+            (([(0, 60)], 30), {"step": 15}, [(0, 30), (15, 45), (30, 60)]),
+            (([(640, 720)], 30), {"anchor": 540}, [(660, 690), (690, 720)]),   # start do siatki
+            (([(600, 660)], 30), {"anchor": 540}, [(600, 630), (630, 660)]),   # start na siatce
+            (([(610, 650)], 30), {"anchor": 540}, []),
+        ]
+        for args, kwargs, expected in cases:
+            with self.subTest(args=args, kwargs=kwargs):
+                self.assertEqual(list(availability.cut_slots(*args, **kwargs)), expected)
+
+    def test_matches_baseline(self):
+        data = availability.DayData(
+            day=ddate(2026, 6, 10), vet_ids=[1, 2, 3, 4],
+            clinic_hours=[(540, 1020)],
+            vet_hours={2: [(480, 720), (780, 960)]},
+            vet_exceptions={3: AvailabilityException(entity_type="VET", entity_id=3,
+                                                     start=dtime(10), end=dtime(14)),
+                            4: AvailabilityException(entity_type="VET", entity_id=4, closed=True)},
+            busy={1: [(610, 640), (660, 690), (690, 720), (1000, 1100)],
+                  2: [(470, 500), (715, 790)],
+                  3: [(600, 630), (700, 705)]},
+        )
+        slots = availability.compute_slots(data)
+        self.assertEqual(slots, _baseline_slots(data))
+        self.assertEqual(len(slots), 11 + 11 + 6)      # wet 4 zamknięty wyjątkiem
+
+class SlotsRevalidationTests(TestCase):
+    """ETag slotów rozróżnia parametry i reprezentację — 304 tylko dla tej samej treści."""
+
+    def setUp(self):
+        cache.clear()
+        self.clinic, _ = _clinic()
+        self.url = f"/clinics/{self.clinic.id}/slots"
+        self.day = _tomorrow()
+
+    def _get(self, url, date, etag=None):
+        headers = {"If-None-Match": etag} if etag else {}
+        return self.client.get(url, {"date": date.isoformat()}, headers=headers)
+
+    def test_same_request_not_modified(self):
+        etag = self._get(self.url, self.day)["ETag"]
+        self.assertEqual(self._get(self.url, self.day, etag).status_code, 304)
+
+    def test_other_date_modified(self):
+        etag = self._get(self.url, self.day)["ETag"]
+        self.assertEqual(self._get(self.url, self.day + timedelta(days=1), etag).status_code, 200)
+
+    def test_html_and_json_differ(self):
+        html = self._get(self.url, self.day)["ETag"]
+        api = f"/api/v1/clinics/{self.clinic.id}/slots"
+        self.assertNotEqual(self._get(api, self.day)["ETag"], html)
+        self.assertEqual(self._get(api, self.day, html).status_code, 200)
+
+class RangeSlotsTests(TestCase):
+    """Tryb ?from=&to= w clinic_slots: limit MAX_RANGE_DAYS, dane ładowane raz."""
+
+    def setUp(self):
+        cache.clear()
+        self.clinic, _ = _clinic(vets=2)
+        self.url = f"/clinics/{self.clinic.id}/slots"
+        self.first = _tomorrow()
+
+    def _get(self, days):
+        last = self.first + timedelta(days=days - 1)
+        return self.client.get(self.url, {"from": self.first.isoformat(), "to": last.isoformat()})
+
+    def test_cap(self):
+        self.assertEqual(self._get(availability.MAX_RANGE_DAYS).status_code, 200)
+        self.assertEqual(self._get(availability.MAX_RANGE_DAYS + 1).status_code, 400)
+        self.assertEqual(self._get(0).status_code, 400)                     # to < from
+        self.assertEqual(self.client.get(self.url, {"from": self.first.isoformat()}).status_code, 400)
+
+    def test_week_costs_one_day(self):
+        with self.assertNumQueries(6):                                      # klinika + silnik
+            response = self._get(7)
+        self.assertEqual(response.status_code, 200)
+
+    def test_matches_day_slots(self):
+        last = self.first + timedelta(days=6)
+        days = availability.range_slots(self.clinic, self.first, last)
+        self.assertEqual([d for d, _ in days], availability.days_between(self.first, last))
+        for day, slots in days:
+            self.assertEqual(slots, availability.day_slots(self.clinic, day))
+
+class EarliestSlotsTests(TestCase):
+    """availability.earliest_slots: porcje dni 1, 2, 4, ... przycięte do horyzontu."""
+
+    def setUp(self):
+        cache.clear()
+        self.clinic, _ = _clinic()
+        self.today = _tomorrow()
+        self.now = _at(self.today, 7)
+
+    def _close(self, first, last):
+        AvailabilityException.objects.create(entity_type="CLINIC", entity_id=self.clinic.id,
+                                             date=first, date_to=last, closed=True)
+
+    def _search(self, days, limit=1, now=None):
+        with mock.patch.object(availability, "load_clinics", wraps=availability.load_clinics) as load:
+            found = availability.earliest_slots([self.clinic], limit, days, now=now or self.now)
+        chunks = [((a[1] - self.today).days, (a[2] - self.today).days) for a, _ in load.call_args_list]
+        return found, chunks
+
+    def test_stops_after_first_chunk(self):
+        found, chunks = self._search(days=7, limit=3)
+        self.assertEqual(chunks, [(0, 0)])
+        self.assertEqual([s for s, _e, _c in found], [_at(self.today, 9), _at(self.today, 9, 30), _at(self.today, 10)])
+
+    def test_not_before_now(self):
+        found, _ = self._search(days=7, now=_at(self.today, 12, 10))
+        self.assertEqual(found[0][0], _at(self.today, 12, 30))
+
+    def test_chunk_boundaries(self):
+        self._close(self.today, self.today + timedelta(days=2))
+        found, chunks = self._search(days=10)
+        self.assertEqual(chunks, [(0, 0), (1, 2), (3, 6)])                 # pierwszy wolny dzień otwiera 3. porcję
+        self.assertEqual(found[0][0], _at(self.today + timedelta(days=3), 9))
+
+    def test_empty_horizon(self):
+        self._close(self.today, self.today + timedelta(days=30))
+        found, chunks = self._search(days=10)
+        self.assertEqual(found, [])
+        self.assertEqual(chunks, [(0, 0), (1, 2), (3, 6), (7, 9)])         # ostatnia przycięta do horyzontu
+        self.assertEqual(availability.earliest_slots([], 5, 7), [])
+
+class BatchSlotsTests(TestCase):
+    """/clinics/slots?ids=: stała liczba zapytań niezależnie od liczby klinik."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_constant_queries(self):
+        day = _tomorrow().isoformat()
+        for n in (1, views.MAX_BATCH_CLINICS):
+            cache.clear()
+            ids = [_clinic(vets=2, name=f"K{n}-{i}")[0].id for i in range(n)]
+            with self.assertNumQueries(6):                                  # kliniki + silnik (IN)
+                response = self.client.get("/clinics/slots", {"ids": ",".join(map(str, ids)), "date": day})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.content.decode().count('hx-swap-oob'), n)
+
+    def test_bad_ids(self):
+        too_many = ",".join(str(i) for i in range(1, views.MAX_BATCH_CLINICS + 2))
+        for ids in ("", "x,y", too_many):
+            with self.subTest(ids=ids[:10]):
+                self.assertEqual(self.client.get("/clinics/slots", {"ids": ids}).status_code, 400)
+
+class AsyncBatchChunksTests(TransactionTestCase):
+    """aclinics_day_slots: porcje po ASYNC_CHUNK w osobnych wątkach, wynik jak w wersji sync."""
+
+    def setUp(self):
+        cache.clear()
+        self.ids = [_clinic(name=f"K{i}")[0].id for i in range(2 * slot_cache.ASYNC_CHUNK + 5)]
+        self.day = _tomorrow()
+
+    def _gather(self, ids):
+        with mock.patch.object(slot_cache, "_compute_chunk", wraps=slot_cache._compute_chunk) as chunk:
+            result = async_to_sync(slot_cache.aclinics_day_slots)(ids, self.day)
+        return result, [len(c.args[0]) for c in chunk.call_args_list]
+
+    def test_chunks(self):
+        result, chunks = self._gather(self.ids)
+        self.assertEqual(sorted(chunks), [5, 10, 10])
+        cache.clear()
+        self.assertEqual(result, slot_cache.clinics_day_slots(self.ids, self.day))
+
+    def test_single_chunk_stays_on_request_connection(self):
+        result, chunks = self._gather(self.ids[:slot_cache.ASYNC_CHUNK])
+        self.assertEqual(chunks, [])
+        self.assertEqual(len(result), slot_cache.ASYNC_CHUNK)
+
+    def test_cached_clinics_skipped(self):
+        slot_cache.clinics_day_slots(self.ids[:10], self.day)
+        _, chunks = self._gather(self.ids)
+        self.assertEqual(sorted(chunks), [5, 10])
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Unieważnianie cache slotów
+# ───────────────────────────────────────────────────────────────────────────────
+
+class SlotCacheInvalidationTests(TestCase):
+    """Każda zmiana podbija wersję swojej kliniki (po commicie) i tylko jej."""
+
+    def setUp(self):
+        cache.clear()
+        self.clinic, self.owner = _clinic(vets=1)   # pierwsza — klinika admina (_clinic_for_admin)
+        self.other, _ = _clinic(vets=1, name="Inna")
+        self.pet = Pet.objects.create(owner=self.owner, name="Rex", species="dog")
+        self.day = _tomorrow()
+        _login(self.client, self.owner)
+
+    def _slots(self, clinic):
+        return slot_cache.day_slots(clinic, self.day)
+
+    def assertInvalidated(self, action):
+        """`action` podbija wersję self.clinic, nie self.other; sloty po nim = silnik."""
+        self._slots(self.clinic), self._slots(self.other)
+        before = slot_cache.clinic_version(self.clinic.id), slot_cache.clinic_version(self.other.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = action()
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(slot_cache.clinic_version(self.clinic.id), before[0])
+        self.assertEqual(slot_cache.clinic_version(self.other.id), before[1])
+        self.assertEqual(self._slots(self.clinic), availability.day_slots(self.clinic, self.day))
+
+    def _book(self):
+        return self.client.post(f"/clinics/{self.clinic.id}/book/confirm", {
+            "pet_id": self.pet.id, "start": _at(self.day, 10).isoformat(), "end": _at(self.day, 10, 30).isoformat(),
+        })
+
+    def test_booking(self):
+        self.assertInvalidated(self._book)
+
+    def test_cancelling(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._book()
+        appt = Appointment.objects.get()
+        self.assertInvalidated(lambda: self.client.post(f"/appointments/{appt.id}/cancel"))
+
+    def test_hours_set(self):
+        _login(self.client, User.objects.create(email="admin@example.invalid"), role="CLINIC_ADMIN")
+        self.assertInvalidated(lambda: self.client.post("/clinic-admin/hours/set", {
+            "weekday": self.day.weekday(), "start": "18:00", "end": "20:00",
+        }))
+
+    def test_exception_toggle(self):
+        _login(self.client, User.objects.create(email="admin@example.invalid"), role="CLINIC_ADMIN")
+        self.assertInvalidated(lambda: self.client.post("/clinic-admin/exceptions/toggle", {
+            "date": self.day.isoformat(), "closed": "1",
+        }))
+        self.assertEqual(self._slots(self.clinic), [])
+
+    def test_exception_toggle_bad_date(self):
+        _login(self.client, User.objects.create(email="admin@example.invalid"), role="CLINIC_ADMIN")
+        for data in ({}, {"date": ""}, {"date": "jutro"}):
+            response = self.client.post("/clinic-admin/exceptions/toggle", {**data, "closed": "1"})
+            self.assertEqual(response.status_code, 400)
+
+    def test_process_local_caches_converge(self):
+        # dwa workery z własnym locmem: zapis podbija wersję tylko w pierwszym
+        first, second = LocMemCache("worker-1", {}), LocMemCache("worker-2", {})
+        with mock.patch.object(slot_cache, "cache", second):
+            stale = self._slots(self.clinic)
+        with mock.patch.object(slot_cache, "cache", first), self.captureOnCommitCallbacks(execute=True):
+            booking.book(self.clinic, self.owner, self.pet.id, _at(self.day, 10), _at(self.day, 10, 30))
+        fresh = availability.day_slots(self.clinic, self.day)
+        self.assertNotEqual(stale, fresh)
+        later = time.time() + settings.SLOT_CACHE_LOCAL_TTL + 1
+        with mock.patch.object(slot_cache, "cache", second), mock.patch("time.time", return_value=later):
+            self.assertEqual(self._slots(self.clinic), fresh)
+
+    def test_bump_waits_for_commit(self):
+        # żądanie slotów przed commitem rezerwacji widzi stare wiersze — gdyby
+        # wersja była już nowa, zapisałoby je pod nią na cały SLOTS_TTL
+        before = slot_cache.clinic_version(self.clinic.id)
+        with self.captureOnCommitCallbacks() as callbacks:
+            booking.book(self.clinic, self.owner, self.pet.id, _at(self.day, 10), _at(self.day, 10, 30))
+            self.assertEqual(slot_cache.clinic_version(self.clinic.id), before)
+        for callback in callbacks:
+            callback()
+        self.assertGreater(slot_cache.clinic_version(self.clinic.id), before)
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Historia wizyt właściciela
+# ───────────────────────────────────────────────────────────────────────────────
+
+class AppointmentsPageTests(TestCase):
+    """Każda porcja historii to jedno zapytanie, niezależnie od jej pozycji."""
+
+    def setUp(self):
+        clinic, self.owner = _clinic(vets=1)
+        vet, pet = Vet.objects.get(clinic=clinic), Pet.objects.create(owner=self.owner, name="Rex", species="dog")
+        first = _at(_tomorrow(), 9)
+        Appointment.objects.bulk_create(
+            Appointment(clinic=clinic, vet=vet, owner=self.owner, pet=pet,
+                        starts_at=first + timedelta(hours=i), ends_at=first + timedelta(hours=i, minutes=30))
+            for i in range(views.APPTS_PAGE * 2 + 5)
+        )
+
+    def _page(self, after=None):
+        with self.assertNumQueries(1):
+            rows, cursor = views._appointments_page(self.owner, "upcoming", after)
+            [(a.clinic.name, a.pet.name, a.vet.title) for a in rows]   # select_related
+        return rows, cursor
+
+    def test_pages(self):
+        rows, cursor = self._page()
+        seen = list(rows)
+        while cursor:
+            rows, cursor = self._page(cursor)
+            seen += rows
+        self.assertEqual(len(rows), 5)
+        self.assertEqual([a.id for a in seen], list(Appointment.objects.order_by("starts_at", "id")
+                                                    .values_list("id", flat=True)))
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Obłożenie (dzienne liczniki)
+# ───────────────────────────────────────────────────────────────────────────────
+
+class OccupancyTests(TestCase):
+    def setUp(self):
+        self.clinic, owner = _clinic(vets=1)   # 480 min dziennie
+        self.today = timezone.localdate()
+        yesterday = self.today - timedelta(days=1)
+        Appointment.objects.create(clinic=self.clinic, vet=Vet.objects.get(), owner=owner,
+                                   pet=Pet.objects.create(owner=owner, name="Rex", species="dog"),
+                                   starts_at=_at(yesterday, 10), ends_at=_at(yesterday, 11))
+
+    def test_days_without_appointments_count(self):
+        self.assertEqual(ClinicDayStats.objects.count(), 1)
+        row = day_stats.occupancy(self.clinic, periods=(7,), today=self.today)[7]
+        self.assertEqual((row["busy_minutes"], row["open_minutes"]), (60, 7 * 480))
+
+    def test_capacity_materialized(self):
+        first = day_stats.occupancy(self.clinic, periods=(7,), today=self.today)
+        self.assertEqual(ClinicDayStats.objects.count(), 7)
+        with self.assertNumQueries(1):
+            self.assertEqual(day_stats.occupancy(self.clinic, periods=(7,), today=self.today), first)
+
+    def test_dashboard_queries(self):
+        cache.clear()
+        _login(self.client, User.objects.create(email="admin@example.invalid"), role="CLINIC_ADMIN")
+        self.client.get("/clinic-admin/")   # pierwsze wejście zapisuje pojemność 90 dni
+        # sesja, konto, rola, klinika, weci/godziny, obłożenie
+        with self.assertNumQueries(6):
+            self.assertEqual(self.client.get("/clinic-admin/").status_code, 200)
+
+    def test_same_as_rebuilt(self):
+        before = day_stats.occupancy(self.clinic, periods=(7, 30), today=self.today)
+        day_stats.rebuild([self.clinic.id], self.today - timedelta(days=29), self.today)
+        self.assertEqual(day_stats.occupancy(self.clinic, periods=(7, 30), today=self.today), before)
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Uprawnienia panelu kliniki
+# ───────────────────────────────────────────────────────────────────────────────
+
+class ClinicAdminAccessTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        _clinic()
+        self.admin = User.objects.create(email="admin@example.invalid")
+        _login(self.client, self.admin, role="CLINIC_ADMIN")
+
+    def test_admin_allowed(self):
+        self.assertEqual(self.client.get("/clinic-admin/").status_code, 200)
+
+    def test_demotion_seen_without_cache(self):
+        self.client.get("/clinic-admin/")        # rola trafia do sesji
+        # update() omija sygnały — jak zmiana widziana przez inny worker z własnym cache
+        User.objects.filter(pk=self.admin.pk).update(role="OWNER")
+        self.assertEqual(self.client.get("/clinic-admin/").status_code, 302)
+
+class CalendarChangesTests(TestCase):
+    """Odświeżanie kalendarza: zmienione komórki, a po usunięciu/przeniesieniu — cały tydzień."""
+
+    def setUp(self):
+        cache.clear()
+        self.clinic, owner = _clinic(vets=2)
+        self.vet, self.other_vet = Vet.objects.filter(clinic=self.clinic).order_by("id")
+        self.day = _tomorrow()
+        self.appt = Appointment.objects.create(
+            clinic=self.clinic, vet=self.vet, owner=owner, pet=Pet.objects.create(owner=owner, name="Rex", species="dog"),
+            starts_at=_at(self.day, 10), ends_at=_at(self.day, 10, 30),
+        )
+        _login(self.client, User.objects.create(email="admin@example.invalid"), role="CLINIC_ADMIN")
+        page = self.client.get("/clinic-admin/calendar/", {"date": self.day.isoformat()}).content.decode()
+        self.since = re.search(r"since=(\d+)", page)[1]
+
+    def _changes(self, change):
+        appt = Appointment.objects.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            change(appt)
+        response = self.client.get("/clinic-admin/calendar/changes", {"date": self.day.isoformat(), "since": self.since})
+        return set(re.findall(r'id="cell-(\d+)-(\d+)"', response.content.decode()))
+
+    def _cell(self, vet, day=None):
+        return str(vet.id), (day or self.day).strftime("%Y%m%d")
+
+    def test_unchanged(self):
+        response = self.client.get("/clinic-admin/calendar/changes", {"date": self.day.isoformat(), "since": self.since})
+        self.assertEqual(response.status_code, 204)
+
+    def test_edited_in_place(self):
+        def confirm(appt):
+            appt.status = "CONFIRMED"
+            appt.save()
+        self.assertEqual(self._changes(confirm), {self._cell(self.vet)})
+
+    def test_moved_to_other_vet(self):
+        def move(appt):
+            appt.vet = self.other_vet
+            appt.save()
+        cells = self._changes(move)
+        self.assertIn(self._cell(self.vet), cells)          # zwolniona komórka
+        self.assertIn(self._cell(self.other_vet), cells)
+
+    def test_deleted(self):
+        self.assertIn(self._cell(self.vet), self._changes(lambda appt: appt.delete()))
+
+class DomainUserSessionTests(TestCase):
+    """Kopia profilu w sesji tylko przy wspólnym cache — locmem ma wersje per proces."""
+
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create(email="owner@example.invalid")
+        _login(self.client, self.owner)
+
+    def test_process_local_cache_skips_session(self):
+        self.client.get("/appointments/")
+        self.assertNotIn(SESSION_KEY, self.client.session)
+
+    def test_shared_cache_uses_session(self):
+        with mock.patch.object(slot_cache, "process_local", return_value=False):
+            self.client.get("/appointments/")
+            self.assertEqual(self.client.session[SESSION_KEY][2], "OWNER")
+            request = self._request()
+            request.session.get(SESSION_KEY)      # sesję czyta SessionMiddleware, nie profil
+            with self.assertNumQueries(0):
+                get_domain_user(request)
+            User.objects.filter(pk=self.owner.pk).update(role="VET")
+            with self.captureOnCommitCallbacks(execute=True):
+                self.owner.refresh_from_db()
+                self.owner.save()                   # sygnał podbija wersję profilu
+            self.assertEqual(get_domain_user(self._request()).role, "VET")
+
+    def _request(self):
+        request = RequestFactory().get("/")
+        request.user, request.session = self.owner.auth_user, self.client.session
+        return request
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Rezerwacje równoległe
+# ───────────────────────────────────────────────────────────────────────────────
+
+def book_concurrently(clinic, owner, pet, starts, threads):
+    """
+    `threads` wątków rezerwuje naraz (bariera) terminy ze `starts` po kolei
+    → lista wyników: "ok", "taken" albo nazwa wyjątku.
+    """
+    barrier = threading.Barrier(threads)
+    outcomes, lock = [], threading.Lock()
+
+    def worker(start):
+        try:
+            barrier.wait()
+            booking.book(clinic, owner, pet.id, start, start + timedelta(minutes=30))
+            outcome = "ok"
+        except booking.SlotTaken:
+            outcome = "taken"
+        except Exception as exc:  # noqa: BLE001 — każdy inny błąd to wynik testu
+            outcome = type(exc).__name__
+        finally:
+            connection.close()
+        with lock:
+            outcomes.append(outcome)
+
+    pool = [threading.Thread(target=worker, args=(starts[i % len(starts)],)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return outcomes
+
+class BookingConcurrencyTests(TransactionTestCase):
+    """Równoległe rezerwacje: bez podwójnych wizyt i bez odrzuceń mimo wolnych wetów."""
+
+    def setUp(self):
+        cache.clear()
+        self.clinic, self.owner = _clinic(vets=4)
+        self.pet = Pet.objects.create(owner=self.owner, name="Rex", species="dog")
+        self.day = _tomorrow()
+
+    def assertNoDoubleBooking(self):
+        doubled = (Appointment.objects.filter(clinic=self.clinic).exclude(status="CANCELLED")
+                   .values("vet_id", "starts_at").annotate(n=Count("id")).filter(n__gt=1))
+        self.assertFalse(doubled.exists())
+
+    def test_one_slot(self):
+        outcomes = book_concurrently(self.clinic, self.owner, self.pet, [_at(self.day, 10)], threads=12)
+        self.assertEqual(outcomes.count("ok"), 4)       # po jednej wizycie na weta
+        self.assertEqual(outcomes.count("taken"), 8)
+        self.assertNoDoubleBooking()
+
+    def test_many_slots(self):
+        starts = [_at(self.day, 9) + timedelta(minutes=30 * i) for i in range(8)]
+        outcomes = book_concurrently(self.clinic, self.owner, self.pet, starts, threads=32)  # 8 × 4 wetów
+        self.assertEqual(outcomes, ["ok"] * 32)
+        self.assertNoDoubleBooking()
+
+class BookingRetryTests(TestCase):
+    def setUp(self):
+        self.clinic, self.owner = _clinic(vets=1)
+        self.pet = Pet.objects.create(owner=self.owner, name="Rex", species="dog")
+        self.start = _at(_tomorrow(), 10)
+
+    def _book_failing(self, message):
+        with mock.patch.object(booking, "_book_once", side_effect=OperationalError(message)) as once, \
+                mock.patch.object(booking, "RETRY_DELAY", 0):
+            try:
+                booking.book(self.clinic, self.owner, self.pet.id, self.start, self.start + timedelta(minutes=30))
+            finally:
+                self.calls = once.call_count
+
+    def test_lock_errors_retried(self):
+        with self.assertRaises(booking.SlotTaken):
+            self._book_failing("database is locked")
+        self.assertEqual(self.calls, booking.ATTEMPTS)
+
+    def test_other_errors_propagate(self):
+        with self.assertRaises(OperationalError):
+            self._book_failing("server closed the connection unexpectedly")
+        self.assertEqual(self.calls, 1)
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Eksport CSV i feedy ICS
+# ───────────────────────────────────────────────────────────────────────────────
+
+class ExportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.clinic, owner = _clinic(vets=1)
+        self.vet = Vet.objects.get()
+        day = _tomorrow()
+        pet = Pet.objects.create(owner=owner, name='=HYPERLINK("http://x.invalid","Rex")', species="dog")
+        self.appts = [Appointment.objects.create(clinic=self.clinic, vet=self.vet, owner=owner, pet=pet,
+                                                 starts_at=_at(day, 9 + i), ends_at=_at(day, 9 + i, 30))
+                      for i in range(3)]
+        _login(self.client, User.objects.create(email="admin@example.invalid"), role="CLINIC_ADMIN")
+
+    def _body(self, response):
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode("utf-8")
+
+    def test_csv(self):
+        rows = list(csv.reader(io.StringIO(self._body(self.client.get("/clinic-admin/export/appointments.csv")))))
+        self.assertEqual(rows[0][0], "\ufeffid")
+        self.assertEqual([int(r[0]) for r in rows[1:]], [a.id for a in self.appts])
+        self.assertTrue(all(r[6].startswith("'=HYPERLINK") for r in rows[1:]))   # bez formuł w arkuszu
+
+    def test_csv_not_modified(self):
+        url = "/clinic-admin/export/appointments.csv"
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, headers={"If-None-Match": etag}).status_code, 304)
+        self.assertEqual(self.client.get(url, {"vet": self.vet.id}, headers={"If-None-Match": etag}).status_code, 200)
+
+    def test_csv_bad_range(self):
+        response = self.client.get("/clinic-admin/export/appointments.csv", {"from": "2026-02-30"})
+        self.assertEqual(response.status_code, 400)
+
+    def _feed_url(self, vet_id=None):
+        return f"/feeds/{exports.feed_token(self.clinic, vet_id)}.ics"
+
+    def test_ics(self):
+        body = self._body(self.client.get(self._feed_url(self.vet.id)))
+        self.assertTrue(body.startswith("BEGIN:VCALENDAR\r\n") and body.endswith("END:VCALENDAR\r\n"))
+        self.assertEqual(body.count("BEGIN:VEVENT"), 3)
+        self.assertIn(f"UID:appt-{self.appts[0].id}@", body)
+        self.assertTrue(all(len(line.encode()) <= 75 for line in body.split("\r\n")))
+
+    def test_ics_not_modified(self):
+        self.client.logout()
+        url = self._feed_url()
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, headers={"If-None-Match": etag}).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.appts[0].delete()
+        self.assertEqual(self.client.get(url, headers={"If-None-Match": etag}).status_code, 200)
+
+    def test_bad_token(self):
+        self.assertEqual(self.client.get("/feeds/nie-token.ics").status_code, 404)
+        other, _ = _clinic(name="Inna")
+        self.assertEqual(self.client.get(self._feed_url(Vet.objects.get(clinic=other).id)).status_code, 404)
+
+    def test_rotated_token(self):
+        url = self._feed_url()
+        etag = self.client.get(url)["ETag"]
+        self.client.post("/clinic-admin/feeds/rotate")
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(url, headers={"If-None-Match": etag}).status_code, 404)
+        self.clinic.refresh_from_db()
+        self.assertEqual(self.client.get(self._feed_url()).status_code, 200)
+
+# ───────────────────────────────────────────────────────────────────────────────
+# API slotów
+# ───────────────────────────────────────────────────────────────────────────────
+
+class ApiSlotsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.clinic, _ = _clinic()
+
+    def _starts(self, day):
+        response = self.client.get(f"/api/v1/clinics/{self.clinic.id}/slots", {"date": day.isoformat()})
+        return response.json()["days"][0]["starts"]
+
+    def test_ordinary_day(self):
+        starts = self._starts(ddate(2026, 10, 19))
+        self.assertEqual(starts[:2], [540, 570])    # 9:00, 9:30
+
+    def test_dst_days_elapsed_minutes(self):
+        # 25.10.2026: 3:00 → 2:00 (doba ma 25 h); 29.03.2026: 2:00 → 3:00 (23 h)
+        for day, nine in ((ddate(2026, 10, 25), 600), (ddate(2026, 3, 29), 480)):
+            starts = self._starts(day)
+            self.assertEqual(starts[0], nine)
+            start = _at(day, 0).astimezone(dt_timezone.utc) + timedelta(minutes=starts[0])
+            self.assertEqual(timezone.localtime(start).hour, 9)
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Grafik tygodniowy
+# ───────────────────────────────────────────────────────────────────────────────
+
+class ScheduleTests(TestCase):
+    """Grafik tygodniowy: walidacja parse, zapis różnicy w apply, jedno powiadomienie."""
+
+    def setUp(self):
+        cache.clear()
+        self.clinic, self.owner = _clinic(vets=2)
+        self.vets = list(Vet.objects.order_by("id").values_list("id", flat=True))
+
+    def _errors(self, data):
+        with self.assertRaises(schedule.ScheduleError) as ctx:
+            schedule.parse(self.clinic, data)
+        return ctx.exception.args[0]
+
+    def _apply(self, data):
+        with mock.patch("core.signals._notify") as notify, self.captureOnCommitCallbacks(execute=True):
+            result = schedule.apply(self.clinic, *schedule.parse(self.clinic, data))
+        return result, [c.args for c in notify.call_args_list]
+
+    def test_parse(self):
+        clinic_rows, vet_rows = schedule.parse(self.clinic, {
+            "clinic": {"0": [["13:00", "17:00"], ["09:00", "13:00"]]},      # styk dozwolony
+            "vets": {str(self.vets[0]): {"6": [["10:00", "12:00"]]}},
+        })
+        self.assertEqual(clinic_rows, {(0, dtime(9), dtime(13)), (0, dtime(13), dtime(17))})
+        self.assertEqual(vet_rows, {self.vets[0]: {(6, dtime(10), dtime(12))}})
+        self.assertEqual(schedule.parse(self.clinic, {"vets": {}}), (None, {}))
+
+    def test_parse_errors(self):
+        cases = [
+            ({"clinic": {"1": [["09:00", "13:00"], ["12:30", "17:00"]]}}, ["nachodzą na siebie"]),
+            ({"clinic": {"7": []}}, ["nieznany dzień"]),
+            ({"clinic": {"0": [["17:00", "09:00"]]}}, ["błędne okno"]),
+            ({"vets": {"999": {}}}, ["nie należy do kliniki"]),
+            ({"clinic": {"0": [["9", "x"]], "1": [["08:00", "10:00"], ["09:00", "11:00"]]},
+              "vets": {"abc": {}}}, ["błędne okno", "nachodzą na siebie", "nie należy"]),   # wszystkie naraz
+            ([], ["oczekiwano obiektu"]),
+        ]
+        for data, expected in cases:
+            with self.subTest(data=data):
+                errors = self._errors(data)
+                self.assertEqual(len(errors), len(expected))
+                for error, fragment in zip(errors, expected):
+                    self.assertIn(fragment, error)
+
+    def test_apply_diff(self):
+        kept = ClinicHours.objects.get(weekday=0).id
+        result, notified = self._apply({
+            "clinic": {"0": [["09:00", "17:00"]], "1": [["08:00", "12:00"], ["12:00", "16:00"]]},
+            "vets": {str(self.vets[0]): {"2": [["10:00", "14:00"]]}},
+        })
+        self.assertEqual(result, {"created": 3, "deleted": 6})
+        self.assertEqual(ClinicHours.objects.get(weekday=0).id, kept)               # bez zmian — ten sam wiersz
+        self.assertEqual(ClinicHours.objects.count(), 3)
+        self.assertEqual(list(VetHours.objects.values_list("vet_id", "weekday")), [(self.vets[0], 2)])
+        self.assertEqual(notified, [(self.clinic.id,)])                             # jedno na klinikę
+
+        result, notified = self._apply(schedule.export(self.clinic))
+        self.assertEqual(result, {"created": 0, "deleted": 0})
+        self.assertEqual(notified, [])
+
+    def test_apply_queries_constant(self):
+        def week(days):
+            return {"clinic": {str(wd): [["10:00", "16:00"]] for wd in range(days)}}
+        counts = []
+        for days in (1, 7):
+            ClinicHours.objects.filter(clinic=self.clinic).delete()
+            ClinicHours.objects.bulk_create(ClinicHours(clinic=self.clinic, weekday=wd, start=dtime(9), end=dtime(17))
+                                            for wd in range(7))
+            rows = schedule.parse(self.clinic, week(days))
+            with CaptureQueriesContext(connection) as ctx:
+                schedule.apply(self.clinic, *rows)
+            counts.append(len(ctx))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_view(self):
+        _login(self.client, self.owner, role="CLINIC_ADMIN")
+        url = "/clinic-admin/schedule"
+        bad = self.client.post(url, {"clinic": {"0": [["09:00", "12:00"], ["11:00", "13:00"]]}},
+                               content_type="application/json")
+        self.assertEqual(bad.status_code, 400)
+        self.assertEqual(len(bad.json()["errors"]), 1)
+        ok = self.client.post(url, {"clinic": {"0": [["10:00", "14:00"]]}}, content_type="application/json")
+        self.assertEqual(ok.json(), {"ok": True, "created": 1, "deleted": 7})
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Wyjątki zakresowe i cykliczne
+# ───────────────────────────────────────────────────────────────────────────────
+
+class ExceptionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.clinic, self.owner = _clinic(vets=1)
+        self.vet = Vet.objects.get()
+        self.pet = Pet.objects.create(owner=self.owner, name="Rex", species="dog")
+        later = _tomorrow() + timedelta(days=7)
+        self.monday = later - timedelta(days=later.weekday())
+        self.week = availability.days_between(self.monday, self.monday + timedelta(days=6))
+
+    def _exception(self, first, last=None, **kwargs):
+        ex = AvailabilityException(entity_type="CLINIC", entity_id=self.clinic.id, date=first, date_to=last, **kwargs)
+        with self.captureOnCommitCallbacks(execute=True):
+            schedule.add_exception(ex)
+        return ex
+
+    def _appointment(self, day, hour):
+        return Appointment.objects.create(clinic=self.clinic, vet=self.vet, owner=self.owner, pet=self.pet,
+                                          starts_at=_at(day, hour), ends_at=_at(day, hour, 30))
+
+    def _open(self, day):
+        slots = availability.day_slots(self.clinic, day)
+        return (timezone.localtime(slots[0][0]).hour, timezone.localtime(slots[-1][1]).hour) if slots else None
+
+    def test_expansion(self):
+        ex = AvailabilityException(date=self.monday, date_to=self.monday + timedelta(days=20), weekday=2)
+        self.assertEqual(list(availability.exception_days(ex, self.monday, self.monday + timedelta(days=30))),
+                         [self.monday + timedelta(days=d) for d in (2, 9, 16)])
+        ex = AvailabilityException(date=self.monday, date_to=self.monday + timedelta(days=3))
+        self.assertEqual(len(list(availability.exception_days(ex, self.monday + timedelta(days=2), self.week[-1]))), 2)
+
+    def test_weekday_closure(self):
+        self._exception(self.monday, self.monday + timedelta(days=13), weekday=0, closed=True)
+        self.assertEqual([self._open(d) for d in self.week], [None] + [(9, 17)] * 6)
+
+    def test_narrower_open_beats_closure(self):
+        wednesday = self.week[2]
+        self._exception(wednesday, start=dtime(10), end=dtime(14))
+        self._exception(self.week[0], self.week[-1], closed=True)       # nowsza, ale szersza
+        self.assertEqual([self._open(d) for d in self.week], [None, None, (10, 14), None, None, None, None])
+
+    def test_same_span_closure_wins(self):
+        self._exception(self.week[0], closed=True)
+        self._exception(self.week[0], start=dtime(10), end=dtime(14))
+        self.assertIsNone(self._open(self.week[0]))
+
+    def test_same_span_newer_wins(self):
+        self._exception(self.week[0], start=dtime(10), end=dtime(12))
+        self._exception(self.week[0], start=dtime(13), end=dtime(15))
+        self.assertEqual(self._open(self.week[0]), (13, 15))
+
+    def test_mark_followup(self):
+        monday, in_window, outside = (self._appointment(self.week[0], 10), self._appointment(self.week[2], 11),
+                                      self._appointment(self.week[2], 15))
+        self._exception(self.week[2], start=dtime(10), end=dtime(14))
+        self.assertEqual(Appointment.objects.filter(needs_followup=True).get(), outside)
+        ex = AvailabilityException(entity_type="CLINIC", entity_id=self.clinic.id, date=self.week[0],
+                                   date_to=self.week[-1], closed=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(schedule.add_exception(ex), 1)          # poniedziałek; środa ma węższy wyjątek
+        flagged = set(Appointment.objects.filter(needs_followup=True))
+        self.assertEqual(flagged, {monday, outside})
+        self.assertNotIn(in_window, flagged)
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Pomiary (Server-Timing)
+# ───────────────────────────────────────────────────────────────────────────────
+
+class ServerTimingTests(TestCase):
+    def setUp(self):
+        self.clinic, _ = _clinic()
+        self.url = f"/clinics/{self.clinic.id}/slots"
+
+    def test_off_by_default(self):
+        self.assertNotIn("Server-Timing", self.client.get(self.url))
+
+    @override_settings(PERF_SERVER_TIMING=True)
+    def test_only_for_staff(self):
+        self.assertNotIn("Server-Timing", self.client.get(self.url))
+        staff = DjangoUser.objects.create_user("staff", is_staff=True)
+        self.client.force_login(staff)
+        self.assertIn("db;dur=", self.client.get(self.url)["Server-Timing"])
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Replika (dwa pliki SQLite)
+# ───────────────────────────────────────────────────────────────────────────────
+
+@override_settings(DATABASE_ROUTERS=["core.routers.ReplicaRouter"])
+class ReplicaRoutingTests(TransactionTestCase):
+    """Primary z testów + replika w pliku SQLite kopiowana replicate_sqlite (core.routers)."""
+
+    @classmethod
+    def setUpClass(cls):
+        # Alias dopiero tutaj — runner czyta ``databases`` już przy zbieraniu testów.
+        fd, cls.replica_file = tempfile.mkstemp(suffix=".sqlite3")
+        os.close(fd)
+        connections.settings[routers.REPLICA] = connections.configure_settings({
+            "default": connections.settings["default"],
+            routers.REPLICA: {"ENGINE": "django.db.backends.sqlite3", "NAME": cls.replica_file},
+        })[routers.REPLICA]
+        cls.databases = {"default", routers.REPLICA}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[routers.REPLICA].close()
+        del connections[routers.REPLICA]
+        del connections.settings[routers.REPLICA]
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(cls.replica_file + suffix):
+                os.remove(cls.replica_file + suffix)
+
+    def setUp(self):
+        cache.clear()
+        patch = mock.patch.object(routers, "enabled", return_value=True)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.old, _ = _clinic(name="Stara")
+        call_command("replicate_sqlite", self.replica_file, stdout=io.StringIO())
+        self.new, _ = _clinic(name="Nowa")           # replika „nie nadąża”
+
+    def _names(self):
+        return set(Clinic.objects.values_list("name", flat=True))
+
+    def test_reads(self):
+        self.assertEqual(self._names(), {"Stara", "Nowa"})
+        with routers.replica_reads():
+            self.assertEqual(self._names(), {"Stara"})
+            with routers.primary_reads():
+                self.assertEqual(self._names(), {"Stara", "Nowa"})
+            with transaction.atomic():              # odczyt przed zapisem w transakcji
+                self.assertEqual(self._names(), {"Stara", "Nowa"})
+
+    def test_writes_go_to_primary(self):
+        with routers.replica_reads():
+            Clinic.objects.create(name="Trzecia")
+            self.assertNotIn("Trzecia", self._names())
+        self.assertIn("Trzecia", self._names())
+
+    def test_pin_cookie_reads_own_writes(self):
+        self.assertNotContains(self.client.get("/clinics/"), "Nowa")
+        response = self.client.post("/login/", {"username": "x", "password": "y"})
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertContains(self.client.get("/clinics/"), "Nowa")
+        self.client.cookies.pop(PIN_COOKIE)
+        self.assertNotContains(self.client.get("/clinics/"), "Nowa")
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Metryki
+# ───────────────────────────────────────────────────────────────────────────────
+
+class MetricsTests(TestCase):
+    """/api/metrics: zamknięte bez tokenu, format ekspozycji, suma plików procesów."""
+
+    REQUESTS = (("route", "clinics"), ("method", "GET"), ("status", "2xx"))
+
+    def setUp(self):
+        registry = mock.patch.object(metrics, "_registry", metrics._Registry())
+        registry.start()
+        self.addCleanup(registry.stop)
+        slot_cache.reset_stats()
+        self.addCleanup(slot_cache.reset_stats)
+
+    def _scrape(self, **headers):
+        return self.client.get("/api/metrics", headers=headers)
+
+    def test_denied_without_token(self):
+        self.assertIsNone(settings.METRICS_TOKEN)
+        self.assertEqual(self._scrape().status_code, 401)
+        with override_settings(METRICS_TOKEN="sekret"):
+            self.assertEqual(self._scrape().status_code, 401)
+            self.assertEqual(self._scrape(Authorization="Bearer inny").status_code, 401)
+            self.assertEqual(self._scrape(Authorization="Bearer sekret").status_code, 200)
+
+    def test_exposition_format(self):
+        metrics._registry.inc("http_requests_total", self.REQUESTS)
+        for seconds in (0.003, 0.2, 20):
+            metrics._registry.observe("http_request_duration_seconds", seconds, (("route", 'a"b'),))
+        text = metrics.render()
+        self.assertIn("# HELP petnav_http_requests_total ", text)
+        self.assertIn("# TYPE petnav_http_requests_total counter", text)
+        self.assertIn("# TYPE petnav_http_request_duration_seconds histogram", text)
+        self.assertIn('petnav_http_requests_total{route="clinics",method="GET",status="2xx"} 1.0', text)
+        self.assertIn('petnav_http_request_duration_seconds_bucket{route="a\\"b",le="0.005"} 1', text)   # escaping
+        self.assertIn('petnav_http_request_duration_seconds_bucket{route="a\\"b",le="0.25"} 2', text)    # skumulowane
+        self.assertIn('petnav_http_request_duration_seconds_bucket{route="a\\"b",le="+Inf"} 3', text)
+        self.assertIn('petnav_http_request_duration_seconds_count{route="a\\"b"} 3', text)
+        self.assertIn("petnav_slot_cache_hits_total 0", text)
+        for line in text.splitlines():
+            self.assertRegex(line, r'^(# (HELP|TYPE) petnav_\w+ .+|petnav_\w+(\{.*\})? [\d.e+-]+)$')
+
+    def test_aggregates_process_files(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            other = {"counters": [["http_requests_total", [list(kv) for kv in self.REQUESTS], 4.0]],
+                     "histograms": [["slots_compute_duration_seconds", [],
+                                     [0] * 4 + [1] * 7 + [0.07, 1]]]}
+            with open(os.path.join(directory, "99999.json"), "w") as fh:      # zakończony worker
+                json.dump(other, fh)
+            with open(os.path.join(directory, "88888.json"), "w") as fh:      # w trakcie podmiany
+                fh.write("{")
+            open(os.path.join(directory, "77777.json.tmp"), "w").close()
+            metrics._registry.inc("http_requests_total", self.REQUESTS, 2)
+            with override_settings(METRICS_TOKEN="sekret"):
+                response = self._scrape(Authorization="Bearer sekret")
+            self.assertTrue(os.path.exists(os.path.join(directory, f"{os.getpid()}.json")))
+        self.assertEqual(response["Content-Type"], views.METRICS_CONTENT_TYPE)
+        text = response.content.decode()
+        self.assertIn('petnav_http_requests_total{route="clinics",method="GET",status="2xx"} 6.0', text)
+        self.assertIn("petnav_slots_compute_duration_seconds_count 1", text)
+        self.assertIn('petnav_slots_compute_duration_seconds_bucket{le="0.1"} 1', text)
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Widoki async (ASGI)
+# ───────────────────────────────────────────────────────────────────────────────
+
+def _async_urlconf():
+    """Ścieżki projektu z gorącymi widokami async na początku — jak core.urls przy ASYNC_VIEWS=1."""
+    from core import urls
+    from petnav import urls as project_urls
+    module = types.ModuleType("async_test_urls")
+    module.urlpatterns = urls.hot_paths(True) + project_urls.urlpatterns
+    return module
+
+VOLATILE = re.compile(r'name="csrfmiddlewaretoken" value="[^"]+"|"ms": [\d.]+')   # token CSRF, czas pinga bazy
+
+class AsyncViewsTests(TestCase):
+    """Każdy widok z core.async_views odpowiada jak jego wersja sync (views)."""
+
+    def setUp(self):
+        cache.clear()
+        self.clinics = [_clinic(vets=2, name=f"K{i}")[0] for i in range(3)]
+        day = _tomorrow()
+        first = self.clinics[0].id
+        self.paths = [
+            "/", "/clinics/",
+            f"/clinics/{first}/slots?date={day}",
+            f"/clinics/{first}/slots?from={day}&to={day + timedelta(days=6)}",
+            f"/clinics/{first}/slots?from={day}&to={day + timedelta(days=40)}",       # 400
+            "/clinics/999/slots",                                                   # 404
+            "/clinics/slots?ids=" + ",".join(str(c.id) for c in reversed(self.clinics)) + f"&date={day}",
+            "/clinics/slots?ids=",                                                  # 400
+            "/api/health/", "/api/ready/",
+        ]
+
+    def _body(self, response):
+        return VOLATILE.sub("", response.content.decode())
+
+    async def _both(self, path, **headers):
+        sync = await sync_to_async(self.client.get)(path, headers=headers)
+        with override_settings(ROOT_URLCONF=_async_urlconf(), ASYNC_VIEWS=True):
+            self.assertTrue(asyncio.iscoroutinefunction(resolve(path.split("?")[0]).func))
+            response = await self.async_client.get(path, headers=headers)
+        return sync, response
+
+    async def test_same_responses(self):
+        for path in self.paths:
+            with self.subTest(path=path):
+                sync, response = await self._both(path)
+                self.assertEqual(response.status_code, sync.status_code)
+                self.assertEqual(self._body(response), self._body(sync))
+                self.assertEqual(response.get("ETag"), sync.get("ETag"))
+
+    async def test_not_modified(self):
+        for path in self.paths[:4]:
+            with self.subTest(path=path):
+                sync, _ = await self._both(path)
+                _, response = await self._both(path, **{"If-None-Match": sync["ETag"]})
+                self.assertEqual(response.status_code, 304)
+
+    @override_settings(METRICS_TOKEN="sekret")
+    async def test_metrics(self):
+        for headers, status in (({}, 401), ({"Authorization": "Bearer sekret"}, 200)):
+            with self.subTest(headers=headers):
+                sync, response = await self._both("/api/metrics", **headers)
+                self.assertEqual((response.status_code, sync.status_code), (status, status))
+                self.assertEqual(response.get("Content-Type"), sync.get("Content-Type"))
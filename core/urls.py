@@ -1,10 +1,22 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
 
-urlpatterns = [
-    path("", views.home, name="home"),  # /
-    path("clinics/", views.clinics, name="clinics"),
-    path("clinics/<int:clinic_id>/slots", views.clinic_slots, name="clinic_slots"),
+def hot_paths(use_async: bool) -> list:
+    """Gorące widoki — wersje async (core.async_views) pod ASGI z ASYNC_VIEWS=1."""
+    v = async_views if use_async else views
+    return [
+        path("", v.home, name="home"),  # /
+        path("clinics/", v.clinics, name="clinics"),
+        path("clinics/slots", v.clinics_slots_batch, name="clinics_slots_batch"),
+        path("clinics/<int:clinic_id>/slots", v.clinic_slots, name="clinic_slots"),
+        path("api/health/", v.health, name="health"),
+        path("api/ready/", v.ready, name="ready"),
+        path("api/metrics", v.metrics_view, name="metrics"),
+    ]
+
+urlpatterns = hot_paths(settings.ASYNC_VIEWS) + [
+    path("clinics/earliest", views.earliest_slots, name="earliest_slots"),
     path("clinics/<int:clinic_id>/book/preview", views.book_preview, name="book_preview"),
     path("clinics/<int:clinic_id>/book/confirm", views.book_confirm, name="book_confirm"),
     path("appointments/", views.my_appointments, name="my_appointments"),
@@ -12,6 +24,7 @@ urlpatterns = [
     path("pets/create", views.pets_create, name="pets_create"),
     path("pets/<int:pet_id>/delete", views.pets_delete, name="pets_delete"),
     path("pets/<int:pet_id>/edit", views.pets_edit, name="pets_edit"),
+    path("appointments/<int:appt_id>/cancel", views.cancel_appointment, name="cancel_appointment"),
     path("appointments/<int:appt_id>/undo", views.undo_cancel, name="undo_cancel"),
     path("clinic-admin/", views.clinic_dashboard, name="clinic_dashboard"),
     path("clinic-admin/vets/", views.vets_list, name="vets_list"),
@@ -19,8 +32,15 @@ urlpatterns = [
     path("clinic-admin/vets/<int:vet_id>/delete", views.vet_delete, name="vet_delete"),
     path("clinic-admin/hours/", views.hours_list, name="hours_list"),
     path("clinic-admin/hours/set", views.hours_set, name="hours_set"),
+    path("clinic-admin/schedule", views.schedule_save, name="schedule_save"),
     path("clinic-admin/exceptions/", views.exceptions_list, name="exceptions_list"),
     path("clinic-admin/exceptions/toggle", views.exception_toggle, name="exception_toggle"),
+    path("clinic-admin/exceptions/add", views.exception_add, name="exception_add"),
+    path("clinic-admin/exceptions/<int:exception_id>/delete", views.exception_delete, name="exception_delete"),
     path("clinic-admin/calendar/", views.clinic_calendar, name="clinic_calendar"),
-    path("api/health/", views.health, name="health"),
+    path("clinic-admin/calendar/changes", views.clinic_calendar_changes, name="clinic_calendar_changes"),
+    path("clinic-admin/export/appointments.csv", views.clinic_export_csv, name="clinic_export_csv"),
+    path("clinic-admin/feeds/rotate", views.feeds_rotate, name="feeds_rotate"),
+    path("feeds/<str:token>.ics", views.calendar_feed, name="calendar_feed"),
+    path("api/v1/clinics/<int:clinic_id>/slots", views.api_clinic_slots, name="api_clinic_slots"),
 ]
@@ -1,19 +1,35 @@
 # core/views.py
-from datetime import datetime, time as dtime, timedelta, date as ddate
+import hmac
+import json
+import time
+from functools import wraps
+from datetime import datetime, time as dtime, timedelta, date as ddate, timezone as dt_timezone
+from asgiref.sync import iscoroutinefunction, sync_to_async
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
-from django.contrib.auth.decorators import login_required, user_passes_test
+from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
 from django.contrib.auth.models import User as DjangoUser
-from django.http import JsonResponse, HttpResponse
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, connections
+from django.db.models import Count, Q
+from django.http import Http404, JsonResponse, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
 from django.utils import timezone
+from django.utils.cache import patch_cache_control
 from django.utils.timezone import make_aware
-from django.utils.dateparse import parse_datetime
-from django.views.decorators.http import require_http_methods, require_GET
+from django.utils.dateparse import parse_datetime, parse_time
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition, require_http_methods, require_GET
 
+from . import availability, booking, day_stats, exports, metrics, schedule, slot_cache
+from .middleware import get_domain_user
+from .routers import primary_reads, replica_safe, use_replica
 from .models import (
     Appointment, Clinic, Pet, User as DomainUser, Vet,
-    ClinicHours, VetHours, AvailabilityException
+    ClinicHours, VetHours, AvailabilityException, new_feed_key,
 )
 
 # ───────────────────────────────────────────────────────────────────────────────
@@ -24,27 +40,130 @@ from .models import (
 def health(_request):
     return JsonResponse({"ok": True})
 
+def db_status() -> tuple:
+    """(wszystko ok, {alias: {ok, ms | error}}) — SELECT 1 na każdym połączeniu."""
+    result, ok = {}, True
+    for conn in connections.all():
+        t0 = time.perf_counter()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+            result[conn.alias] = {"ok": True, "ms": round((time.perf_counter() - t0) * 1000, 2)}
+        except DatabaseError as exc:
+            ok = False
+            result[conn.alias] = {"ok": False, "error": str(exc)[:200]}
+    return ok, result
+
+def ready_response(ok: bool, result: dict):
+    return JsonResponse({"ok": ok, "db": result}, status=200 if ok else 503)
+
+@require_GET
+def ready(_request):
+    """Gotowość dla load balancera: czas prostego zapytania do każdej bazy; 503 przy błędzie."""
+    return ready_response(*db_status())
+
+def metrics_allowed(request) -> bool:
+    """Bearer METRICS_TOKEN; bez ustawionego tokenu endpoint jest zamknięty."""
+    token = settings.METRICS_TOKEN
+    given = request.headers.get("Authorization", "")
+    return bool(token) and hmac.compare_digest(given.encode(), f"Bearer {token}".encode())
+
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+@require_GET
+def metrics_view(request):
+    """Metryki w formacie Prometheusa (core.metrics); wymaga Bearer METRICS_TOKEN."""
+    if not metrics_allowed(request):
+        return HttpResponse(status=401)
+    return HttpResponse(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
 # ───────────────────────────────────────────────────────────────────────────────
 # Helpers
 # ───────────────────────────────────────────────────────────────────────────────
 
 def _owner_for_request(request):
-    if not request.user.is_authenticated:
-        return None
-    # znajdź lub utwórz DomainUser powiązany z Django userem
-    du, _ = DomainUser.objects.get_or_create(auth_user=request.user, defaults={
-        "email": request.user.username, "role": "OWNER"
-    })
-    return du
+    # DomainUser powiązany z Django userem — rozwiązywany raz na żądanie,
+    # id/rola z sesji (core.middleware.DomainUserMiddleware)
+    return get_domain_user(request)
+
+def revalidated(etag, last_modified=None, private=False):
+    """
+    Warunkowy GET (ETag/Last-Modified, 304) na wersjach z core.slot_cache:
+    przy zgodnym walidatorze widok w ogóle się nie wykonuje. no-cache —
+    przeglądarka (także żądania HTMX) pyta o ważność przy każdym użyciu.
+    """
+    cache_control = {"no_cache": True, **({"private": True} if private else {})}
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            return _arevalidated(view, etag, last_modified, cache_control)
+        conditional = condition(etag_func=etag, last_modified_func=last_modified)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional(request, *args, **kwargs)
+            patch_cache_control(response, **cache_control)
+            return response
+        return wrapper
+    return decorator
+
+def _arevalidated(view, etag, last_modified, cache_control):
+    # walidatory czytają cache (i usera) synchronicznie — liczymy je w wątku,
+    # a condition dostaje gotowe wartości
+    def validators(request, *args, **kwargs):
+        return (etag(request, *args, **kwargs),
+                last_modified(request, *args, **kwargs) if last_modified else None)
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        request.user = await request.auser()  # bez leniwego zapytania w pętli zdarzeń
+        tag, modified = await sync_to_async(validators)(request, *args, **kwargs)
+        conditional = condition(etag_func=lambda *a, **k: tag, last_modified_func=lambda *a, **k: modified)(view)
+        response = await conditional(request, *args, **kwargs)
+        patch_cache_control(response, **cache_control)
+        return response
+    return wrapper
+
+def _etag(*parts) -> str:
+    # RELEASE: nowe szablony po wdrożeniu → nowe ETagi
+    return ":".join(str(p) for p in (settings.RELEASE, *parts))
+
+def _slots_etag(kind: str):
+    """
+    Walidator slotów w reprezentacji `kind` (html/json): zależą od wersji
+    kliniki i parametrów z URL (data domyślnie dzisiejsza). Różne `kind`
+    — bo ten sam ETag pod innym adresem nie może znaczyć innej treści.
+    """
+    def etag(request, clinic_id: int):
+        return _etag("slots", kind, clinic_id, slot_cache.clinic_version(clinic_id), timezone.localdate(),
+                     request.GET.urlencode())
+    return etag
+
+_slots_html_etag = _slots_etag("html")
+_slots_json_etag = _slots_etag("json")
+
+def _clinic_modified(request, clinic_id: int):
+    return slot_cache.version_time(slot_cache.clinic_version(clinic_id))
+
+def _clinics_etag(page: str):
+    """Walidator strony `page` z listą klinik (nawigacja zależy od zalogowania)."""
+    def etag(request):
+        return _etag(page, slot_cache.clinics_version(), timezone.localdate(), request.user.pk or 0)
+    return etag
 
-def _overlaps(a_start, a_end, b_start, b_end):
-    """Czy przedziały [a_start, a_end) i [b_start, b_end) się nakładają?"""
-    return a_start < b_end and b_start < a_end
+_home_etag = _clinics_etag("home")
+_clinics_page_etag = _clinics_etag("clinics")
+
+def _clinics_modified(request):
+    return slot_cache.version_time(slot_cache.clinics_version())
 
 # ───────────────────────────────────────────────────────────────────────────────
 # Public / Landing
 # ───────────────────────────────────────────────────────────────────────────────
 
+@revalidated(_home_etag, _clinics_modified, private=True)
+@use_replica
 def home(request):
     return render(
         request,
@@ -98,114 +217,128 @@ def logout_view(request):
 # Clinics / Slots / Booking
 # ───────────────────────────────────────────────────────────────────────────────
 
+MAX_BATCH_CLINICS = 50
+
+@revalidated(_clinics_page_etag, _clinics_modified, private=True)
+@use_replica
 def clinics(request):
+    all_clinics = list(Clinic.objects.all())
     return render(request, "clinics.html", {
-        "clinics": Clinic.objects.all(),
+        "clinics": all_clinics,
+        "batch_ids": ",".join(str(c.id) for c in all_clinics[:MAX_BATCH_CLINICS]),
         "now": timezone.localdate()
     })
 
-def _hhmm_to_time(hhmm: str) -> dtime:
-    h, m = map(int, hhmm.split(":"))
-    return dtime(hour=h, minute=m)
+def _duration_param(request) -> int:
+    """?duration=minuty (15–480); w razie błędu domyślne SLOT_MINUTES."""
+    try:
+        duration = int(request.GET.get("duration", availability.SLOT_MINUTES))
+    except (TypeError, ValueError):
+        return availability.SLOT_MINUTES
+    return duration if 15 <= duration <= 480 else availability.SLOT_MINUTES
+
+def _parse_date(value) -> ddate:
+    """ "YYYY-MM-DD" → date; ValueError przy braku albo złym formacie."""
+    return datetime.strptime(value or "", "%Y-%m-%d").date()
 
-def _range_to_slots(day: ddate, start_str: str, end_str: str, step_min: int = 30):
-    start_t = _hhmm_to_time(start_str)
-    end_t   = _hhmm_to_time(end_str)
-    start_dt = make_aware(datetime.combine(day, start_t))
-    end_dt   = make_aware(datetime.combine(day, end_t))
-    t = start_dt
-    while t < end_dt:
-        yield (t, t + timedelta(minutes=step_min))
-        t += timedelta(minutes=step_min)
+def _date_param(request, name: str):
+    """?name=YYYY-MM-DD → date albo None (brak / zły format)."""
+    try:
+        return _parse_date(request.GET.get(name))
+    except ValueError:
+        return None
 
+def _range_params(request):
+    """
+    ?from=&to= (tryb zakresu) → ((first, last), None), błąd → (None, komunikat);
+    bez tych parametrów → (None, None) i liczymy jeden dzień z ?date=.
+    """
+    if "from" not in request.GET and "to" not in request.GET:
+        return None, None
+    first, last = _date_param(request, "from"), _date_param(request, "to")
+    if not first or not last or last < first:
+        return None, "Błędny zakres dat"
+    if (last - first).days >= availability.MAX_RANGE_DAYS:
+        return None, f"Maksymalnie {availability.MAX_RANGE_DAYS} dni"
+    return (first, last), None
+
+@revalidated(_slots_html_etag, _clinic_modified)
+@use_replica
 def clinic_slots(request, clinic_id: int):
     """
-    Generuje wolne sloty dla kliniki w danym dniu:
-    - precedence: VetHours > ClinicHours
-    - wyjątki: AvailabilityException (CLINIC/VET). Jeśli closed — brak slotów.
-    - kolizje z Appointment != CANCELLED odfiltrowują sloty (po nakładaniu).
-    Param: ?date=YYYY-MM-DD (domyślnie dzisiaj).
+    Wolne sloty kliniki (logika w core.availability, wyniki w core.slot_cache).
+    Param: ?date=YYYY-MM-DD (domyślnie dzisiaj), ?duration=minuty (domyślnie 30).
+    Tryb zakresu: ?from=YYYY-MM-DD&to=YYYY-MM-DD (maks. MAX_RANGE_DAYS dni) —
+    dane dla całego okresu ładowane są raz, sloty zwracane per dzień.
+    Bez zmian w klinice od poprzedniego pobrania → 304 (revalidated).
     """
     clinic = get_object_or_404(Clinic, pk=clinic_id)
+    duration = _duration_param(request)
 
-    # Data
-    try:
-        day_str = request.GET.get("date")
-        day = datetime.strptime(day_str, "%Y-%m-%d").date() if day_str else timezone.localdate()
-    except Exception:
-        day = timezone.localdate()
-    weekday = day.weekday()  # 0=Mon
-
-    # Czy klinika zamknięta (wyjątek)?
-    ex_clinic = AvailabilityException.objects.filter(
-        entity_type="CLINIC", entity_id=clinic.id, date=day
-    ).first()
-    if ex_clinic and ex_clinic.closed:
-        return render(request, "partials/slots.html", {"clinic": clinic, "slots": []})
-
-    # Godziny kliniki (fallback, gdy vet nie ma własnych)
-    clinic_hours = list(ClinicHours.objects.filter(clinic=clinic, weekday=weekday))
-
-    # Weterynarze w klinice
-    vets = list(Vet.objects.filter(clinic=clinic))
-    slots = []
-
-    # Oś dnia
-    day_start = make_aware(datetime.combine(day, dtime(0, 0)))
-    day_end   = make_aware(datetime.combine(day, dtime(23, 59)))
-
-    # Pobierz istniejące wizyty (na kolizje) — zakresowe, nie równościowe
-    busy = list(Appointment.objects.filter(
-        clinic=clinic,
-        starts_at__lt=day_end,
-        ends_at__gt=day_start
-    ).exclude(status="CANCELLED").values_list("vet_id", "starts_at", "ends_at"))
-
-    busy_by_vet = {}
-    for vid, bs, be in busy:
-        busy_by_vet.setdefault(vid, []).append((bs, be))
-
-    for v in vets:
-        # Wyjątek veta
-        ex_vet = AvailabilityException.objects.filter(
-            entity_type="VET", entity_id=v.id, date=day
-        ).first()
-        if ex_vet and ex_vet.closed:
-            continue
-
-        # Godziny veta (jeśli są, mają pierwszeństwo), inaczej kliniki
-        v_hours = list(VetHours.objects.filter(vet=v, weekday=weekday))
-        base_hours = v_hours if v_hours else clinic_hours
-
-        # Jeśli wyjątek veta z oknem godzin (nie closed): nadpisz bazę jednym oknem
-        if ex_vet and not ex_vet.closed and ex_vet.start and ex_vet.end:
-            base_hours = [type("X", (object,), {"start": ex_vet.start, "end": ex_vet.end})()]
-
-        # Jeśli wyjątek kliniki z oknem (np. skrócone godziny) – przycięcie
-        if ex_clinic and not ex_clinic.closed and ex_clinic.start and ex_clinic.end:
-            ch_start, ch_end = ex_clinic.start, ex_clinic.end
-        else:
-            ch_start = ch_end = None
-
-        for h in base_hours:
-            start_s, end_s = h.start, h.end
-            if ch_start and ch_end:
-                # przytnij okno do zakresu kliniki
-                start_s = max(start_s, ch_start)
-                end_s   = min(end_s, ch_end)
-                if start_s >= end_s:
-                    continue
-
-            for s, e in _range_to_slots(day, start_s, end_s, 30):
-                # kolizje zakresowe
-                collisions = any(_overlaps(s, e, bs, be) for (bs, be) in busy_by_vet.get(v.id, []))
-                if not collisions:
-                    slots.append((s, e))
-
-    # posortuj i wyślij
-    slots.sort(key=lambda x: x[0])
+    span, error = _range_params(request)
+    if error:
+        return HttpResponse(error, status=400)
+    if span:
+        days = slot_cache.range_slots(clinic, *span, duration)
+        return render(request, "partials/slots_range.html", {"clinic": clinic, "days": days})
+
+    day = _date_param(request, "date") or timezone.localdate()
+    slots = slot_cache.day_slots(clinic, day, duration)
     return render(request, "partials/slots.html", {"clinic": clinic, "slots": slots})
 
+def _batch_ids(request):
+    """?ids=1,2,3 → lista id bez powtórzeń (w kolejności) albo None, gdy pusta/za długa."""
+    ids = []
+    for part in (request.GET.get("ids") or "").split(","):
+        if part.strip().isdigit() and int(part) not in ids:
+            ids.append(int(part))
+    return ids if 0 < len(ids) <= MAX_BATCH_CLINICS else None
+
+@require_GET
+@use_replica
+def clinics_slots_batch(request):
+    """
+    Sloty wielu klinik naraz: ?ids=1,2,3 (maks. MAX_BATCH_CLINICS), ?date=,
+    ?duration=. Dane wszystkich klinik ładowane razem (core.slot_cache),
+    odpowiedź to fragmenty hx-swap-oob do kart #slots-<id> — stała liczba
+    zapytań niezależnie od liczby klinik.
+    """
+    ids = _batch_ids(request)
+    if ids is None:
+        return HttpResponse(f"Podaj od 1 do {MAX_BATCH_CLINICS} klinik", status=400)
+    clinics_found = list(Clinic.objects.filter(pk__in=ids).only("id"))
+    day = _date_param(request, "date") or timezone.localdate()
+    slots = slot_cache.clinics_day_slots([c.id for c in clinics_found], day, _duration_param(request))
+    return render(request, "partials/slots_batch.html", {
+        "items": [(c, slots[c.id]) for c in sorted(clinics_found, key=lambda c: ids.index(c.id))],
+    })
+
+def _int_param(request, name: str, default: int, lo: int, hi: int) -> int:
+    try:
+        value = int(request.GET.get(name, default))
+    except (TypeError, ValueError):
+        return default
+    return min(max(value, lo), hi)
+
+@require_GET
+@use_replica
+def earliest_slots(request):
+    """
+    Najwcześniejsze wolne terminy we wszystkich klinikach miasta.
+    Param: ?city=, ?species= (opcjonalnie), ?days= (horyzont, domyślnie 7),
+    ?limit= (domyślnie 10), ?duration=minuty.
+    """
+    city = (request.GET.get("city") or "").strip()
+    species = (request.GET.get("species") or "").strip()
+    days = _int_param(request, "days", 7, 1, availability.MAX_RANGE_DAYS)
+    limit = _int_param(request, "limit", 10, 1, 50)
+
+    qs = Clinic.objects.filter(city__iexact=city) if city else Clinic.objects.none()
+    if species:
+        qs = qs.filter(Q(species="") | Q(species__icontains=species))
+    results = availability.earliest_slots(list(qs), limit, days, _duration_param(request))
+    return render(request, "partials/earliest.html", {"results": results, "city": city})
+
 def book_preview(request, clinic_id: int):
     clinic = get_object_or_404(Clinic, pk=clinic_id)
     owner = _owner_for_request(request)
@@ -220,14 +353,13 @@ def book_preview(request, clinic_id: int):
 @login_required
 def book_confirm(request, clinic_id: int):
     clinic = get_object_or_404(Clinic, pk=clinic_id)
-    vet = Vet.objects.filter(clinic=clinic).first()
     owner = _owner_for_request(request)
 
     pet_id = request.POST.get("pet_id")
     start_s = request.POST.get("start")
     end_s   = request.POST.get("end")
 
-    if not all([vet, owner, pet_id, start_s, end_s]):
+    if not all([owner, pet_id, start_s, end_s]):
         return JsonResponse({"ok": False, "msg": "Brak danych"}, status=400)
 
     # ISO → datetime → aware
@@ -237,27 +369,76 @@ def book_confirm(request, clinic_id: int):
         return JsonResponse({"ok": False, "msg": "Zły format daty"}, status=400)
     if timezone.is_naive(start_dt): start_dt = make_aware(start_dt)
     if timezone.is_naive(end_dt):   end_dt   = make_aware(end_dt)
+    if end_dt <= start_dt:
+        return JsonResponse({"ok": False, "msg": "Zły zakres"}, status=400)
 
-    Appointment.objects.create(
-        clinic=clinic, vet=vet, owner=owner, pet_id=pet_id,
-        starts_at=start_dt, ends_at=end_dt, status="NEW"
-    )
+    # transakcja + ponowne sprawdzenie kolizji + wybór wolnego weta
+    try:
+        booking.book(clinic, owner, pet_id, start_dt, end_dt)
+    except booking.SlotTaken:
+        return JsonResponse({"ok": False, "msg": "Termin został już zajęty"}, status=409)
     return render(request, "partials/toast_success.html", {"msg": "Zarezerwowano!"})
 
 # ───────────────────────────────────────────────────────────────────────────────
 # Owner Portal
 # ───────────────────────────────────────────────────────────────────────────────
 
+APPTS_PAGE = 20
+
+def _appointments_page(owner, scope: str, after: str = None):
+    """
+    Jedna porcja historii właściciela, stronicowana kluczem (starts_at, id):
+    "upcoming" — od teraz rosnąco, "past" — wstecz malejąco. `after` to kursor
+    "<starts_at ISO>|<id>" ostatniego pokazanego wiersza. Zwraca (wiersze, kursor|None).
+    """
+    now = timezone.now()
+    qs = Appointment.objects.filter(owner=owner).select_related("clinic", "pet", "vet")
+    if scope == "past":
+        qs = qs.filter(starts_at__lt=now).order_by("-starts_at", "-id")
+    else:
+        qs = qs.filter(starts_at__gte=now).order_by("starts_at", "id")
+
+    if after:
+        ts_s, _, id_s = after.rpartition("|")
+        ts = parse_datetime(ts_s)
+        if ts and id_s.isdigit():
+            if scope == "past":
+                qs = qs.filter(Q(starts_at__lt=ts) | Q(starts_at=ts, id__lt=int(id_s)))
+            else:
+                qs = qs.filter(Q(starts_at__gt=ts) | Q(starts_at=ts, id__gt=int(id_s)))
+
+    rows = list(qs[:APPTS_PAGE + 1])
+    if len(rows) <= APPTS_PAGE:
+        return rows, None
+    rows = rows[:APPTS_PAGE]
+    return rows, f"{rows[-1].starts_at.isoformat()}|{rows[-1].id}"
+
 @login_required
 def my_appointments(request):
+    """
+    Wizyty właściciela: nadchodzące (najbliższe pierwsze), potem minione.
+    Żądanie HTMX z ?scope=&after= zwraca tylko kolejną porcję wierszy
+    ("Pokaż więcej") — liczba zapytań nie zależy od długości historii.
+    """
     owner = _owner_for_request(request)
-    appts = Appointment.objects.filter(owner=owner).order_by("starts_at") if owner else []
-    return render(request, "appointments.html", {"appts": appts})
+    if request.htmx:
+        scope = "past" if request.GET.get("scope") == "past" else "upcoming"
+        rows, cursor = _appointments_page(owner, scope, request.GET.get("after"))
+        return render(request, "partials/appointment_rows.html", {"appts": rows, "cursor": cursor, "scope": scope})
+
+    upcoming, upcoming_cursor = _appointments_page(owner, "upcoming")
+    past, past_cursor = _appointments_page(owner, "past")
+    return render(request, "appointments.html", {
+        "upcoming": upcoming, "upcoming_cursor": upcoming_cursor,
+        "past": past, "past_cursor": past_cursor,
+    })
 
 @login_required
+@require_http_methods(["POST"])
 def cancel_appointment(request, appt_id: int):
     """Proste anulowanie (POST). Zwraca toast dla HTMX."""
-    appt = get_object_or_404(Appointment, pk=appt_id)
+    owner = _owner_for_request(request)
+    appt = get_object_or_404(Appointment, pk=appt_id, owner=owner)
     appt.status = "CANCELLED"
     appt.save(update_fields=["status"])
     return render(request, "partials/toast_success.html", {"msg": "Anulowano wizytę"})
@@ -312,34 +493,50 @@ def undo_cancel(request, appt_id: int):
 # Clinic Admin (MVP)
 # ───────────────────────────────────────────────────────────────────────────────
 
-def _is_clinic_admin(user):
-    # Sprawdzenie roli w DomainUser
+def clinic_admin_required(view):
+    """
+    Jak user_passes_test z rolą CLINIC_ADMIN. Rolę sprawdzamy w bazie, nie
+    w kopii z sesji: wersja profilu siedzi w cache, a przy cache per proces
+    (locmem) odebranie roli nie dotarłoby do pozostałych workerów.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not DomainUser.objects.filter(auth_user_id=request.user.pk, role="CLINIC_ADMIN").exists():
+            return redirect_to_login(request.get_full_path())
+        return view(request, *args, **kwargs)
+    return wrapper
+
+def _time_param(value):
+    """ "HH:MM" z formularza → time albo None."""
     try:
-        return DomainUser.objects.filter(auth_user=user, role="CLINIC_ADMIN").exists()
-    except Exception:
-        return False
+        return parse_time(value or "")
+    except ValueError:
+        return None
 
 def _clinic_for_admin(_user):
     # MVP: pierwszy clinic w systemie; docelowo relacja admin->clinic
     return Clinic.objects.first()
 
 @login_required
-@user_passes_test(_is_clinic_admin)
+@clinic_admin_required
+@use_replica
 def clinic_dashboard(request):
+    """Liczby wetów/godzin jednym zapytaniem, wizyty i obłożenie z dziennego rollupu (core.day_stats)."""
     c = _clinic_for_admin(request.user)
-    vets = Vet.objects.filter(clinic=c).count()
-    hrs = ClinicHours.objects.filter(clinic=c).count()
-    appts = Appointment.objects.filter(clinic=c).count()
-    return render(request, "clinic_admin/dashboard.html", {"clinic": c, "vets": vets, "hrs": hrs, "appts": appts})
+    counts = Clinic.objects.filter(pk=c.pk).aggregate(
+        vets=Count("vet", distinct=True), hrs=Count("hours", distinct=True)
+    )
+    periods = day_stats.occupancy(c, periods=(30, 90))
+    return render(request, "clinic_admin/dashboard.html", {"clinic": c, "periods": periods, **counts})
 
 @login_required
-@user_passes_test(_is_clinic_admin)
+@clinic_admin_required
 def vets_list(request):
     c = _clinic_for_admin(request.user)
     return render(request, "clinic_admin/vets.html", {"clinic": c, "vets": Vet.objects.filter(clinic=c)})
 
 @login_required
-@user_passes_test(_is_clinic_admin)
+@clinic_admin_required
 @require_http_methods(["POST"])
 def vet_create(request):
     c = _clinic_for_admin(request.user)
@@ -352,7 +549,7 @@ def vet_create(request):
     return render(request, "partials/toast_success.html", {"msg": "Dodano veta"})
 
 @login_required
-@user_passes_test(_is_clinic_admin)
+@clinic_admin_required
 @require_http_methods(["POST"])
 def vet_delete(request, vet_id: int):
     c = _clinic_for_admin(request.user)
@@ -360,16 +557,17 @@ def vet_delete(request, vet_id: int):
     return render(request, "partials/toast_success.html", {"msg": "Usunięto veta"})
 
 @login_required
-@user_passes_test(_is_clinic_admin)
+@clinic_admin_required
 def hours_list(request):
     c = _clinic_for_admin(request.user)
     return render(request, "clinic_admin/hours.html", {
         "clinic": c,
-        "hours": ClinicHours.objects.filter(clinic=c).order_by("weekday", "start")
+        "hours": ClinicHours.objects.filter(clinic=c).order_by("weekday", "start"),
+        "schedule": json.dumps(schedule.export(c), indent=2),
     })
 
 @login_required
-@user_passes_test(_is_clinic_admin)
+@clinic_admin_required
 @require_http_methods(["POST"])
 def hours_set(request):
     c = _clinic_for_admin(request.user)
@@ -377,39 +575,386 @@ def hours_set(request):
         wd = int(request.POST.get("weekday"))
     except (TypeError, ValueError):
         wd = -1
-    start = request.POST.get("start")
-    end = request.POST.get("end")
-    if not (0 <= wd <= 6 and start and end):
+    start = _time_param(request.POST.get("start"))
+    end = _time_param(request.POST.get("end"))
+    if not (0 <= wd <= 6 and start and end and start < end):
         return render(request, "partials/toast_success.html", {"msg": "Błędne dane"})
     ClinicHours.objects.get_or_create(clinic=c, weekday=wd, start=start, end=end)
     return render(request, "partials/toast_success.html", {"msg": "Zapisano godziny"})
 
 @login_required
-@user_passes_test(_is_clinic_admin)
+@clinic_admin_required
+@require_http_methods(["POST"])
+def schedule_save(request):
+    """
+    Cały tygodniowy grafik kliniki i dowolnej liczby wetów naraz (core.schedule).
+    JSON w treści żądania albo w polu formularza "schedule" (strona godzin).
+    """
+    c = _clinic_for_admin(request.user)
+    raw = request.body if request.content_type == "application/json" else request.POST.get("schedule", "")
+    try:
+        clinic_rows, vet_rows = schedule.parse(c, json.loads(raw or "null"))
+    except ValueError:
+        errors = ["niepoprawny JSON"]
+    except schedule.ScheduleError as exc:
+        errors = exc.args[0]
+    else:
+        result = schedule.apply(c, clinic_rows, vet_rows)
+        if request.htmx:
+            msg = f"Zapisano grafik (+{result['created']}, −{result['deleted']})"
+            return render(request, "partials/toast_success.html", {"msg": msg})
+        return JsonResponse({"ok": True, **result})
+    if request.htmx:
+        return render(request, "partials/toast_success.html", {"msg": "Błędny grafik: " + "; ".join(errors)})
+    return JsonResponse({"ok": False, "msg": "Błędny grafik", "errors": errors}, status=400)
+
+@login_required
+@clinic_admin_required
 def exceptions_list(request):
     c = _clinic_for_admin(request.user)
-    ex = AvailabilityException.objects.filter(entity_type="CLINIC", entity_id=c.id).order_by("-date")[:30]
-    return render(request, "clinic_admin/exceptions.html", {"clinic": c, "exceptions": ex})
+    vets = list(Vet.objects.filter(clinic=c).only("id", "title").order_by("id"))
+    ex = AvailabilityException.objects.filter(
+        Q(entity_type="CLINIC", entity_id=c.id) | Q(entity_type="VET", entity_id__in=[v.id for v in vets])
+    ).order_by("-date", "-id")[:50]
+    return render(request, "clinic_admin/exceptions.html", {"clinic": c, "exceptions": ex, "vets": vets})
+
+def _exception_from_post(request, clinic):
+    """Wyjątek z formularza (bez zapisu) albo komunikat błędu."""
+    entity = request.POST.get("entity", "clinic")
+    if entity == "clinic":
+        entity_type, entity_id = "CLINIC", clinic.id
+    else:
+        vet = Vet.objects.filter(clinic=clinic, pk=entity if entity.isdigit() else None).first()
+        if vet is None:
+            return None, "Nieznany wet"
+        entity_type, entity_id = "VET", vet.id
+    try:
+        first = _parse_date(request.POST.get("date"))
+        last = _parse_date(request.POST["date_to"]) if request.POST.get("date_to") else None
+        weekday = int(request.POST["weekday"]) if request.POST.get("weekday") else None
+    except ValueError:
+        return None, "Błędne dane"
+    ex = AvailabilityException(
+        entity_type=entity_type, entity_id=entity_id, date=first, date_to=last if last != first else None,
+        weekday=weekday, closed=request.POST.get("closed") == "1",
+        start=_time_param(request.POST.get("start")), end=_time_param(request.POST.get("end")),
+    )
+    try:
+        ex.full_clean()
+    except ValidationError as exc:
+        return None, "; ".join(m for msgs in exc.message_dict.values() for m in msgs)
+    if not ex.closed and not (ex.start and ex.end):
+        return None, "Podaj godziny albo zaznacz zamknięcie"
+    if ex.weekday is not None and not ex.date_to:
+        return None, "Dzień tygodnia wymaga zakresu dat"
+    return ex, None
+
+@login_required
+@clinic_admin_required
+@require_http_methods(["POST"])
+def exception_add(request):
+    """
+    Wyjątek kliniki albo weta: jeden dzień, zakres (date..date_to) lub
+    wybrany dzień tygodnia w zakresie. Wizyty, które wypadają w zamknięciu
+    albo poza oknem, trafiają do przełożenia (core.schedule.mark_followup).
+    """
+    c = _clinic_for_admin(request.user)
+    ex, error = _exception_from_post(request, c)
+    if error:
+        return render(request, "partials/toast_success.html", {"msg": error})
+    followups = schedule.add_exception(ex)
+    msg = "Dodano wyjątek" + (f" • wizyt do przełożenia: {followups}" if followups else "")
+    return render(request, "partials/toast_success.html", {"msg": msg})
 
 @login_required
-@user_passes_test(_is_clinic_admin)
+@clinic_admin_required
+@require_http_methods(["POST"])
+def exception_delete(request, exception_id: int):
+    c = _clinic_for_admin(request.user)
+    vet_ids = Vet.objects.filter(clinic=c).values_list("id", flat=True)
+    get_object_or_404(
+        AvailabilityException.objects.filter(Q(entity_type="CLINIC", entity_id=c.id) |
+                                             Q(entity_type="VET", entity_id__in=vet_ids)),
+        pk=exception_id,
+    ).delete()
+    return render(request, "partials/toast_success.html", {"msg": "Usunięto wyjątek"})
+
+@login_required
+@clinic_admin_required
 @require_http_methods(["POST"])
 def exception_toggle(request):
     c = _clinic_for_admin(request.user)
-    date_str = request.POST.get("date")
+    try:
+        d = _parse_date(request.POST.get("date"))
+    except ValueError:
+        return HttpResponse("Błędna data", status=400)
     closed = request.POST.get("closed") == "1"
-    d = datetime.strptime(date_str, "%Y-%m-%d").date()
-    obj, _ = AvailabilityException.objects.get_or_create(entity_type="CLINIC", entity_id=c.id, date=d)
+    obj = AvailabilityException.objects.filter(
+        entity_type="CLINIC", entity_id=c.id, date=d, date_to__isnull=True, weekday__isnull=True
+    ).first() or AvailabilityException(entity_type="CLINIC", entity_id=c.id, date=d)
     obj.closed = closed
-    obj.save(update_fields=["closed"])
-    return render(request, "partials/toast_success.html", {"msg": "Zaktualizowano wyjątek"})
+    followups = schedule.add_exception(obj)
+    msg = "Zaktualizowano wyjątek" + (f" • wizyt do przełożenia: {followups}" if followups else "")
+    return render(request, "partials/toast_success.html", {"msg": msg})
+
+def _week_start(request) -> ddate:
+    """Poniedziałek tygodnia zawierającego ?date= (domyślnie dziś)."""
+    day = _date_param(request, "date") or timezone.localdate()
+    return day - timedelta(days=day.weekday())
+
+def _calendar_appointments(clinic, first: ddate, days: int):
+    """Wizyty kliniki w dniach first..first+days — jedno zapytanie z pet/vet."""
+    start = make_aware(datetime.combine(first, dtime(0, 0)))
+    end = make_aware(datetime.combine(first + timedelta(days=days), dtime(0, 0)))
+    return (Appointment.objects
+            .filter(clinic=clinic, starts_at__gte=start, starts_at__lt=end)
+            .select_related("pet", "vet")
+            .only("id", "starts_at", "ends_at", "status", "needs_followup", "vet_id", "pet__name", "vet__title")
+            .order_by("starts_at", "id"))
+
+def _calendar_cells(appts):
+    """{(vet_id, dzień): [wizyty]}"""
+    cells = {}
+    for a in appts:
+        cells.setdefault((a.vet_id, timezone.localdate(a.starts_at)), []).append(a)
+    return cells
+
+CALENDAR_SKEW = timedelta(seconds=2)  # wersja kliniki może wyprzedzać zegar przy seriach zmian
 
 @login_required
-@user_passes_test(_is_clinic_admin)
+@clinic_admin_required
+@use_replica
 def clinic_calendar(request):
+    """
+    Tydzień kliniki: wiersze — dni, kolumny — weci. Dwa zapytania (weci +
+    wizyty tygodnia). Strona odpytuje clinic_calendar_changes o zmiany.
+    """
+    c = _clinic_for_admin(request.user)
+    week = _week_start(request)
+    slot_cache.calendar_version(c.id)        # założona przed `since`, inaczej pierwsze odpytanie odświeży cały tydzień
+    since = slot_cache.clinic_version(c.id)  # przed zapytaniem — zmiany w trakcie złapie kolejne odpytanie
+    vets = list(Vet.objects.filter(clinic=c).only("id", "title").order_by("id"))
+    cells = _calendar_cells(_calendar_appointments(c, week, 7))
+    days = [week + timedelta(days=i) for i in range(7)]
+    rows = [(d, [(v, cells.get((v.id, d), [])) for v in vets]) for d in days]
+    feeds = [(c.name, exports.feed_token(c))] + [
+        (v.title or f"Wet #{v.id}", exports.feed_token(c, v.id)) for v in vets
+    ]
+    return render(request, "clinic_admin/calendar.html", {
+        "clinic": c, "week": week, "vets": vets, "rows": rows, "since": since,
+        "prev_week": week - timedelta(days=7), "next_week": week + timedelta(days=7),
+        "feeds": [(label, request.build_absolute_uri(reverse("calendar_feed", args=[token])))
+                  for label, token in feeds],
+    })
+
+@login_required
+@clinic_admin_required
+@require_GET
+@use_replica
+def clinic_calendar_changes(request):
+    """
+    Odświeżanie kalendarza (HTMX polling): ?date=<tydzień>&since=<token>.
+    Gdy wersja kliniki (core.slot_cache) nie zmieniła się od `since` — 204 bez
+    zapytań o wizyty. W przeciwnym razie zwraca tylko komórki (wet, dzień)
+    z wizytami zmienionymi od `since`, jako podmiany out-of-band. Gdy od `since`
+    wizytę usunięto albo przeniesiono (slot_cache.calendar_version), zwolnionej
+    komórki nie da się wskazać — wtedy cały tydzień.
+    """
+    c = _clinic_for_admin(request.user)
+    week = _week_start(request)
+    try:
+        since = int(request.GET.get("since", ""))
+    except ValueError:
+        return HttpResponse(status=400)
+    token = slot_cache.clinic_version(c.id)
+    if token <= since:
+        return HttpResponse(status=204)
+    vacated = slot_cache.calendar_version(c.id) > since
+    # świeża zmiana może jeszcze nie być na replice, a klient dostanie nowe `since`
+    with primary_reads(not replica_safe(token)):
+        # z zapasem: lepiej odświeżyć kilka komórek za dużo niż zgubić zmianę
+        since_dt = datetime.fromtimestamp(since / 1000, tz=dt_timezone.utc) - CALENDAR_SKEW
+        week_appts = _calendar_appointments(c, week, 7)
+        if vacated:
+            by_cell = _calendar_cells(week_appts)
+            vet_ids = Vet.objects.filter(clinic=c).order_by("id").values_list("id", flat=True)
+            days = [week + timedelta(days=i) for i in range(7)]
+            return render(request, "partials/calendar_changes.html", {
+                "cells": [(vid, d, by_cell.get((vid, d), [])) for d in days for vid in vet_ids],
+                "week": week, "since": token,
+            })
+        touched = set(
+            (vid, timezone.localdate(s))
+            for vid, s in week_appts.filter(updated_at__gt=since_dt).values_list("vet_id", "starts_at")
+        )
+        cells = []
+        if touched:
+            first = min(d for _, d in touched)
+            last = max(d for _, d in touched)
+            by_cell = _calendar_cells(_calendar_appointments(c, first, (last - first).days + 1)
+                                      .filter(vet_id__in={vid for vid, _ in touched}))
+            cells = [(vid, d, by_cell.get((vid, d), [])) for vid, d in sorted(touched)]
+    return render(request, "partials/calendar_changes.html", {
+        "cells": cells, "week": week, "since": token,
+    })
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Eksport wizyt (CSV, iCalendar) — strumieniowo, core.exports
+# ───────────────────────────────────────────────────────────────────────────────
+
+FEED_PAST_DAYS = 90  # feed ICS: wizyty od tylu dni wstecz i wszystkie przyszłe
+
+def _export_appointments(clinic_id, first=None, last=None, vet_id=None):
+    qs = Appointment.objects.filter(clinic_id=clinic_id)
+    if first:
+        qs = qs.filter(starts_at__gte=make_aware(datetime.combine(first, dtime(0, 0))))
+    if last:
+        qs = qs.filter(starts_at__lt=make_aware(datetime.combine(last + timedelta(days=1), dtime(0, 0))))
+    if vet_id:
+        qs = qs.filter(vet_id=vet_id)
+    return qs
+
+# wersja kliniki zmienia się z każdą wizytą, wetem i grafikiem; zmiana samego
+# zwierzęcia (imię) trafi do eksportu przy następnej zmianie w klinice
+
+def _export_etag(request):
     c = _clinic_for_admin(request.user)
-    day = request.GET.get("date") or timezone.localdate().isoformat()
-    start = timezone.make_aware(datetime.strptime(day, "%Y-%m-%d"))
-    end = start + timedelta(days=1)
-    appts = Appointment.objects.filter(clinic=c, starts_at__gte=start, starts_at__lt=end).order_by("starts_at")
-    return render(request, "clinic_admin/calendar.html", {"clinic": c, "day": day, "appts": appts})
+    return _etag("csv", c.id, slot_cache.clinic_version(c.id), request.GET.urlencode()) if c else None
+
+def _export_modified(request):
+    c = _clinic_for_admin(request.user)
+    return slot_cache.version_time(slot_cache.clinic_version(c.id)) if c else None
+
+@login_required
+@clinic_admin_required
+@require_GET
+@gzip_page
+@revalidated(_export_etag, _export_modified, private=True)
+@use_replica
+def clinic_export_csv(request):
+    """
+    Wizyty kliniki w CSV: ?from=&to= (RRRR-MM-DD, oba opcjonalne), ?vet=<id>.
+    Strumieniowo i w stałej pamięci, także dla setek tysięcy wierszy.
+    """
+    c = _clinic_for_admin(request.user)
+    first, last = _date_param(request, "from"), _date_param(request, "to")
+    if ("from" in request.GET and not first) or ("to" in request.GET and not last) \
+            or (first and last and last < first):
+        return HttpResponse("Błędny zakres dat", status=400)
+    vet_id = request.GET.get("vet") or None
+    if vet_id and not vet_id.isdigit():
+        return HttpResponse("Błędny wet", status=400)
+    response = StreamingHttpResponse(exports.csv_stream(_export_appointments(c.id, first, last, vet_id)),
+                                     content_type="text/csv; charset=utf-8")
+    response["Content-Disposition"] = f'attachment; filename="wizyty-{c.id}.csv"'
+    return response
+
+@login_required
+@clinic_admin_required
+@require_http_methods(["POST"])
+def feeds_rotate(request):
+    """Nowy klucz feedów kliniki — dotychczasowe adresy ICS przestają działać."""
+    c = _clinic_for_admin(request.user)
+    c.feed_key = new_feed_key()
+    c.save(update_fields=["feed_key"])
+    return redirect("clinic_calendar")
+
+def _feed(request, token):
+    """
+    (klinika, vet_id | None) z tokenu z aktualnym kluczem feedów kliniki albo
+    None — raz na żądanie (walidatory i widok). Zawsze z primary: adres
+    unieważniony rotacją nie może działać do czasu dogonienia repliki.
+    """
+    if not hasattr(request, "_feed"):
+        target = exports.feed_target(token)
+        clinic = None
+        if target:
+            with primary_reads():
+                clinic = Clinic.objects.filter(pk=target[0], feed_key=target[2]).only("id", "name").first()
+        request._feed = (clinic, target[1]) if clinic else None
+    return request._feed
+
+def _feed_etag(request, token):
+    feed = _feed(request, token)
+    if feed is None:
+        return None
+    clinic, vet_id = feed
+    # okno feedu przesuwa się z dniem
+    return _etag("ics", clinic.id, vet_id or 0, slot_cache.clinic_version(clinic.id), timezone.localdate())
+
+def _feed_modified(request, token):
+    feed = _feed(request, token)
+    return slot_cache.version_time(slot_cache.clinic_version(feed[0].id)) if feed else None
+
+@require_GET
+@gzip_page
+@revalidated(_feed_etag, _feed_modified, private=True)
+@use_replica
+def calendar_feed(request, token: str):
+    """
+    Subskrypcja kalendarza (iCalendar) kliniki albo jednego weta — adres
+    z podpisanym tokenem (link na stronie kalendarza), bez logowania.
+    Wizyty od FEED_PAST_DAYS dni wstecz; 304, gdy w klinice nic się nie zmieniło.
+    """
+    feed = _feed(request, token)
+    if feed is None:
+        raise Http404
+    clinic, vet_id = feed
+    clinic_id = clinic.id
+    name = clinic.name
+    if vet_id:
+        vet = get_object_or_404(Vet.objects.only("id", "title"), pk=vet_id, clinic_id=clinic_id)
+        name = f"{clinic.name} – {vet.title or f'Wet #{vet.id}'}"
+    first = timezone.localdate() - timedelta(days=FEED_PAST_DAYS)
+    return StreamingHttpResponse(exports.ics_stream(_export_appointments(clinic_id, first, vet_id=vet_id), name),
+                                 content_type="text/calendar; charset=utf-8")
+
+# ───────────────────────────────────────────────────────────────────────────────
+# API JSON (v1) — dla aplikacji mobilnych i partnerów
+# ───────────────────────────────────────────────────────────────────────────────
+
+COMPACT_JSON = {"separators": (",", ":"), "ensure_ascii": False}
+
+def _api_error(message: str, status: int):
+    return JsonResponse({"error": message}, status=status, json_dumps_params=COMPACT_JSON)
+
+@gzip_page
+@revalidated(_slots_json_etag, _clinic_modified)
+@require_GET
+@use_replica
+def api_clinic_slots(request, clinic_id: int):
+    """
+    Wolne sloty w zwartym JSON — ten sam silnik i cache co clinic_slots,
+    bez renderowania szablonu. Parametry jak w clinic_slots (?date= albo
+    ?from=&to=, ?duration=) oraz ?capacity=1 — liczba wolnych wetów na slot.
+
+        {"clinic": 3, "duration": 30, "tz": "Europe/Warsaw",
+         "days": [{"date": "2026-10-19", "starts": [540, 570], "capacity": [2, 1]}]}
+
+    starts to minuty od lokalnej północy dnia (upływ czasu — także w dni
+    zmiany czasu); koniec slotu = start + duration.
+    """
+    clinic = Clinic.objects.filter(pk=clinic_id).only("id").first()
+    if clinic is None:
+        return _api_error("Nie ma takiej kliniki", 404)
+    duration = _duration_param(request)
+    span, error = _range_params(request)
+    if error:
+        return _api_error(error, 400)
+    if span:
+        days = slot_cache.range_slots(clinic, *span, duration)
+    else:
+        day = _date_param(request, "date") or timezone.localdate()
+        days = [(day, slot_cache.day_slots(clinic, day, duration))]
+
+    with_capacity = request.GET.get("capacity") == "1"
+    out = []
+    for day, slots in days:
+        starts, capacity = availability.slot_offsets(day, slots)
+        entry = {"date": day.isoformat(), "starts": starts}
+        if with_capacity:
+            entry["capacity"] = capacity
+        out.append(entry)
+    return JsonResponse({
+        "clinic": clinic.id, "duration": duration, "tz": settings.TIME_ZONE, "days": out,
+    }, json_dumps_params=COMPACT_JSON)
@@ -5,6 +5,17 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Wdrożenie ASGI (widoki async z core.async_views dla slotów, list klinik,
+health/ready/metrics):
+
+    ASYNC_VIEWS=1 gunicorn petnav.asgi:application -c petnav/gunicorn_asgi.py
+
+gunicorn zarządza procesami, a każdy worker uvicorna obsługuje wiele żądań
+naraz w pętli zdarzeń. Dlatego workerów jest tylu, ile rdzeni, a nie
+2×rdzenie+1 jak przy workerach sync. Pozostałe widoki nadal są sync: Django
+uruchamia je w wątku. Porównanie przepustowości obu ścieżek daje
+`manage.py benchmark_asgi`.
 """
 
 import os
@@ -0,0 +1,43 @@
+# petnav/gunicorn_asgi.py
+"""
+Konfiguracja gunicorna dla petnav.asgi z workerami uvicorna (pakiet uvicorn-worker):
+
+    ASYNC_VIEWS=1 gunicorn petnav.asgi:application -c petnav/gunicorn_asgi.py
+
+Zmienne: PORT, WEB_CONCURRENCY (liczba workerów; domyślnie liczba rdzeni
+z REDIS_URL, bez niego 1), METRICS_DIR (czyszczony przy starcie, patrz
+core.metrics).
+
+Bez REDIS_URL cache jest w pamięci procesu (locmem): wersje klinik
+i profili podbite w jednym workerze nie docierają do pozostałych, więc
+reszta serwuje nieaktualne sloty (do SLOT_CACHE_LOCAL_TTL, core.slot_cache)
+i gubi część trafień. Stąd domyślnie jeden worker.
+"""
+import multiprocessing
+import os
+import pathlib
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = "uvicorn_worker.UvicornWorker"
+# pętla zdarzeń obsługuje wiele żądań naraz — jeden worker na rdzeń, o ile cache jest wspólny
+shared_cache = bool(os.getenv("REDIS_URL"))
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() if shared_cache else 1))
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+# okresowy restart workerów (wycieki pamięci); jitter — nie wszystkie naraz
+max_requests = 5000
+max_requests_jitter = 500
+accesslog = "-"
+
+def on_starting(server):
+    if workers > 1 and not shared_cache:
+        server.log.warning("WEB_CONCURRENCY=%s bez REDIS_URL: cache locmem per worker — "
+                           "unieważnienia slotów nie dotrą do pozostałych workerów", workers)
+    # stan metryk poprzedniego uruchomienia nie może zawyżać liczników
+    directory = os.getenv("METRICS_DIR")
+    if directory:
+        path = pathlib.Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+        for f in path.glob("*.json"):
+            f.unlink()
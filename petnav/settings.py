@@ -7,6 +7,9 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # --- Security ---
 SECRET_KEY = os.getenv("DJANGO_SECRET_KEY", "dev-secret-change-me")
 DEBUG = os.getenv("DJANGO_DEBUG", "True").lower() == "true"
+RELEASE = os.getenv("RELEASE", "dev")   # identyfikator wdrożenia (m.in. w ETagach)
+# Wersje async gorących widoków (core.async_views) — dla wdrożenia ASGI, patrz petnav/asgi.py
+ASYNC_VIEWS = os.getenv("ASYNC_VIEWS", "0") == "1"
 
 ALLOWED_HOSTS = [
     "*",  # lokalnie
@@ -35,12 +38,15 @@ INSTALLED_APPS = [
 
 # --- Middleware ---
 MIDDLEWARE = [
+    "core.middleware.PerformanceMiddleware",          # Server-Timing, wolne żądania (PERF_*)
+    "core.middleware.ReplicaPinMiddleware",           # czytaj własne zapisy (REPLICA_*)
     "django.middleware.security.SecurityMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",   # <--- dodane
+    "core.middleware.StaticFilesMiddleware",        # WhiteNoise, także pod ASGI
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "core.middleware.DomainUserMiddleware",           # profil domenowy raz na żądanie
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "django_htmx.middleware.HtmxMiddleware",
@@ -54,10 +60,13 @@ WSGI_APPLICATION = "petnav.wsgi.application"
 if os.getenv("DATABASE_URL"):
     DATABASES = {
         "default": dj_database_url.config(
-            env="DATABASE_URL", conn_max_age=600, ssl_require=False
+            # pod ASGI każde żądanie ma własny wątek ORM — trwałe połączenia by się mnożyły
+            env="DATABASE_URL", conn_max_age=0 if ASYNC_VIEWS else 600, ssl_require=False
         )
     }
 else:
+    # lokalny plik poza repozytorium (WAL z core.db zmienia nagłówek przy każdym
+    # otwarciu): manage.py migrate && manage.py seed_demo
     DATABASES = {
         "default": {
             "ENGINE": "django.db.backends.sqlite3",
@@ -65,9 +74,63 @@ else:
         }
     }
 
+# Replika do odczytów gorących widoków (core.routers); bez niej wszystko idzie na default.
+if os.getenv("DATABASE_REPLICA_URL"):
+    DATABASES["replica"] = dj_database_url.parse(
+        os.getenv("DATABASE_REPLICA_URL"), conn_max_age=0 if ASYNC_VIEWS else 600, ssl_require=False
+    )
+    DATABASES["replica"]["TEST"] = {"MIRROR": "default"}
+    DATABASE_ROUTERS = ["core.routers.ReplicaRouter"]
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+REPLICA_PIN_SECONDS = int(os.getenv("REPLICA_PIN_SECONDS", "10"))   # po zapisie czytamy z primary
+
+# Pragmy SQLite, BEGIN IMMEDIATE i pula psycopg dla Postgresa (core.db)
+from core.db import tune_databases  # noqa: E402
+tune_databases(
+    DATABASES,
+    pool=os.getenv("DB_POOL", "1") == "1",
+    pool_min=int(os.getenv("DB_POOL_MIN_SIZE", "2")),
+    pool_max=int(os.getenv("DB_POOL_MAX_SIZE", "10")),   # na proces; × workerzy ≤ max_connections
+    pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "10")),  # s czekania na wolne połączenie
+)
+
+# --- Cache ---
+# locmem wystarcza na jeden proces; przy wielu workerach gunicorna ustaw
+# REDIS_URL, żeby unieważnienia cache dostępności widziały wszystkie procesy.
+# Bez niego wersje i sloty w cache żyją tylko SLOT_CACHE_LOCAL_TTL sekund
+# (core.slot_cache) — tyle najwyżej inny worker pokazuje nieaktualne sloty.
+SLOT_CACHE_LOCAL_TTL = int(os.getenv("SLOT_CACHE_LOCAL_TTL", "5"))
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("REDIS_URL"),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "petnav",
+        }
+    }
+
+# --- Pomiary wydajności (core.perf) ---
+PERF_ENABLED = os.getenv("PERF_ENABLED", "1") == "1"
+PERF_SLOW_REQUEST_MS = int(os.getenv("PERF_SLOW_REQUEST_MS", "500"))
+# nagłówek Server-Timing (czas bazy, liczba zapytań) — i tak tylko przy DEBUG albo dla is_staff
+PERF_SERVER_TIMING = os.getenv("PERF_SERVER_TIMING", "0") == "1"
+
+# --- Metryki /api/metrics (core.metrics) ---
+# Przy kilku workerach: wspólny katalog na stan procesów (czyszczony przy starcie).
+METRICS_DIR = os.getenv("METRICS_DIR") or None
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+METRICS_TOKEN = os.getenv("METRICS_TOKEN") or None   # Bearer; brak = /api/metrics zamknięte (401)
+
 # --- Templates ---
 TEMPLATES = [{
-    "BACKEND": "django.template.backends.django.DjangoTemplates",
+    # DjangoTemplates + pomiar renderowania (span "render" w Server-Timing)
+    "BACKEND": "core.perf.TimedTemplates",
     "DIRS": [BASE_DIR / "templates"],
     "APP_DIRS": True,
     "OPTIONS": {